@@ -19,6 +19,15 @@
 #include <spot/misc/timer.hh>
 #include <spot/misc/memusage.hh>
 #include <cstring>
+#include <cerrno>
+#include <csignal>
+#include <sstream>
+#include <vector>
+
+#include <poll.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <unistd.h>
 
 #include <boost/program_options.hpp>
 #include <boost/format.hpp>
@@ -35,6 +44,215 @@ void readline(std::string* dst, std::ifstream& stream) {
     } while( stream.fail() && !stream.eof() );
 }
 
+//! Run an emptiness check on \a product, print its result and return the exit code.
+static int
+emptiness_check(spot::emptiness_check_instantiator_ptr echeck_inst,
+                spot::twa_ptr product,
+                bool expect_counter_example,
+                bool accepting_run,
+                spot::timer_map& tm)
+{
+  int exit_code = 0;
+  auto ec = echeck_inst->instantiate(product);
+  bool search_many = echeck_inst->options().get("repeated");
+
+  assert(ec);
+  do {
+      int memused = spot::memusage();
+      tm.start("running emptiness check");
+      spot::emptiness_check_result_ptr res;
+
+      try {
+          res = ec->check();
+      }
+      catch (std::bad_alloc) {
+          std::cerr << "Out of memory during emptiness check."
+                    << std::endl;
+          exit_code = 2;
+          exit(exit_code);
+      }
+      tm.stop("running emptiness check");
+
+
+      memused = spot::memusage() - memused;
+
+      ec->print_stats(std::cout);
+      std::cout << memused << " pages allocated for emptiness check"
+                << std::endl;
+
+      if (expect_counter_example == !res &&
+          (!expect_counter_example || ec->safe()))
+          exit_code = 1;
+
+      if (!res) {
+          std::cout << "no counterexample found";
+          if (!ec->safe() && expect_counter_example) {
+              std::cout << " even if expected" << std::endl;
+              std::cout << "this may be due to the use of the bit"
+                        << " state hashing technique" << std::endl;
+              std::cout << "you can try to increase the heap size "
+                        << "or use an explicit storage"
+                        << std::endl;
+          }
+          std::cout << std::endl;
+          break;
+      }
+      else if (accepting_run) {
+          spot::twa_run_ptr run;
+          tm.start("computing accepting run");
+          try {
+              run = res->accepting_run();
+          } catch (std::bad_alloc) {
+              std::cerr << "Out of memory while looking for counterexample."
+                        << std::endl;
+              exit_code = 2;
+              exit(exit_code);
+          }
+          tm.stop("computing accepting run");
+
+          if (!run) {
+              std::cout << "a counterexample exists" << std::endl;
+          } else {
+              tm.start("reducing accepting run");
+              run = run->reduce();
+              tm.stop("reducing accepting run");
+
+              tm.start("printing accepting run");
+              std::cout << *run;
+              tm.stop("printing accepting run");
+          }
+      }
+      else {
+          std::cout << "a counterexample exists "
+                    << "(use -C to print it)" << std::endl;
+      }
+  }
+  while (search_many);
+  return exit_code;
+}
+
+//! Swarm verification: run \a workers emptiness checks in forked processes.
+//!
+//! Each worker enumerates successors in its own random order, thus workers
+//! explore different parts of the product first. Any complete check is
+//! conclusive: the first worker to finish gives the result and the others
+//! are stopped. Workers buffer their output, only the winner's is printed.
+static int
+swarm_check(int workers,
+            std::shared_ptr<neco::tgba> model,
+            spot::emptiness_check_instantiator_ptr echeck_inst,
+            spot::twa_ptr product,
+            bool expect_counter_example,
+            bool accepting_run,
+            spot::timer_map& tm)
+{
+  std::vector<pid_t> pids;
+  std::vector<int> fds;
+  std::cout.flush();
+
+  for (int i = 0; i < workers; ++i) {
+      int fd[2];
+      if (pipe(fd) != 0) {
+          perror("pipe");
+          break;
+      }
+
+      pid_t pid = fork();
+      if (pid < 0) {
+          perror("fork");
+          close(fd[0]);
+          close(fd[1]);
+          break;
+      }
+
+      if (pid == 0) {
+          // worker: run the check with its own successor order
+          close(fd[0]);
+          model->set_swarm_seed(i);
+
+          std::ostringstream out;
+          std::streambuf* old = std::cout.rdbuf(out.rdbuf());
+          int code = emptiness_check(echeck_inst, product,
+                                     expect_counter_example, accepting_run, tm);
+          std::cout.rdbuf(old);
+
+          std::string msg = out.str();
+          bool ok = write(fd[1], &code, sizeof(code)) == sizeof(code);
+          for (size_t done = 0; ok && done < msg.size(); ) {
+              ssize_t n = write(fd[1], msg.data() + done, msg.size() - done);
+              ok = n > 0;
+              done += n;
+          }
+          close(fd[1]);
+          _exit(ok ? 0 : 2);
+      }
+
+      close(fd[1]);
+      pids.push_back(pid);
+      fds.push_back(fd[0]);
+  }
+
+  std::cout << "swarm verification with " << pids.size() << " workers" << std::endl;
+
+  // collect outputs until a worker finishes with a complete result
+  std::vector<std::string> outputs(fds.size());
+  std::vector<bool> open(fds.size(), true);
+  int winner = -1;
+  int running = fds.size();
+  char buf[4096];
+
+  while (winner < 0 && running > 0) {
+      std::vector<pollfd> pfds;
+      std::vector<int> index;
+      for (size_t i = 0; i < fds.size(); ++i) {
+          if (open[i]) {
+              pollfd p = { fds[i], POLLIN, 0 };
+              pfds.push_back(p);
+              index.push_back(i);
+          }
+      }
+      if (poll(&pfds[0], pfds.size(), -1) < 0) {
+          if (errno == EINTR)
+              continue;
+          perror("poll");
+          break;
+      }
+      for (size_t j = 0; j < pfds.size() && winner < 0; ++j) {
+          if (!(pfds[j].revents & (POLLIN | POLLHUP | POLLERR)))
+              continue;
+          int i = index[j];
+          ssize_t n = read(fds[i], buf, sizeof(buf));
+          if (n > 0) {
+              outputs[i].append(buf, n);
+              continue;
+          }
+          // end of output, a crashed worker is ignored
+          open[i] = false;
+          --running;
+          if (outputs[i].size() >= sizeof(int))
+              winner = i;
+      }
+  }
+
+  for (size_t i = 0; i < pids.size(); ++i) {
+      if (open[i])
+          kill(pids[i], SIGKILL);
+      close(fds[i]);
+      waitpid(pids[i], 0, 0);
+  }
+
+  if (winner < 0) {
+      std::cerr << "all swarm workers failed" << std::endl;
+      return 2;
+  }
+
+  int exit_code;
+  memcpy(&exit_code, outputs[winner].data(), sizeof(exit_code));
+  std::cout << "worker " << winner << " finished first" << std::endl;
+  std::cout << outputs[winner].substr(sizeof(exit_code));
+  return exit_code;
+}
+
 int
 checked_main(int argc, char **argv)
 {
@@ -51,6 +269,7 @@ checked_main(int argc, char **argv)
   std::string formula = "";
   std::string dead = "true";
   std::string echeck_algo = "Cou99";
+  int workers = 1;
 
   po::positional_options_description pos_options;
   pos_options.add("formula", -1);
@@ -76,6 +295,8 @@ checked_main(int argc, char **argv)
                                          " p: draw the product state-space")
       ("ss-size,k", "compute size of state-space")
       ("times,T", "time the different phases of the execution")
+      ("workers,j", po::value<int>(&workers)->default_value(1),
+       "run the emptiness check with a swarm of N worker processes")
   ;
 
   po::options_description cmdline_options;
@@ -161,6 +382,11 @@ checked_main(int argc, char **argv)
       use_timer = true;
   }
 
+  if (workers < 1) {
+      std::cerr << "the number of workers must be positive." << std::endl;
+      return -1;
+  }
+
   spot::default_environment& env =
     spot::default_environment::instance();
 
@@ -268,83 +494,12 @@ checked_main(int argc, char **argv)
 
   assert(echeck_inst);
 
-  {
-      auto ec = echeck_inst->instantiate(product);
-      bool search_many = echeck_inst->options().get("repeated");
-
-      assert(ec);
-      do {
-          int memused = spot::memusage();
-          tm.start("running emptiness check");
-          spot::emptiness_check_result_ptr res;
-
-          try {
-              res = ec->check();
-          }
-          catch (std::bad_alloc) {
-              std::cerr << "Out of memory during emptiness check."
-                        << std::endl;
-              exit_code = 2;
-              exit(exit_code);
-          }
-          tm.stop("running emptiness check");
-
-
-          memused = spot::memusage() - memused;
-
-	  ec->print_stats(std::cout);
-	  std::cout << memused << " pages allocated for emptiness check"
-		    << std::endl;
-
-          if (expect_counter_example == !res &&
-              (!expect_counter_example || ec->safe()))
-              exit_code = 1;
-
-          if (!res) {
-              std::cout << "no counterexample found";
-              if (!ec->safe() && expect_counter_example) {
-                  std::cout << " even if expected" << std::endl;
-                  std::cout << "this may be due to the use of the bit"
-                            << " state hashing technique" << std::endl;
-                  std::cout << "you can try to increase the heap size "
-                            << "or use an explicit storage"
-                            << std::endl;
-              }
-              std::cout << std::endl;
-              break;
-          }
-          else if (accepting_run) {
-              spot::twa_run_ptr run;
-              tm.start("computing accepting run");
-              try {
-                  run = res->accepting_run();
-              } catch (std::bad_alloc) {
-                  std::cerr << "Out of memory while looking for counterexample."
-                            << std::endl;
-                  exit_code = 2;
-                  exit(exit_code);
-	      }
-              tm.stop("computing accepting run");
-
-              if (!run) {
-                  std::cout << "a counterexample exists" << std::endl;
-              } else {
-                  tm.start("reducing accepting run");
-		  run = run->reduce();
-                  tm.stop("reducing accepting run");
-
-                  tm.start("printing accepting run");
-		  std::cout << *run;
-                  tm.stop("printing accepting run");
-	      }
-          }
-          else {
-              std::cout << "a counterexample exists "
-                        << "(use -C to print it)" << std::endl;
-          }
-      }
-      while (search_many);
-  }
+  if (workers > 1)
+      exit_code = swarm_check(workers, model, echeck_inst, product,
+                              expect_counter_example, accepting_run, tm);
+  else
+      exit_code = emptiness_check(echeck_inst, product,
+                                  expect_counter_example, accepting_run, tm);
 
  safe_exit:
   if (use_timer)
@@ -2,6 +2,7 @@
 #include "neco_tgba.h"
 #include "neco_state.h"
 #include "neco_succiter.h"
+#include <algorithm>
 #include <cstdio>
 
 namespace neco {
@@ -12,6 +13,7 @@ namespace neco {
                spot::bdd_dict_ptr dict,
                const spot::formula dead)
       : spot::kripke(dict)
+      , m_shuffle(false)
     {
         NECO_DEBUG_TRACE("tgba");
         assert(sap);
@@ -88,12 +90,23 @@ namespace neco {
             list->push_back( const_cast<struct Marking*>(st->get_marking()) );
         } else {
             cond &= m_alive_prop;
+            if (m_shuffle)
+                std::shuffle(list->begin(), list->end(), m_rng);
         }
         return new neco::succ_iterator(st, cond, list);
     }
 
     //////////////////////////////////////////////////
 
+    void tgba::set_swarm_seed(unsigned seed)
+    {
+        NECO_DEBUG_TRACE("set_swarm_seed");
+        m_shuffle = seed != 0;
+        m_rng.seed(seed);
+    }
+
+    //////////////////////////////////////////////////
+
     std::string tgba::format_state(const spot::state* state) const
     {
         NECO_DEBUG_TRACE("format_state");
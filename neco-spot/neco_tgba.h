@@ -3,6 +3,7 @@
 
 #include "neco_model.h"
 #include <bddx.h>
+#include <random>
 #include <vector>
 #include <spot/twa/bdddict.hh>
 #include <spot/kripke/kripke.hh>
@@ -31,6 +32,11 @@ public:
 
 	virtual std::string                     format_state(const spot::state* state) const;
 
+                                            //! Enumerate successors in a random order derived from \a seed.
+                                            //!
+                                            //! Used by swarm verification, a zero \a seed keeps the order of the model.
+	void                                    set_swarm_seed(unsigned seed);
+
 private:
                                                 tgba(const tgba& other) = delete;
         const tgba&                             operator=(const tgba& other) = delete;
@@ -41,6 +47,8 @@ private:
 	std::vector<int>                        m_necovar;	    //!< associated neco model variables, ie., atomic propositions IDs.
 	bdd                                     m_alive_prop;   //!< value of alive proposition
 	bdd                                     m_dead_prop;    //!< value of dead proposition
+	bool                                    m_shuffle;      //!< shuffle successors
+	mutable std::mt19937                    m_rng;          //!< successor order generator
 };
 
 }
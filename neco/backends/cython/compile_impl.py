@@ -62,7 +62,12 @@ def compile_IR(env, config, compiler_):
     module_pyx_file.declarations.append("cimport neco.ctypes.ctypes_ext as ctypes_ext")
     module_pyx_file.declarations.append("from snakes.nets import dot")
     module_pyx_file.declarations.append("import cPickle, StringIO")
-    module_pyx_file.declarations.append("from neco.extsnakes import Pid\n")
+    if not config.normalize_pids:
+        module_pyx_file.declarations.append("from neco.extsnakes import Pid\n")
+    if env.por:
+        module_pyx_file.declarations.append("import neco.por\n")
+    if env.pgo:
+        module_pyx_file.declarations.append("import neco.pgo\n")
 
     # command line imports
     for mod in config.imports:
@@ -71,6 +76,11 @@ def compile_IR(env, config, compiler_):
     # model imports
     module_pyx_file.declarations.extend(env.net_info.declare)
 
+    if config.normalize_pids:
+        # native pids, see ctypes_ext.Pid, imported last so that neco.extsnakes
+        # imports do not shadow them
+        module_pyx_file.declarations.append("from neco.ctypes.ctypes_ext import Pid\n")
+
     module_pyx_file.declarations.append("")
     for name, value  in compiler_.net.globals:
         string_io = StringIO.StringIO()
@@ -116,11 +126,30 @@ def compile_IR(env, config, compiler_):
     # this will populate body parts of some outputs
     env.marking_type.generate_code(env)
 
+    # tree exploration needs the leaves function produced with the marking type
+    if env.tree_leaves:
+        if config.no_stats: include_file_name = "include_tree_no_stats.pyx"
+        else:               include_file_name = "include_tree.pyx"
+
+        path = search_file(include_file_name, search_paths)
+        include_pyx = open(path , "r")
+
+        for line in include_pyx:
+            if line[-1] == '\n':
+                line = line[:-1]
+            module_pyx_file.declarations.append(line)
+
     # add functions to pyx file
     compiler = netir.CompilerVisitor(env)
     for node in env.function_nodes():
         module_pyx_file.body.append(compiler.compile(node))
 
+    if env.por:
+        module_pyx_file.body.append(cyast.E("_neco_por = " + env.por.constructor()))
+
+    if env.pgo:
+        module_pyx_file.body.append(cyast.E("_neco_pgo = " + env.pgo.constructor()))
+
     module_pyx_file.body.append(cyast.E('_neco_trace_ = {!r}'.format(compiler_.produce_compilation_trace())))
 
     ################################################################################
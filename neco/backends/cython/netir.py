@@ -1,7 +1,7 @@
 """ Cython ast compiler. """
 
 from neco.core.info import TypeInfo, ExpressionInfo
-from priv.common import CVarSet, from_neco_lib
+from priv.common import CVarSet, from_neco_lib, MASK_WORD_BITS, mask_word_count
 from priv.mrkpidfunctions import GENERATOR_PLACE
 import StringIO
 import cPickle as cPickle
@@ -51,6 +51,9 @@ class CompilerVisitor(coreir.CompilerVisitor):
         type_info = node.type
         if type_info.is_AnyType:
             return self.compile(node.body)
+        elif type_info.is_Bool:
+            # bool tokens are stored in C variables, values are already coerced
+            return self.compile(node.body)
 
         test = cyast.Call(func = cyast.Name('isinstance'),
                           args = [cyast.E(node.variable.name), cyast.E(self.env.type2str(type_info))])
@@ -199,6 +202,18 @@ class CompilerVisitor(coreir.CompilerVisitor):
                                      body = [ self.compile(node.body) ])
 
 
+    def compile_TokenLookup(self, node):
+        place_type = self.env.marking_type.get_place_type_by_name(node.place_name)
+        self.env.try_declare_cvar(node.token_var.name, node.token_var.type)
+        key = self.compile(node.key)
+        return cyast.Builder.If(test = place_type.contains_expr(env = self.env,
+                                                                marking_var = node.marking_var,
+                                                                compiled_token = key),
+                                body = [ cyast.Assign(targets = [ cyast.Name(node.token_var.name) ],
+                                                      value = key),
+                                         self.compile(node.body) ],
+                                orelse = [])
+
     def gen_different(self, indices):
 
         base = None
@@ -311,6 +326,97 @@ class CompilerVisitor(coreir.CompilerVisitor):
                                      args = [ self.compile(arg) for arg in node.arguments ])
                     )
 
+    def mask_words(self, bits):
+        """ Split mask bits into words.
+
+        @param bits: bit indexes.
+        @type bits: C{list}
+        @return: sorted word index and word mask pairs.
+        @rtype: C{list}
+        """
+        words = {}
+        for bit in bits:
+            word, offset = divmod(bit, MASK_WORD_BITS)
+            words[word] = words.get(word, 0) | (1 << offset)
+        return sorted(words.iteritems())
+
+    def mask_word_name(self, mask_var, word):
+        return "{}_{}".format(mask_var.name, word)
+
+    def compile_EnablingMask(self, node):
+        stmts = []
+        for word in range(mask_word_count(len(node.place_names))):
+            name = self.mask_word_name(node.mask_var, word)
+            self.env.try_declare_cvar(name, TypeInfo.get('UnsignedInt'))
+            stmts.append(cyast.E("{} = 0".format(name)))
+
+        for bit, place_name in enumerate(node.place_names):
+            place_type = self.env.marking_type.get_place_type_by_name(place_name)
+            [ (word, mask) ] = self.mask_words([ bit ])
+            stmts.append(cyast.Builder.If(test = place_type.not_empty_expr(env = self.env,
+                                                                          marking_var = node.marking_var),
+                                          body = [ cyast.E("{} |= {}".format(self.mask_word_name(node.mask_var, word), mask)) ],
+                                          orelse = []))
+        return stmts
+
+    def compile_LoadCandidates(self, node):
+        marking_type = self.env.marking_type
+        attr = marking_type.candidates_attribute
+        stmts = []
+        for word in range(mask_word_count(marking_type.tracked_transitions)):
+            name = self.mask_word_name(node.candidates_var, word)
+            self.env.try_declare_cvar(name, TypeInfo.get('UnsignedInt'))
+            stmts.append(cyast.E("{} = {}.{}[{}]".format(name, node.marking_var.name, attr, word)))
+            stmts.append(cyast.E("{}.{}[{}] = 0".format(node.marking_var.name, attr, word)))
+        return stmts
+
+    def compile_UpdateCandidates(self, node):
+        marking_type = self.env.marking_type
+        attr = marking_type.candidates_attribute
+        count = mask_word_count(marking_type.tracked_transitions)
+        affected = self.mask_words(node.affected)
+
+        stmts = []
+        if len(affected) < count:
+            index_var = self.env.variable_provider.new_variable(variable_type = TypeInfo.get('Int'))
+            self.env.try_declare_cvar(index_var.name, TypeInfo.get('Int'))
+            stmts.append(cyast.Builder.CFor(start = cyast.Num(0),
+                                            start_op = cyast.LtE(),
+                                            target = cyast.Name(index_var.name),
+                                            stop_op = cyast.Lt(),
+                                            stop = cyast.Num(count),
+                                            body = [ cyast.E("{}.{}[{}] = 0".format(node.marking_var.name,
+                                                                                   attr,
+                                                                                   index_var.name)) ],
+                                            orelse = []))
+
+        for word, mask in affected:
+            stmts.append(cyast.E("{}.{}[{}] = {}".format(node.marking_var.name, attr, word, mask)))
+
+        [ (word, mask) ] = self.mask_words([ node.transition ])
+        stmts.append(cyast.E("{}.{}[{}] |= {}".format(node.src_marking_var.name, attr, word, mask)))
+        return stmts
+
+    def compile_SpreadCandidates(self, node):
+        marking_type = self.env.marking_type
+        attr = marking_type.candidates_attribute
+        self.env.try_declare_cvar(node.successor_var.name, node.successor_var.type)
+        body = [ cyast.E("{succ}.{attr}[{word}] |= {mrk}.{attr}[{word}]".format(succ = node.successor_var.name,
+                                                                              mrk = node.marking_var.name,
+                                                                              attr = attr,
+                                                                              word = word))
+                 for word in range(mask_word_count(marking_type.tracked_transitions)) ]
+        return cyast.Builder.For(target = cyast.Name(node.successor_var.name),
+                                 iter = cyast.Name(node.marking_acc_var.name),
+                                 body = body)
+
+    def compile_IfEnabled(self, node):
+        tests = [ "({name} & {mask}) == {mask}".format(name = self.mask_word_name(node.mask_var, word), mask = mask)
+                  for word, mask in self.mask_words(node.required) ]
+        return cyast.Builder.If(test = cyast.E(" and ".join(tests)),
+                                body = self.compile(node.body),
+                                orelse = [])
+
     def compile_MarkingCopy(self, node):
         self.env.try_declare_cvar(node.dst.name, node.dst.type)
         return self.env.marking_type.gen_copy(env = self.env,
@@ -323,6 +429,10 @@ class CompilerVisitor(coreir.CompilerVisitor):
                                                                      markingset_var = node.marking_set_var,
                                                                      marking_var = node.marking_var))
 
+    def compile_UpdateHash(self, node):
+        # marking hashes are not cached
+        return []
+
     def compile_AddToken(self, node):
         place_type = self.env.marking_type.get_place_type_by_name(node.place_name)
         return place_type.add_token_stmt(env = self.env,
@@ -414,10 +524,16 @@ class CompilerVisitor(coreir.CompilerVisitor):
         for var in additionnal_decls:
             decl.add(var)
 
+        # partial order reduction and profiling call successor functions from python
+        if self.env.por or self.env.pgo:
+            lang = cyast.CpDef(public = True)
+        else:
+            lang = cyast.CDef(public = True)
+
         result = cyast.to_ast(cyast.Builder.FunctionDef(name = node.function_name,
                                                         args = self.succ_function_args(node),
                                                         body = stmts,
-                                                        lang = cyast.CDef(public = True),
+                                                        lang = lang,
                                                         returns = cyast.Name(""),
                                                         decl = decl))
         return result
@@ -442,17 +558,21 @@ class CompilerVisitor(coreir.CompilerVisitor):
                                          decl = decl)
 
     def compile_Succs(self, node):
+        self.env.push_cvar_env()
         body = []
         body.extend(self.compile(node.body))
         body.append(cyast.E("return " + node.arg_marking_acc_var.name))
+
+        decl = [ cyast.CVar(name = node.arg_marking_acc_var.name,
+                            type = self.env.type2str(node.arg_marking_acc_var.type),
+                            init = self.env.marking_set_type.new_marking_set_expr(self.env)) ]
+        decl.extend(self.env.pop_cvar_env())
         f1 = cyast.Builder.FunctionCpDef(name = node.function_name,
                                          args = self.main_succ_function_args(node),
                                          body = body,
                                          lang = cyast.CpDef(public = True),
                                          returns = cyast.Name("set"),
-                                         decl = [ cyast.CVar(name = node.arg_marking_acc_var.name,
-                                                             type = self.env.type2str(node.arg_marking_acc_var.type),
-                                                             init = self.env.marking_set_type.new_marking_set_expr(self.env)) ]
+                                         decl = decl
                                          )
 
         body = [ cyast.E("l = ctypes_ext.neco_list_new()") ]
@@ -542,8 +662,16 @@ class CompilerVisitor(coreir.CompilerVisitor):
         return [ assign, generator_place.add_pid_stmt(self.env, initial_pid_var, node.marking_var) ]
 
     def compile_NormalizeMarking(self, node):
-        return cyast.stmt(cyast.Call(func = cyast.E('normalize_pids'),
-                                     args = [cyast.E(node.marking_var.name)]))
+        # pids are normalized in place
+        self.env.try_declare_cvar(node.normalized_marking_var.name, node.normalized_marking_var.type)
+        return [ cyast.stmt(cyast.Call(func = cyast.E('normalize_pids'),
+                                       args = [cyast.E(node.marking_var.name)])),
+                 cyast.Assign(targets = [cyast.Name(node.normalized_marking_var.name)],
+                              value = cyast.Name(node.marking_var.name)) ]
+
+    def compile_UpdateHashSet(self, node):
+        # normalized markings are canonical, the pid-free hash set is not used
+        return []
 
     def compile_AddPid(self, node):
         place_type = self.env.marking_type.get_place_type_by_name(node.place_name)
@@ -553,7 +681,11 @@ class CompilerVisitor(coreir.CompilerVisitor):
                                          marking_var = node.marking_var)
 
     def compile_InitialPid(self, node):
-        return cyast.E(self.env.type2str(TypeInfo.get('Pid')) + '(1)')
+        return cyast.E(self.env.type2str(TypeInfo.get('Pid')) + '([1])')
+
+    def compile_PlaceCard(self, node):
+        place_type = self.env.marking_type.get_place_type_by_name(node.place_name)
+        return place_type.card_expr(self.env, node.marking_var)
 
 ################################################################################
 # EOF
@@ -2,7 +2,7 @@
 
 from neco.core.info import TypeInfo, PlaceInfo
 from priv import cyast, placetypes
-from priv.common import IsCythonPyxFile, IsCythonPxdFile
+from priv.common import IsCythonPyxFile, IsCythonPxdFile, mask_word_count
 from priv.lowlevel import ChunkManager
 import neco.core.nettypes as coretypes
 import neco.utils as utils
@@ -25,10 +25,14 @@ class StaticMarkingType(coretypes.MarkingType):
         # id provider for class attributes
         self.id_provider = utils.NameProvider() # used to produce attribute names
         self._process_place_types = {}
+        self._string_places = set()
+        self._strings = []
 
         #self.packing_enabled = config.bit_packing
         self.config = config
         self.chunk_manager = ChunkManager(self.id_provider.new(base="_packed"))
+        # words of candidate transitions, declared if enabledness is tracked
+        self.candidates_attribute = self.id_provider.new(base="_candidates")
 
         self.add_method_generator(priv.mrkmethods.InitGenerator())
         self.add_method_generator(priv.mrkmethods.DeallocGenerator())
@@ -44,6 +48,9 @@ class StaticMarkingType(coretypes.MarkingType):
         
         self.add_C_function_generator(priv.mrkfunctions.CompareGenerator())
         self.add_C_function_generator(priv.mrkfunctions.HashGenerator())
+        self.add_C_function_generator(priv.mrkfunctions.PackGenerator())
+        self.add_C_function_generator(priv.mrkfunctions.UnpackGenerator())
+        self.add_C_function_generator(priv.mrkfunctions.InternGenerator())
 
         if config.normalize_pids:
             self.add_C_function_generator(priv.mrkpidfunctions.UpdatePidsGenerator())
@@ -73,17 +80,156 @@ class StaticMarkingType(coretypes.MarkingType):
     
         pi_type = place_info.type
         if   pi_type.is_Int:        return placetypes.IntPlaceType(place_info, marking_type=self)
-        elif pi_type.is_Bool:       return placetypes.ObjectPlaceType(place_info, marking_type=self)
-        elif pi_type.is_String:     return placetypes.ObjectPlaceType(place_info, marking_type=self)
+        elif pi_type.is_Bool:
+            if self.__is_bool_place(place_info):
+                return placetypes.BoolPlaceType(place_info, marking_type=self)
+            return placetypes.ObjectPlaceType(place_info, marking_type=self)
+        elif pi_type.is_String:
+            if place_info.name in self._string_places:
+                return placetypes.StringPlaceType(place_info, self, self._strings)
+            return placetypes.ObjectPlaceType(place_info, marking_type=self)
         elif pi_type.is_BlackToken: return placetypes.BTPlaceType(place_info, marking_type=self, packed=False)
         elif pi_type.is_Pid:
             if self.config.normalize_pids:  return placetypes.PidPlaceType(place_info, marking_type=self)
             else:                           return placetypes.ObjectPlaceType(place_info, marking_type=self)
 
         elif pi_type.is_UserType:   return placetypes.ObjectPlaceType(place_info, marking_type=self)
+        elif self.__is_int_tuple_place(place_info):
+            return placetypes.IntTuplePlaceType(place_info, marking_type=self)
         else:
             return placetypes.ObjectPlaceType(place_info, marking_type=self)
 
+    def __is_int_tuple_place(self, place_info):
+        """ Check if tokens of a place can be stored as native int tuples.
+
+        Place types are not enforced by snakes, thus the place type is
+        trusted only if initial tokens are int tuples and if produced tokens
+        are built from values and variables, not from arbitrary expressions.
+        """
+        pi_type = place_info.type
+        if not pi_type.is_TupleType:
+            return False
+
+        size = len(pi_type)
+        if not (size in placetypes.INT_TUPLE_SIZES and all(t.is_Int for t in pi_type)):
+            return False
+
+        def is_int(value):
+            return isinstance(value, int) and not isinstance(value, bool)
+
+        def is_int_tuple(value):
+            return isinstance(value, tuple) and len(value) == size and all(is_int(v) for v in value)
+
+        if not all(is_int_tuple(token) for token in place_info.tokens):
+            return False
+
+        for transition in place_info.post:
+            for arc in transition.input_arcs:
+                if arc.place_info.name == place_info.name and arc.is_Flush:
+                    return False
+
+        for transition in place_info.pre:
+            for arc in transition.outputs:
+                if arc.place_info.name != place_info.name or arc.is_Variable:
+                    continue
+                elif arc.is_Value:
+                    if not is_int_tuple(arc.value.raw):
+                        return False
+                elif arc.is_Tuple:
+                    components = arc.tuple.components
+                    if len(components) != size:
+                        return False
+                    for component in components:
+                        if not (component.is_Variable or (component.is_Value and is_int(component.raw))):
+                            return False
+                else:
+                    return False
+        return True
+
+    def __is_bool_place(self, place_info):
+        """ Check if a place can be stored as a pair of counters.
+
+        Produced tokens are coerced to C{bool}, thus only initial tokens
+        and values need to be checked.
+        """
+        if not all(isinstance(token, bool) for token in place_info.tokens):
+            return False
+
+        for transition in place_info.post:
+            for arc in transition.input_arcs:
+                if arc.place_info.name == place_info.name and arc.is_Flush:
+                    return False
+
+        for transition in place_info.pre:
+            for arc in transition.outputs:
+                if arc.place_info.name != place_info.name:
+                    continue
+                elif arc.is_Value:
+                    if not isinstance(arc.value.raw, bool):
+                        return False
+                elif not (arc.is_Variable or arc.is_Expression):
+                    return False
+        return True
+
+    def __find_string_places(self):
+        """ Find places whose tokens can be interned.
+
+        A string place is kept if its initial tokens and produced values are
+        string constants and if produced variables are bound on a kept place
+        of the same transition. Other places are removed until a fixpoint
+        is reached. The table of strings is the sorted set of all constants.
+
+        @return: kept place names and the table of strings.
+        @rtype: C{tuple}
+        """
+        candidates = {}
+        for place_info in self.places:
+            if (place_info.type.is_String
+                and all(isinstance(token, str) for token in place_info.tokens)):
+                candidates[place_info.name] = place_info
+
+        strings = set()
+        changed = True
+        while changed:
+            changed = False
+            for name, place_info in candidates.items():
+                ok = True
+                for transition in place_info.post:
+                    for arc in transition.input_arcs:
+                        if arc.place_info.name == name and arc.is_Flush:
+                            ok = False
+
+                for transition in place_info.pre:
+                    bound = set(arc.variable.name
+                                for arc in transition.input_arcs
+                                if (arc.is_Variable or (arc.is_Test and arc.inner.is_Variable))
+                                and arc.place_info.name in candidates)
+                    for arc in transition.outputs:
+                        if arc.place_info.name != name:
+                            continue
+                        elif arc.is_Value:
+                            ok = ok and isinstance(arc.value.raw, str)
+                        elif arc.is_Variable:
+                            ok = ok and arc.variable.name in bound
+                        else:
+                            ok = False
+
+                if not ok:
+                    del candidates[name]
+                    changed = True
+
+        for name, place_info in candidates.iteritems():
+            strings.update(place_info.tokens)
+            for transition in place_info.pre:
+                for arc in transition.outputs:
+                    if arc.place_info.name == name and arc.is_Value:
+                        strings.add(arc.value.raw)
+            for transition in place_info.post:
+                for arc in transition.input_arcs:
+                    if arc.place_info.name == name and arc.is_Value:
+                        strings.add(arc.value.raw)
+        return set(candidates), sorted(strings)
+
     def __gen_one_safe_place_type(self, place_info):
         if not self.config.optimize:
             if place_info.type.is_BlackToken:
@@ -125,6 +271,7 @@ class StaticMarkingType(coretypes.MarkingType):
             self.__gen_flow_control_place_type(place_info)
         for place_info in self.one_safe_places:
             self.__gen_one_safe_place_type(place_info)
+        self._string_places, self._strings = self.__find_string_places()
         for place_info in self.places:
             self.place_types[place_info.name] = self.place_type_from_info(place_info)
         
@@ -177,6 +324,10 @@ class StaticMarkingType(coretypes.MarkingType):
             #   place = chunk_place_map[attr_name]
             cls.add_decl(cyast.Comment("{}".format(chunk.hint)))
 
+        if self.tracked_transitions:
+            count = mask_word_count(self.tracked_transitions)
+            cls.add_decl(cyast.CVar(self.candidates_attribute + '[' + str(count) + ']', type=env.type2str(TypeInfo.get('UnsignedInt'))))
+
         cls.add_method(cyast.FunctionDecl(name='copy',
                                           args=cyast.to_ast(cyast.A("self", cyast.Name(env.type2str(self.type)))),
                                           returns=cyast.Name(env.type2str(self.type)),
@@ -41,6 +41,28 @@ TypeInfo.register_type("UnsignedChar")
 
 TypeInfo.register_type("PidPlace")
 TypeInfo.register_type("GeneratorPlace")
+TypeInfo.register_type("PidTree")
+
+# sizes of int tuples stored natively (see TIntTuple in ctypes.h)
+INT_TUPLE_SIZES = range(2, 5)
+
+def int_tuple_place_type_name(size):
+    return "IntTuple{}Place".format(size)
+
+for size in INT_TUPLE_SIZES:
+    TypeInfo.register_type(int_tuple_place_type_name(size))
+
+# number of bits of enabling mask and candidate transition words
+MASK_WORD_BITS = 32
+
+def mask_word_count(bits):
+    """ Get the number of words needed to store some bits.
+
+    @param bits: number of bits.
+    @type bits: C{int}
+    @rtype: C{int}
+    """
+    return (bits + MASK_WORD_BITS - 1) // MASK_WORD_BITS
 
 ################################################################################
 
@@ -101,12 +123,18 @@ class CompilingEnvironment(core.CompilingEnvironment):
 
         self._registered_cython_types = dict()
 
+        # cleared if some place contents cannot be identified, see InternGenerator
+        self.tree_leaves = True
+
         # register types
         self.register_cython_type(TypeInfo.get('Bool'), 'short')
         self.register_cython_type(TypeInfo.get('Char'), 'char')
         self.register_cython_type(TypeInfo.get('Int'), 'int')
         self.register_cython_type(TypeInfo.get('Short'), 'short')
         self.register_cython_type(TypeInfo.get('IntPlace'), from_neco_lib('TGenericPlaceType[int]*'))
+        for size in INT_TUPLE_SIZES:
+            self.register_cython_type(TypeInfo.get(int_tuple_place_type_name(size)),
+                                      from_neco_lib('TGenericPlaceType[' + from_neco_lib('TIntTuple{}'.format(size)) + ']*'))
         self.register_cython_type(TypeInfo.get('MultiSet'), 'ctypes_ext.MultiSet')
         self.register_cython_type(TypeInfo.get('UnsignedChar'), 'unsigned char')
         self.register_cython_type(TypeInfo.get('UnsignedInt'), 'unsigned int')
@@ -118,8 +146,9 @@ class CompilingEnvironment(core.CompilingEnvironment):
             self.register_cython_type(TypeInfo.get('Pid'), from_neco_lib('Pid'))
         else:
             self.register_cython_type(TypeInfo.get('Pid'), 'object')
-        self.register_cython_type(TypeInfo.get('PidPlace'), from_neco_lib('TGenericPlaceType[' + from_neco_lib('Pid') + ']*'))
-        self.register_cython_type(TypeInfo.get('GeneratorPlace'), from_neco_lib('TGeneratorPlaceType[' + from_neco_lib('Pid') + ', int]*'))
+        self.register_cython_type(TypeInfo.get('PidPlace'), from_neco_lib('TPidPlaceType*'))
+        self.register_cython_type(TypeInfo.get('GeneratorPlace'), from_neco_lib('TPidGeneratorPlaceType*'))
+        self.register_cython_type(TypeInfo.get('PidTree'), from_neco_lib('TPidTree[int]*'))
 
     @property
     def cvars(self):
@@ -1,3 +1,4 @@
+from common import from_neco_lib
 from neco.core.info import VariableProvider, TypeInfo
 from neco.core.nettypes import MarkingTypeMethodGenerator
 import cyast
@@ -152,3 +153,189 @@ class CopyGenerator(MarkingTypeMethodGenerator):
         builder.emit_Return(cyast.E('self.copy()'))
         builder.end_FunctionDef()
         return cyast.to_ast(builder)
+
+def _serialized_place_types(marking_type):
+    """ Place types serialized after the packed attribute, sorted by place name. """
+    done = set()
+    if marking_type.chunk_manager.packed_bits() > 0:
+        attr, _, _ = marking_type.chunk_manager.packed_attribute()
+        done.add(attr)
+
+    for _, place_type in sorted(marking_type.place_types.iteritems()):
+        attr = place_type.get_attribute_name()
+        if attr in done:
+            continue
+        done.add(attr)
+        yield place_type
+
+class PackGenerator(MarkingTypeMethodGenerator):
+
+    def generate(self, env):
+        marking_type = env.marking_type
+
+        vp = VariableProvider()
+        marking_var = vp.new_variable(marking_type.type, "self")
+        buf_var = vp.new_variable(name = "buf")
+
+        builder = cyast.Builder()
+        builder.begin_FunctionCPDef(name = "neco_marking_pack",
+                                    args = (cyast.A(marking_var.name, type = env.type2str(marking_type.type))
+                                            .param(buf_var.name, type = "bytearray")),
+                                    returns = cyast.E("object"))
+
+        if marking_type.chunk_manager.packed_bits() > 0:
+            attr, _, count = marking_type.chunk_manager.packed_attribute()
+            for index in range(0, count):
+                builder.emit(cyast.stmt(cyast.E("{}({}, {}.{}[{}])".format(from_neco_lib("pack_byte"),
+                                                                           buf_var.name,
+                                                                           marking_var.name,
+                                                                           attr,
+                                                                           index))))
+
+        try:
+            for place_type in _serialized_place_types(marking_type):
+                builder.emit(place_type.pack_stmt(env, marking_var, buf_var))
+        except NotImplementedError, e:
+            builder.emit(cyast.E("raise NotImplementedError({!r})".format(str(e))))
+
+        builder.end_FunctionDef()
+        return cyast.to_ast(builder)
+
+class UnpackGenerator(MarkingTypeMethodGenerator):
+
+    def generate(self, env):
+        marking_type = env.marking_type
+
+        vp = VariableProvider()
+        buf_var = vp.new_variable(name = "buf")
+        marking_var = vp.new_variable(marking_type.type, "m")
+        unpacker_var = vp.new_variable(name = "unpacker")
+
+        builder = cyast.Builder()
+        builder.begin_FunctionCPDef(name = "neco_marking_unpack",
+                                    args = cyast.A(buf_var.name, type = "object"),
+                                    returns = cyast.E(env.type2str(marking_type.type)),
+                                    decl = [ cyast.Builder.CVar(marking_var.name, type = env.type2str(marking_type.type)),
+                                             cyast.Builder.CVar(unpacker_var.name, type = from_neco_lib("Unpacker")) ])
+
+        builder.emit(cyast.E("{} = {}(True)".format(marking_var.name, env.type2str(marking_type.type))))
+        builder.emit(cyast.E("{} = {}({})".format(unpacker_var.name, from_neco_lib("Unpacker"), buf_var.name)))
+
+        if marking_type.chunk_manager.packed_bits() > 0:
+            attr, _, count = marking_type.chunk_manager.packed_attribute()
+            for index in range(0, count):
+                builder.emit(cyast.E("{}.{}[{}] = {}.read_byte()".format(marking_var.name,
+                                                                         attr,
+                                                                         index,
+                                                                         unpacker_var.name)))
+
+        try:
+            for place_type in _serialized_place_types(marking_type):
+                builder.emit(place_type.unpack_stmt(env, marking_var, unpacker_var))
+        except NotImplementedError, e:
+            builder.emit(cyast.E("raise NotImplementedError({!r})".format(str(e))))
+
+        builder.emit_Return(cyast.E(marking_var.name))
+        builder.end_FunctionDef()
+        return cyast.to_ast(builder)
+
+def _intern_table_decl(table_type, table_name):
+    if table_type.endswith('*'):
+        init = "new {}()".format(table_type[0:-1])
+    else:
+        init = "{}()".format(table_type)
+    return cyast.stmt(cyast.Name("cdef {} {} = {}".format(table_type, table_name, init)))
+
+class InternGenerator(MarkingTypeMethodGenerator):
+    """ Produce functions sharing equal place contents between markings.
+
+    Each place stored by reference gets a module level intern table,
+    C{neco_marking_intern} replaces the containers of a marking by the
+    equal ones already interned. It is meant to be called on markings
+    added to the state space, containers are then shared by all the
+    visited markings instead of being duplicated.
+
+    C{neco_marking_leaves} writes the ids of the place contents of a
+    marking in the leaves of a C{TreeStore}, contents of places stored by
+    value are identified by their serialized form. If a place can be
+    neither interned nor serialized, this function is not produced and
+    C{env.tree_leaves} is cleared, the module then has no tree exploration.
+    """
+
+    def generate(self, env):
+        marking_type = env.marking_type
+
+        vp = VariableProvider()
+        marking_var = vp.new_variable(marking_type.type, "self")
+        store_var = vp.new_variable(name = "store")
+        leaves_var = vp.new_variable(name = "leaves")
+        buf_var = vp.new_variable(name = "buf")
+
+        tables = []
+        intern_builder = cyast.Builder()
+        intern_builder.begin_FunctionCPDef(name = "neco_marking_intern",
+                                           args = cyast.A(marking_var.name, type = env.type2str(marking_type.type)),
+                                           returns = cyast.E("object"))
+
+        leaves_builder = cyast.Builder()
+        leaves_builder.begin_PrivateFunctionCDef(name = "neco_marking_leaves",
+                                                 args = (cyast.A(marking_var.name, type = env.type2str(marking_type.type))
+                                                         .param(store_var.name, type = from_neco_lib("TreeStore"))),
+                                                 returns = cyast.E("object"),
+                                                 decl = [ cyast.Builder.CVar(name = buf_var.name, type = "bytearray"),
+                                                          cyast.Builder.CVar(name = leaves_var.name, type = "int*",
+                                                                             init = cyast.E("{}.leaves()".format(store_var.name))) ])
+        leaves = []
+
+        if marking_type.chunk_manager.packed_bits() > 0:
+            attr, _, count = marking_type.chunk_manager.packed_attribute()
+            table_name = "_neco_leaves" + attr
+            tables.append(_intern_table_decl(from_neco_lib('InternTable'), table_name))
+            leaves.append(cyast.E("{} = bytearray()".format(buf_var.name)))
+            for index in range(0, count):
+                leaves.append(cyast.stmt(cyast.E("{}({}, {}.{}[{}])".format(from_neco_lib("pack_byte"),
+                                                                            buf_var.name,
+                                                                            marking_var.name,
+                                                                            attr,
+                                                                            index))))
+            leaves.append(cyast.E("{}[0] = {}.id(bytes({}))".format(leaves_var.name, table_name, buf_var.name)))
+
+        leaf_count = len(leaves) and 1
+        try:
+            for place_type in _serialized_place_types(marking_type):
+                if place_type.intern_table_type(env) is None:
+                    # stored by value, identified by its serialized form
+                    table_name = "_neco_leaves" + place_type.get_attribute_name()
+                    tables.append(_intern_table_decl(from_neco_lib('InternTable'), table_name))
+                    leaves.append(cyast.E("{} = bytearray()".format(buf_var.name)))
+                    leaves.append(place_type.pack_stmt(env, marking_var, buf_var))
+                    leaves.append(cyast.E("{}[{}] = {}.id(bytes({}))".format(leaves_var.name, leaf_count,
+                                                                             table_name, buf_var.name)))
+                else:
+                    table_name = "_neco_intern" + place_type.get_attribute_name()
+                    leaves.append(cyast.E("{}[{}] = {}.id({}.{})".format(leaves_var.name, leaf_count, table_name,
+                                                                         marking_var.name,
+                                                                         place_type.get_attribute_name())))
+                leaf_count += 1
+        except NotImplementedError, e:
+            print "[ tree exploration disabled, {} ]".format(e)
+            env.tree_leaves = False
+
+        for place_type in _serialized_place_types(marking_type):
+            table_type = place_type.intern_table_type(env)
+            if table_type is not None:
+                table_name = "_neco_intern" + place_type.get_attribute_name()
+                tables.append(_intern_table_decl(table_type, table_name))
+                intern_builder.emit(place_type.intern_stmt(env, marking_var, table_name))
+
+        intern_builder.emit_Return(cyast.E(marking_var.name))
+        intern_builder.end_FunctionDef()
+
+        if not env.tree_leaves:
+            return tables + [ cyast.to_ast(intern_builder) ]
+
+        leaves_builder.emit(leaves)
+        leaves_builder.end_FunctionDef()
+
+        tables.append(cyast.stmt(cyast.Name("cdef int neco_leaf_count = {}".format(leaf_count))))
+        return tables + [ cyast.to_ast(intern_builder), cyast.to_ast(leaves_builder) ]
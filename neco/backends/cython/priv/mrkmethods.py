@@ -1,3 +1,4 @@
+from common import MASK_WORD_BITS, mask_word_count
 from neco.core.info import VariableProvider, TypeInfo
 from neco.core.nettypes import MarkingTypeMethodGenerator
 import cyast
@@ -57,6 +58,13 @@ class InitGenerator(MarkingTypeMethodGenerator):
             builder.emit(place_type.new_place_stmt(env, self_var))
             builder.emit(builder.Comment("{} - 1s: {} - {}".format(place_type.info.name, place_type.one_safe(), place_type.info.type)))
         builder.end_If()
+
+        # all transitions are candidates of markings built from scratch
+        for index in range(0, mask_word_count(marking_type.tracked_transitions)):
+            builder.emit(cyast.E("{object}.{attribute}[{index!s}] = {mask}".format(object=self_var.name,
+                                                                                  attribute=marking_type.candidates_attribute,
+                                                                                  index=index,
+                                                                                  mask=(1 << MASK_WORD_BITS) - 1)))
         builder.end_FunctionDef()
         return cyast.to_ast(builder)
 
@@ -1,10 +1,12 @@
-from common import NecoTypeError, from_neco_lib
+from common import NecoTypeError, from_neco_lib, INT_TUPLE_SIZES, \
+    int_tuple_place_type_name
 from lowlevel import Mask
 from neco import extsnakes
 from neco.core.info import TypeInfo
 from neco.core.nettypes import provides_by_index_access, \
     provides_by_index_deletion
 from neco.utils import should_not_be_called, todo
+from neco.core import netir
 import cyast
 import math
 import neco.core.nettypes as coretypes
@@ -107,7 +109,8 @@ class CythonPlaceType(object):
 
     @property
     def allows_pids(self):
-        return self.type.allows_pids
+        """ C{True} if tokens of the place may contain pids """
+        return self.token_type.has_pids
 
     def get_attribute_name(self):
         return self.chunk.get_attribute_name()
@@ -131,12 +134,53 @@ class CythonPlaceType(object):
     def checking_need_helper(self):
         return self._checking_need_helper_
 
+    def pack_stmt(self, env, marking_var, buf_var):
+        """ Produce statements appending the place content to a bytearray.
+
+        Packed places are not concerned, their bits are serialized with the
+        packed attribute of the marking.
+        """
+        raise NotImplementedError("binary serialization of {} places".format(self.__class__.__name__))
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        """ Produce statements reading back the place content produced by L{pack_stmt}. """
+        raise NotImplementedError("binary serialization of {} places".format(self.__class__.__name__))
+
+    def update_pid_tree_stmt(self, env, marking_var, tree_var, value):
+        """ Produce statements adding the pids of the place to a pid tree.
+
+        @param value: pid-free data distinguishing the place.
+        @type value: C{int}
+        """
+        raise NotImplementedError("pid normalization of {} places".format(self.__class__.__name__))
+
+    def update_pids_stmt(self, env, marking_var, tree_var):
+        """ Produce statements renaming pids of the place with respect to a normalized pid tree. """
+        raise NotImplementedError("pid normalization of {} places".format(self.__class__.__name__))
+
+    def intern_table_type(self, env):
+        """ Type of the table used to share equal place containers.
+
+        @return: cython type name, C{None} if the place is stored by value.
+        @rtype: C{str}
+        """
+        return None
+
+    def intern_stmt(self, env, marking_var, table_name):
+        """ Produce statements replacing the place container by the shared one. """
+        attr_name = self.get_attribute_name()
+        return cyast.E("{m}.{attr} = {table}.intern({m}.{attr})".format(m = marking_var.name,
+                                                                        attr = attr_name,
+                                                                        table = table_name))
+
 ################################################################################
 
 @checking_without_helper
 class ObjectPlaceType(coretypes.ObjectPlaceType, CythonPlaceType):
     """ Python implementation of fallback place type. """
 
+    _lookup_ = True
+
     def __init__(self, place_info, marking_type):
         coretypes.ObjectPlaceType.__init__(self,
                                            place_info = place_info,
@@ -158,6 +202,9 @@ class ObjectPlaceType(coretypes.ObjectPlaceType, CythonPlaceType):
     def attribute_expr(self, env, marking_var):
         return cyast.E('{}.{}'.format(marking_var.name, self.chunk.get_attribute_name()))
 
+    def intern_table_type(self, env):
+        return from_neco_lib('InternTable')
+
     def hash_expr(self, env, marking_var):
         return cyast.E('{}.{}.hash()'.format(marking_var.name, self.chunk.get_attribute_name()))
 
@@ -167,6 +214,11 @@ class ObjectPlaceType(coretypes.ObjectPlaceType, CythonPlaceType):
     def iterable_expr(self, env, marking_var):
         return self.attribute_expr(env, marking_var)
 
+    def contains_expr(self, env, marking_var, compiled_token):
+        return cyast.Call(func = cyast.Attribute(value = self.attribute_expr(env, marking_var),
+                                                 attr = 'has_key'),
+                          args = [ compiled_token ])
+
     def remove_token_stmt(self, env, token_expr, compiled_token, marking_var):
         return cyast.stmt(cyast.Call(func = cyast.Attribute(value = self.attribute_expr(env, marking_var),
                                                           attr = 'remove'),
@@ -222,6 +274,26 @@ class ObjectPlaceType(coretypes.ObjectPlaceType, CythonPlaceType):
                                                attr = 'compare'),
                           args = [right])
 
+    def pack_stmt(self, env, marking_var, buf_var):
+        return cyast.stmt(cyast.E("{}({}, {}.{})".format(from_neco_lib("pack_multiset"), buf_var.name,
+                                                         marking_var.name, self.chunk.get_attribute_name())))
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        return cyast.E("{}.{} = {}.read_multiset()".format(marking_var.name, self.chunk.get_attribute_name(),
+                                                           unpacker_var.name))
+
+    def update_pid_tree_stmt(self, env, marking_var, tree_var, value):
+        return cyast.stmt(cyast.Call(func = cyast.E(from_neco_lib("multiset_update_pid_tree")),
+                                     args = [ self.attribute_expr(env, marking_var),
+                                              cyast.Name(tree_var.name),
+                                              cyast.Num(value) ]))
+
+    def update_pids_stmt(self, env, marking_var, tree_var):
+        return cyast.Assign(targets = [ self.attribute_expr(env, marking_var) ],
+                            value = cyast.Call(func = cyast.E(from_neco_lib("multiset_update_pids")),
+                                               args = [ self.attribute_expr(env, marking_var),
+                                                        cyast.Name(tree_var.name) ]))
+
 #    def not_empty_expr(self, env, marking_var):
 #        return self.place_expr(env, marking_var)
 
@@ -271,6 +343,9 @@ class GenericPlaceType(coretypes.PlaceType, CythonPlaceType):
     def attribute_expr(self, env, marking_var):
         return cyast.E('{}.{}'.format(marking_var.name, self.chunk.get_attribute_name()))
 
+    def intern_table_type(self, env):
+        return from_neco_lib('TInternTable[{}]*'.format(self.generic_type_name(env)))
+
     def new_place_stmt(self, env, marking_var):
         return cyast.Assign(targets = [self.attribute_expr(env, marking_var)],
                             value = cyast.Name('new {}()'.format(self.generic_type_name(env))))
@@ -338,6 +413,9 @@ class GenericPlaceType(coretypes.PlaceType, CythonPlaceType):
         place_expr = self.attribute_expr(env, marking_var)
         return cyast.Call(func = cyast.Builder.Helper(place_expr).attr("size").ast())
 
+    def card_expr(self, env, marking_var):
+        return self.get_size_expr(env, marking_var)
+
     def get_token_expr(self, env, index_expr, compiled_index, marking_var):
         check_index_type(index_expr)
         check_marking_type(marking_var)
@@ -373,7 +451,7 @@ class GenericPlaceType(coretypes.PlaceType, CythonPlaceType):
     def not_empty_expr(self, env, marking_var):
         check_marking_type(marking_var)
 
-        place_expr = self.place_expr(env, marking_var)
+        place_expr = self.attribute_expr(env, marking_var)
         return cyast.Call(func = cyast.Builder.Helper(place_expr).attr("not_empty").ast())
 
     @todo
@@ -433,15 +511,178 @@ class IntPlaceType(GenericPlaceType):
         return cyast.Call(func = cyast.E(from_neco_lib("int_place_type_to_multiset")),
                           args = [place_expr])
 
+    def pack_stmt(self, env, marking_var, buf_var):
+        return cyast.stmt(cyast.E("{}({}, {}.{})".format(from_neco_lib("pack_int_place_type"), buf_var.name,
+                                                         marking_var.name, self.chunk.get_attribute_name())))
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        # the place was allocated together with the marking
+        return cyast.stmt(cyast.E("{}.read_int_place_type({}.{})".format(unpacker_var.name,
+                                                                         marking_var.name, self.chunk.get_attribute_name())))
+
+
+class IntTuplePlaceType(GenericPlaceType):
+    """ Place type for unbounded places holding flat tuples of 'int'.
+
+    Tokens are stored by value as C{TIntTuple} structures and are
+    converted to python tuples when they are read.
+    """
+
+    def __init__(self, place_info, marking_type):
+        self.size = len(place_info.type)
+        assert(self.size in INT_TUPLE_SIZES)
+        GenericPlaceType.__init__(self, place_info, marking_type,
+                                  TypeInfo.get(int_tuple_place_type_name(self.size)), place_info.type)
+
+    def generic_type_name(self, env):
+        return from_neco_lib('TGenericPlaceType[' + from_neco_lib('TIntTuple{}'.format(self.size)) + ']')
+
+    def from_object_expr(self, compiled_token):
+        return cyast.Call(func = cyast.E(from_neco_lib("int_tuple{}_from_object".format(self.size))),
+                          args = [ compiled_token ])
+
+    def remove_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        return GenericPlaceType.remove_token_stmt(self, env, token_expr,
+                                                  self.from_object_expr(compiled_token), marking_var)
+
+    def add_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        return GenericPlaceType.add_token_stmt(self, env, token_expr,
+                                               self.from_object_expr(compiled_token), marking_var)
+
+    def get_token_expr(self, env, index_expr, compiled_index, marking_var):
+        token = GenericPlaceType.get_token_expr(self, env, index_expr, compiled_index, marking_var)
+        return cyast.Call(func = cyast.E(from_neco_lib("int_tuple_to_object")),
+                          args = [ cyast.Builder.Helper(token).attr("mValues").ast(), cyast.Num(self.size) ])
+
+    def values_args(self, env, marking_var):
+        """ Arguments describing tokens as an int array: data, count and tuple size. """
+        place_expr = self.attribute_expr(env, marking_var)
+        return [ cyast.Cast(target = 'int*', value = cyast.Call(func = cyast.Builder.Helper(place_expr).attr("data").ast())),
+                 cyast.Call(func = cyast.Builder.Helper(place_expr).attr("size").ast()),
+                 cyast.Num(self.size) ]
+
+    def multiset_expr(self, env, marking_var):
+        check_marking_type(marking_var)
+
+        return cyast.Call(func = cyast.E(from_neco_lib("int_tuple_place_type_to_multiset")),
+                          args = self.values_args(env, marking_var))
+
+    def pack_stmt(self, env, marking_var, buf_var):
+        return cyast.stmt(cyast.Call(func = cyast.E(from_neco_lib("pack_int_tuple_place_type")),
+                                     args = [ cyast.Name(buf_var.name) ] + self.values_args(env, marking_var)))
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        # the place was allocated together with the marking
+        return cyast.stmt(cyast.Call(func = cyast.E(from_neco_lib("read_int_tuple{}_place_type".format(self.size))),
+                                     args = [ cyast.Name(unpacker_var.name), self.attribute_expr(env, marking_var) ]))
+
+class StringPlaceType(IntPlaceType):
+    """ Place type for unbounded places holding string constants.
+
+    Strings are interned into their index in the table of string constants
+    of the net, the place is then handled as an 'int' place and tokens are
+    converted back to strings when they are read.
+    """
+
+    def __init__(self, place_info, marking_type, strings):
+        GenericPlaceType.__init__(self, place_info, marking_type,
+                                  TypeInfo.get("IntPlace"), TypeInfo.get("Int"))
+        self._token_type = place_info.type
+        self.strings = tuple(strings)
+        self.codes = dict((string, code) for code, string in enumerate(self.strings))
+
+    def generic_type_name(self, env):
+        return from_neco_lib('TGenericPlaceType[int]')
+
+    def code_expr(self, token_expr, compiled_token):
+        if isinstance(token_expr, netir.Value):
+            value = getattr(token_expr.value, 'raw', token_expr.value)
+            if value in self.codes:
+                return cyast.Num(self.codes[value])
+        return cyast.Call(func = cyast.E(from_neco_lib("string_code")),
+                          args = [ cyast.E(repr(self.strings)), compiled_token ])
+
+    def remove_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        return IntPlaceType.remove_token_stmt(self, env, token_expr,
+                                              self.code_expr(token_expr, compiled_token), marking_var)
+
+    def add_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        return IntPlaceType.add_token_stmt(self, env, token_expr,
+                                           self.code_expr(token_expr, compiled_token), marking_var)
+
+    def get_token_expr(self, env, index_expr, compiled_index, marking_var):
+        code = IntPlaceType.get_token_expr(self, env, index_expr, compiled_index, marking_var)
+        return cyast.Subscript(value = cyast.E(repr(self.strings)),
+                               slice = cyast.Index(cyast.Cast(target = 'int', value = code)))
+
+    def dump_expr(self, env, marking_var):
+        check_marking_type(marking_var)
+
+        return cyast.Call(func = cyast.E(from_neco_lib("string_place_type_cstr")),
+                          args = [ self.attribute_expr(env, marking_var), cyast.E(repr(self.strings)) ])
+
+    def multiset_expr(self, env, marking_var):
+        check_marking_type(marking_var)
+
+        return cyast.Call(func = cyast.E(from_neco_lib("string_place_type_to_multiset")),
+                          args = [ self.attribute_expr(env, marking_var), cyast.E(repr(self.strings)) ])
 
 class PidPlaceType(GenericPlaceType):
-    """ Place type for small unbounded 'int' places. """
+    """ Place type for unbounded 'Pid' places.
+
+    Pids are stored by value as C{TPid} structures and are converted to
+    C{ctypes_ext.Pid} objects when they are read.
+    """
 
     def __init__(self, place_info, marking_type):
         assert(place_info.type == TypeInfo.get('Pid'))
         GenericPlaceType.__init__(self, place_info, marking_type,
                                   TypeInfo.get("PidPlace"), TypeInfo.get("Pid"))
 
+    def generic_type_name(self, env):
+        return from_neco_lib('TPidPlaceType')
+
+    def from_object_expr(self, compiled_token):
+        return cyast.Call(func = cyast.E(from_neco_lib("pid_to_native")),
+                          args = [ compiled_token ])
+
+    def remove_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        return GenericPlaceType.remove_token_stmt(self, env, token_expr,
+                                                  self.from_object_expr(compiled_token), marking_var)
+
+    def add_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        return GenericPlaceType.add_token_stmt(self, env, token_expr,
+                                               self.from_object_expr(compiled_token), marking_var)
+
+    def get_token_expr(self, env, index_expr, compiled_index, marking_var):
+        token = GenericPlaceType.get_token_expr(self, env, index_expr, compiled_index, marking_var)
+        return cyast.Call(func = cyast.E(from_neco_lib("pid_from_native")),
+                          args = [ token ])
+
+    def multiset_expr(self, env, marking_var):
+        check_marking_type(marking_var)
+
+        return cyast.Call(func = cyast.E(from_neco_lib("pid_place_type_to_multiset")),
+                          args = [ self.attribute_expr(env, marking_var) ])
+
+    def pack_stmt(self, env, marking_var, buf_var):
+        return cyast.stmt(cyast.E("{}({}, {}.{})".format(from_neco_lib("pack_pid_place_type"), buf_var.name,
+                                                         marking_var.name, self.chunk.get_attribute_name())))
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        # the place was allocated together with the marking
+        return cyast.stmt(cyast.E("{}.read_pid_place_type({}.{})".format(unpacker_var.name,
+                                                                         marking_var.name, self.chunk.get_attribute_name())))
+
+    def update_pid_tree_stmt(self, env, marking_var, tree_var, value):
+        return cyast.stmt(cyast.Builder.Helper(cyast.Name(tree_var.name)).attr("add_pid_place")
+                          .call([ self.attribute_expr(env, marking_var), cyast.Num(value) ]).ast())
+
+    def update_pids_stmt(self, env, marking_var, tree_var):
+        return cyast.Assign(targets = [ self.attribute_expr(env, marking_var) ],
+                            value = cyast.Builder.Helper(cyast.Name(tree_var.name)).attr("update_pid_place")
+                            .call([ self.attribute_expr(env, marking_var) ]).ast())
+
 class OneSafePlaceType(coretypes.OneSafePlaceType, CythonPlaceType):
     """ Cython one safe place Type implementation.
 
@@ -662,6 +903,34 @@ class OneSafePlaceType(coretypes.OneSafePlaceType, CythonPlaceType):
                             body = [ cyast.E('1') ],
                             orelse = [ cyast.E('0')])
 
+    def pack_stmt(self, env, marking_var, buf_var):
+        # the token is only stored if the place is not empty,
+        # a packed helper is serialized with the packed attribute.
+        stmts = []
+        if not self.helper_chunk.packed:
+            stmts.append(cyast.stmt(cyast.E("{}({}, {}.{})".format(from_neco_lib("pack_byte"), buf_var.name,
+                                                                   marking_var.name, self.helper_chunk.get_attribute_name()))))
+
+        function = "pack_int" if self.info.type.is_Int else "pack_object"
+        pack_token = cyast.stmt(cyast.E("{}({}, {}.{})".format(from_neco_lib(function), buf_var.name,
+                                                               marking_var.name, self.chunk.get_attribute_name())))
+        stmts.append(cyast.to_ast(cyast.Builder.If(test = self.not_empty_expr(env, marking_var),
+                                                   body = [ pack_token ])))
+        return stmts
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        stmts = []
+        if not self.helper_chunk.packed:
+            stmts.append(cyast.E("{}.{} = {}.read_byte()".format(marking_var.name, self.helper_chunk.get_attribute_name(),
+                                                                 unpacker_var.name)))
+
+        method = "read_int" if self.info.type.is_Int else "read_object"
+        unpack_token = cyast.E("{}.{} = {}.{}()".format(marking_var.name, self.chunk.get_attribute_name(),
+                                                        unpacker_var.name, method))
+        stmts.append(cyast.to_ast(cyast.Builder.If(test = self.not_empty_expr(env, marking_var),
+                                                   body = [ unpack_token ])))
+        return stmts
+
 
 ################################################################################
 
@@ -788,6 +1057,16 @@ class BTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
                                    op = cyast.Add(),
                                    value = cyast.Num(1))
 
+    def pack_stmt(self, env, marking_var, buf_var):
+        assert(not self.chunk.packed)
+        return cyast.stmt(cyast.E("{}({}, {}.{})".format(from_neco_lib("pack_int"), buf_var.name,
+                                                         marking_var.name, self.chunk.get_attribute_name())))
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        assert(not self.chunk.packed)
+        return cyast.E("{}.{} = {}.read_int()".format(marking_var.name, self.chunk.get_attribute_name(),
+                                                      unpacker_var.name))
+
     def copy_stmt(self, env, dst_marking_var, src_marking_var):
         if self.chunk.packed:
             raise NotImplementedError
@@ -813,9 +1092,12 @@ class BTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
                         orelse = [])
 
     def card_expr(self, env, marking_var):
-        return cyast.IfExp(test = self.not_empty_expr(env, marking_var),
-                           body = [ cyast.E('1') ],
-                           orelse = [ cyast.E('0')])
+        if self.chunk.packed:
+            return cyast.IfExp(test = self.not_empty_expr(env, marking_var),
+                               body = [ cyast.E('1') ],
+                               orelse = [ cyast.E('0')])
+        else:
+            return self.attribute_expr(env, marking_var)
 
 
     def multiset_expr(self, env, marking_var):
@@ -849,6 +1131,125 @@ class BTPlaceType(coretypes.BTPlaceType, CythonPlaceType):
                                       body = [ compiled_body ])
             return [ ifnode ]
 
+class BoolPlaceType(coretypes.PlaceType, CythonPlaceType):
+    """ Place type for unbounded 'bool' places.
+
+    The place is encoded using two counters, the number of C{False} tokens
+    and the number of C{True} tokens.
+    """
+
+    def __init__(self, place_info, marking_type):
+        coretypes.PlaceType.__init__(self,
+                                     place_info = place_info,
+                                     marking_type = marking_type,
+                                     type_info = TypeInfo.get('Bool'),
+                                     token_type = TypeInfo.get('Bool'))
+
+        self.chunk = marking_type.chunk_manager.new_chunk(marking_type.id_provider.get(self),
+                                                          TypeInfo.get('Int'))
+        self.true_chunk = marking_type.chunk_manager.new_chunk(marking_type.id_provider.new(),
+                                                               TypeInfo.get('Int'))
+
+        self.chunk.hint = "{} - {!s} <False count>".format(place_info.name, place_info.type)
+        self.true_chunk.hint = "{} - {!s} <True count>".format(place_info.name, place_info.type)
+        self.info = place_info
+        self.marking_type = marking_type
+
+    def counters(self, marking_var):
+        """ Get C{False} and C{True} counter expressions.
+
+        @rtype: C{tuple} of C{str}
+        """
+        return ("{}.{}".format(marking_var.name, self.chunk.get_attribute_name()),
+                "{}.{}".format(marking_var.name, self.true_chunk.get_attribute_name()))
+
+    def new_place_stmt(self, env, marking_var):
+        return [ cyast.E("{} = 0".format(counter)) for counter in self.counters(marking_var) ]
+
+    def delete_stmt(self, env, marking_var):
+        return []
+
+    def hash_expr(self, env, marking_var):
+        false_count, true_count = self.counters(marking_var)
+        return cyast.E("({} << 16) ^ {}".format(false_count, true_count))
+
+    def compare_expr(self, env, left_marking_var, right_marking_var):
+        left_false, left_true = self.counters(left_marking_var)
+        right_false, right_true = self.counters(right_marking_var)
+        return cyast.E("({lf} - {rf}) if {lf} != {rf} else ({lt} - {rt})".format(lf = left_false,
+                                                                                 rf = right_false,
+                                                                                 lt = left_true,
+                                                                                 rt = right_true))
+
+    def not_empty_expr(self, env, marking_var):
+        return cyast.E("({} + {}) > 0".format(*self.counters(marking_var)))
+
+    def card_expr(self, env, marking_var):
+        return cyast.E("{} + {}".format(*self.counters(marking_var)))
+
+    @should_not_be_called
+    def iterable_expr(self, env, marking_var): pass
+
+    def update_stmt(self, compiled_token, marking_var, op):
+        false_count, true_count = self.counters(marking_var)
+        return cyast.If(test = compiled_token,
+                        body = [ cyast.AugAssign(target = cyast.E(true_count), op = op, value = cyast.Num(1)) ],
+                        orelse = [ cyast.AugAssign(target = cyast.E(false_count), op = op, value = cyast.Num(1)) ])
+
+    def remove_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        return self.update_stmt(compiled_token, marking_var, cyast.Sub())
+
+    def add_token_stmt(self, env, token_expr, compiled_token, marking_var):
+        return self.update_stmt(compiled_token, marking_var, cyast.Add())
+
+    def token_expr(self, env, token):
+        return cyast.E(repr(token))
+
+    def copy_stmt(self, env, dst_marking_var, src_marking_var):
+        return [ cyast.E("{} = {}".format(dst, src))
+                 for dst, src in zip(self.counters(dst_marking_var), self.counters(src_marking_var)) ]
+
+    def light_copy_stmt(self, env, dst_marking_var, src_marking_var):
+        return self.copy_stmt(env, dst_marking_var, src_marking_var)
+
+    def dump_expr(self, env, marking_var):
+        return cyast.E("'[' + ', '.join(['False'] * {} + ['True'] * {}) + ']'".format(*self.counters(marking_var)))
+
+    def multiset_expr(self, env, marking_var):
+        return cyast.E("{}({}, {})".format(from_neco_lib("bool_place_type_to_multiset"), *self.counters(marking_var)))
+
+    def pack_stmt(self, env, marking_var, buf_var):
+        return [ cyast.stmt(cyast.E("{}({}, {})".format(from_neco_lib("pack_int"), buf_var.name, counter)))
+                 for counter in self.counters(marking_var) ]
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        return [ cyast.E("{} = {}.read_int()".format(counter, unpacker_var.name))
+                 for counter in self.counters(marking_var) ]
+
+    def enumerate(self, env, marking_var, token_var, compiled_body):
+        # at most two iterations, one for each value with a non zero counter
+        index_var = env.variable_provider.new_variable(variable_type = TypeInfo.get('Int'))
+        env.try_declare_cvar(index_var.name, TypeInfo.get('Int'))
+        env.try_declare_cvar(token_var.name, token_var.type)
+
+        false_count, true_count = self.counters(marking_var)
+        count = cyast.E("({} if {} else {})".format(true_count, index_var.name, false_count))
+        return [ cyast.Builder.CFor(start = cyast.Num(0),
+                                    start_op = cyast.LtE(),
+                                    target = cyast.Name(index_var.name),
+                                    stop_op = cyast.Lt(),
+                                    stop = cyast.Num(2),
+                                    body = [ cyast.Builder.If(test = cyast.Builder.Compare(left = count,
+                                                                                         ops = [ cyast.Gt() ],
+                                                                                         comparators = [ cyast.Num(0) ]),
+                                                              body = [ cyast.Assign(targets = [ cyast.Name(token_var.name) ],
+                                                                                    value = cyast.E("{} != 0".format(index_var.name))),
+                                                                       compiled_body ]) ],
+                                    orelse = []) ]
+
+    def enumerate_tokens(self, env, token_var, marking_var, body):
+        return self.enumerate(env, marking_var, token_var, body)
+
 ################################################################################
 #
 ################################################################################
@@ -1332,6 +1733,9 @@ class GeneratorPlaceType(coretypes.PlaceType, CythonPlaceType):
         place_expr = self.attribute_expr(env, marking_var)
         return cyast.stmt(cyast.Builder.Helper(place_expr).attr("decrement_ref").call().ast())
 
+    def intern_table_type(self, env):
+        return from_neco_lib('TInternTable[{}]*'.format(env.type2str(self.type)[0:-1]))
+
     def hash_expr(self, env, marking_var):
         place_expr = self.attribute_expr(env, marking_var)
         return cyast.Builder.Helper(place_expr).attr("hash").call().ast()
@@ -1348,7 +1752,8 @@ class GeneratorPlaceType(coretypes.PlaceType, CythonPlaceType):
     def remove_token_stmt(self, env, token_expr, compiled_token, marking_var):
         place_expr = self.attribute_expr(env, marking_var)
         pid_expr = cyast.Subscript(compiled_token, cyast.Index(cyast.Num(0)))
-        return cyast.stmt(cyast.Builder.Helper(place_expr).attr("remove_pid").call([pid_expr]).ast())
+        native_pid_expr = cyast.Call(func = cyast.E(from_neco_lib("pid_to_native")), args = [ pid_expr ])
+        return cyast.stmt(cyast.Builder.Helper(place_expr).attr("remove_pid").call([native_pid_expr]).ast())
         # return cyast.stmt(cyast.Delete(targets=[ cyast.Subscript(place_expr, cyast.Index(pid_expr)) ]))
 
     def remove_token_by_pid_stmt(self, env, pid_var, marking_var):
@@ -1359,18 +1764,26 @@ class GeneratorPlaceType(coretypes.PlaceType, CythonPlaceType):
     def add_token_stmt(self, env, token_expr, compiled_token, marking_var):
         place_expr = self.attribute_expr(env, marking_var)
 
-        pid_expr = cyast.Subscript(compiled_token, cyast.Index(cyast.Num(0)))
-        spawns_expr = cyast.Subscript(compiled_token, cyast.Index(cyast.Num(1)))
-
         # gen[pid] = spawns
-        return cyast.stmt(cyast.Builder.Helper(place_expr).attr("update_pid_counter").call([pid_expr, spawns_expr]).ast())
+        return cyast.stmt(cyast.Call(func = cyast.E(from_neco_lib("generator_place_type_add")),
+                                     args = [ place_expr, compiled_token ]))
 #        return cyast.Assign(targets=[ cyast.Subscript(place_expr, cyast.Index(pid_expr)) ],
 #                            value=spawns_expr)
 
+    def pack_stmt(self, env, marking_var, buf_var):
+        return cyast.stmt(cyast.E("{}({}, {}.{})".format(from_neco_lib("pack_generator_place_type"), buf_var.name,
+                                                         marking_var.name, self.chunk.get_attribute_name())))
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        # the place was allocated together with the marking
+        return cyast.stmt(cyast.E("{}.read_generator_place_type({}.{})".format(unpacker_var.name,
+                                                                               marking_var.name, self.chunk.get_attribute_name())))
+
     def add_pid_stmt(self, env, pid_var, marking_var):
         place_expr = self.attribute_expr(env, marking_var)
         # gen[pid] = 0
-        return cyast.stmt(cyast.Builder.Helper(place_expr).attr("update_pid_counter").call([cyast.E(pid_var.name), cyast.Num(0)]).ast())
+        native_pid_expr = cyast.Call(func = cyast.E(from_neco_lib("pid_to_native")), args = [ cyast.E(pid_var.name) ])
+        return cyast.stmt(cyast.Builder.Helper(place_expr).attr("update_pid_counter").call([native_pid_expr, cyast.Num(0)]).ast())
 
     def update_pid_spawns_stmt(self, env, pid_var, spawns_var, marking_var):
         place_expr = self.attribute_expr(env, marking_var)
@@ -1392,7 +1805,7 @@ class GeneratorPlaceType(coretypes.PlaceType, CythonPlaceType):
         return [ cyast.E("{dst}.{attr} = {src}.{attr}".format(dst = dst_marking_var.name,
                                                             src = src_marking_var.name,
                                                             attr = attr_name)),
-                cyast.Builder.Helper(attr_name).attr("increment_ref").call().ast() ]
+                cyast.stmt(cyast.Builder.Helper("{}.{}".format(dst_marking_var.name, attr_name)).attr("increment_ref").call().ast()) ]
 
     def get_size_expr(self, env, marking_var):
         check_marking_type(marking_var)
@@ -1440,14 +1853,22 @@ class GeneratorPlaceType(coretypes.PlaceType, CythonPlaceType):
         check_marking_type(marking_var)
 
         place_expr = self.attribute_expr(env, marking_var)
-        token_expr = cyast.Builder.Helper(place_expr).attr("get").call([ compiled_index ]).ast()
-        return cyast.Tuple([cyast.Builder.Helper(token_expr).attr('get_first').call().ast(),
-                            cyast.Builder.Helper(token_expr).attr('get_second').call().ast() ])
-
+        return cyast.Call(func = cyast.E(from_neco_lib("generator_place_type_get")),
+                          args = [ place_expr, compiled_index ])
 
     def multiset_expr(self, env, marking_var):
-        attribute_expr = self.attribute_expr_expr(env, marking_var)
+        attribute_expr = self.attribute_expr(env, marking_var)
         return cyast.Call(func = cyast.E(from_neco_lib("generator_place_type_to_multiset")),
                           args = [attribute_expr])
 
+    def update_pid_tree_stmt(self, env, marking_var, tree_var, value):
+        # generator entries only reference pids, they do not own data
+        return cyast.stmt(cyast.Builder.Helper(cyast.Name(tree_var.name)).attr("add_generator_place")
+                          .call([ self.attribute_expr(env, marking_var) ]).ast())
+
+    def update_pids_stmt(self, env, marking_var, tree_var):
+        return cyast.Assign(targets = [ self.attribute_expr(env, marking_var) ],
+                            value = cyast.Builder.Helper(cyast.Name(tree_var.name)).attr("update_generator_place")
+                            .call([ self.attribute_expr(env, marking_var) ]).ast())
+
 
@@ -68,10 +68,17 @@ def compile_IR(env, config, compiler_):
     env.add_declaration("import cPickle")
     env.add_declaration("import StringIO")
     env.add_declaration("from time import time")
+    env.add_declaration("from neco.backends.python.process import PidFreeCache")
 
     if config.normalize_pids:
         env.add_declaration("from neco.extsnakes import *")
-        env.add_declaration("from neco.backends.python.process import PidTree, pid_free_marking_order")
+        env.add_declaration("from neco.backends.python.process import PidTree, CanonicalLabelling, pid_free_marking_order")
+
+    if env.por:
+        env.add_declaration("import neco.por")
+
+    if env.pgo:
+        env.add_declaration("import neco.pgo")
 
     for mod in config.imports:
         env.add_declaration('from {} import *'.format(mod))
@@ -92,6 +99,12 @@ def compile_IR(env, config, compiler_):
     for node in env.function_nodes():
         compiled_nodes.append(compiler.compile(node))
 
+    if env.por:
+        compiled_nodes.append(pyast.E("_neco_por = " + env.por.constructor()))
+
+    if env.pgo:
+        compiled_nodes.append(pyast.E("_neco_pgo = " + env.pgo.constructor()))
+
     compiled_nodes = env.gen_imports() + compiled_nodes
 
     module_ast = ast.Module(body = compiled_nodes)
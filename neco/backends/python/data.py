@@ -3,10 +3,13 @@
 from collections import Iterable
 from copy import copy # a swallow copy is enough here
 from neco.extsnakes import Pid
+from neco.utils import canonical_dumps as _dumps
 from process import PidTree
 from snakes.hashables import hdict, hashable
 from functools import partial
+import cPickle
 import operator
+import struct
 
 def pid_free_tuple_count_compare(ignore_set, left_pair, right_pair):
     left,  left_count  = left_pair
@@ -636,6 +639,74 @@ def neco__create_pid_tree():
 def neco__normalize_pid_tree(pid_tree):
     return pid_tree.reduce_sibling_offsets()
 
+################################################################################
+# binary serialization
+################################################################################
+
+_int_struct = struct.Struct('<i')
+
+def pack_int(buf, value):
+    """ Append an integer to a bytearray. """
+    buf.extend(_int_struct.pack(value))
+
+def pack_object(buf, obj):
+    """ Append a length prefixed pickle of C{obj} to a bytearray. """
+    data = _dumps(obj)
+    pack_int(buf, len(data))
+    buf.extend(data)
+
+def pack_multiset(buf, ms):
+    """ Append a multiset to a bytearray.
+
+    Tokens are sorted with respect to their serialized form, this gives a
+    canonical form even if tokens are not totally ordered.
+    """
+    items = sorted((_dumps(token), count) for token, count in ms.iteritems())
+    pack_int(buf, len(items))
+    for data, count in items:
+        pack_int(buf, len(data))
+        buf.extend(data)
+        pack_int(buf, count)
+
+class Unpacker(object):
+    """ Sequential reader of data produced by the C{pack_*} functions.
+
+    >>> buf = bytearray()
+    >>> pack_int(buf, -3)
+    >>> pack_multiset(buf, multiset(['foo', 'foo', 'bar']))
+    >>> unpacker = Unpacker(buf)
+    >>> unpacker.read_int()
+    -3
+    >>> unpacker.read_multiset() == multiset(['bar', 'foo', 'foo'])
+    True
+    """
+
+    __slots__ = ('data', 'offset')
+
+    def __init__(self, data):
+        self.data = str(data)
+        self.offset = 0
+
+    def read_int(self):
+        value, = _int_struct.unpack_from(self.data, self.offset)
+        self.offset += _int_struct.size
+        return value
+
+    def read_object(self):
+        size = self.read_int()
+        if self.offset + size > len(self.data):
+            raise ValueError("truncated marking data")
+        obj = cPickle.loads(self.data[self.offset:self.offset + size])
+        self.offset += size
+        return obj
+
+    def read_multiset(self):
+        ms = multiset()
+        for _ in xrange(self.read_int()):
+            token = self.read_object()
+            ms[token] = self.read_int()
+        return ms
+
 
 if __name__ == "__main__":
     import doctest
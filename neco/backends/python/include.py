@@ -8,62 +8,29 @@ class NecoCtx(object):
 
     def __init__(self):
         self.state_space = set()
-        self.pid_free_hash = set()
+        self.pid_free_hash = PidFreeCache()
         self.remaining = set()
 
+def neco_marking_pack(marking, buf):
+    marking.__pack__(buf)
+
+def neco_marking_unpack(buf):
+    marking = Marking(False)
+    marking.__unpack__(data.Unpacker(buf))
+    return marking
+
 
 perm_log = open('perm_log', 'w')
-calls = 0
 def full_normalize_marking(marking, hash_set, current_set, todo_set, state_space):
     pid_tree = marking.buildPidTree()
     pid_tree.strip()
-    pid_tree.order_tree(pid_free_marking_order)
-    default_tree = pid_tree
-    bijection = default_tree.build_map()
-    default_marking = marking.copy()
-    default_marking.update_pids(bijection)
-
-    if not default_marking.__pid_free_hash__() in hash_set:
-        perm_log.write("h")
-        return default_marking
-
-    if ((default_marking in state_space) or
-        (default_marking in todo_set) or
-        (default_marking in current_set)):
-        return default_marking
-
-    iter_trees = pid_tree.itertrees()
-    perm_log.write(".")
+    pid_tree.order_tree(hash_set.compare)
+    # canonical representative, see neco.backends.python.process
+    return CanonicalLabelling(marking, pid_tree).canonical_marking()
 
-    perm_log.write("+")
-    c = 0
-    # print "begin permutations !"
-    global calls
-#    calls += 1
-#    print calls
-    for tree in iter_trees:
-        c += 1
-        perm_log.write("*")
-        # print "tree ", c
-        # tree.print_structure()
-        bijection = tree.build_map()
-        tmp = marking.copy()
-        tmp.update_pids(bijection)
-
-        if tmp in state_space:
-            return tmp
-        if tmp in current_set:
-            return tmp
-        if tmp in todo_set:
-            return tmp
-
-    perm_log.write("{}%".format(c))
-
-    return default_marking
-
-def normalize_marking(marking, current_set, state_space, hash_set, todo_set):
+def normalize_marking(marking, hash_set, current_set, todo_set, state_space):
     pid_tree = marking.buildPidTree()
-    pid_tree.order_tree_without_orbits(pid_free_marking_order)
+    pid_tree.order_tree_without_orbits(hash_set.compare)
     bijection = pid_tree.build_map()
     marking.update_pids(bijection)
     perm_log.write(".")
@@ -79,11 +46,9 @@ def state_space():
 
     done = set()
     todo = set([init()])
-    hash_set = set()
 
     ctx.state_space = done
     ctx.remaining = todo
-    ctx.pid_free_hash = hash_set
 
     try:
         while True:
@@ -129,10 +94,8 @@ def state_space_graph():
     mrk_id_map[m] = next
     next += 1
 
-    hash_set = set()
     ctx.state_space = done
     ctx.remaining = todo
-    ctx.pid_free_hash = hash_set
 
     try:
         while True:
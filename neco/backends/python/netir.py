@@ -183,6 +183,16 @@ class CompilerVisitor(coreir.CompilerVisitor):
                            body = [ self.compile(node.body) ])
 
 
+    def compile_TokenLookup(self, node):
+        place_type = self.env.marking_type.get_place_type_by_name(node.place_name)
+        key = self.compile(node.key)
+        return pyast.If(test = place_type.contains_expr(env = self.env,
+                                                        marking_var = node.marking_var,
+                                                        compiled_token = key),
+                        body = [ pyast.Assign(targets = [ pyast.Name(id = node.token_var.name) ],
+                                              value = key),
+                                 self.compile(node.body) ])
+
     def gen_different(self, indices):
 
         base = None
@@ -287,6 +297,40 @@ class CompilerVisitor(coreir.CompilerVisitor):
         return pyast.stmt(pyast.Call(func = pyast.Name(id = node.function_name),
                                       args = [ self.compile(arg) for arg in node.arguments ]))
 
+    def compile_EnablingMask(self, node):
+        mask = node.mask_var.name
+        stmts = [ pyast.E("{} = 0".format(mask)) ]
+        for bit, place_name in enumerate(node.place_names):
+            place_type = self.env.marking_type.get_place_type_by_name(place_name)
+            stmts.append(pyast.If(test = place_type.not_empty_expr(env = self.env,
+                                                                    marking_var = node.marking_var),
+                                  body = [ pyast.E("{} |= {}".format(mask, 1 << bit)) ]))
+        return stmts
+
+    def compile_LoadCandidates(self, node):
+        field = self.env.marking_type.candidates_field()
+        return [ pyast.E("{} = {}".format(node.candidates_var.name, field.access_from(node.marking_var))),
+                 pyast.E("{} = 0".format(field.access_from(node.marking_var))) ]
+
+    def compile_UpdateCandidates(self, node):
+        field = self.env.marking_type.candidates_field()
+        affected = sum(1 << transition for transition in node.affected)
+        return [ pyast.E("{} = {}".format(field.access_from(node.marking_var), affected)),
+                 pyast.E("{} |= {}".format(field.access_from(node.src_marking_var), 1 << node.transition)) ]
+
+    def compile_SpreadCandidates(self, node):
+        field = self.env.marking_type.candidates_field()
+        return pyast.For(target = pyast.E(node.successor_var.name),
+                         iter = pyast.E(node.marking_acc_var.name),
+                         body = [ pyast.E("{} |= {}".format(field.access_from(node.successor_var),
+                                                            field.access_from(node.marking_var))) ])
+
+    def compile_IfEnabled(self, node):
+        required = sum(1 << bit for bit in node.required)
+        return pyast.If(test = pyast.E("({mask} & {required}) == {required}".format(mask = node.mask_var.name,
+                                                                                   required = required)),
+                        body = self.compile(node.body))
+
     def compile_MarkingCopy(self, node):
         nodes = []
         nodes.append(pyast.E(node.dst.name + " = Marking()"))
@@ -317,6 +361,16 @@ class CompilerVisitor(coreir.CompilerVisitor):
                                                           markingset = node.marking_set_var,
                                                           marking = node.marking_var)
 
+    def compile_UpdateHash(self, node):
+        # the hash of the source marking is cached, only contributions of
+        # modified places are updated.
+        marking_type = self.env.marking_type
+        expr = '{}.__hash__()'.format(node.src_marking_var.name)
+        for name in marking_type.place_type_names(node.mod):
+            expr += ' ^ {} ^ {}'.format(marking_type.place_hash_expr(name, node.src_marking_var),
+                                        marking_type.place_hash_expr(name, node.marking_var))
+        return pyast.E('{}.{} = {}'.format(node.marking_var.name, marking_type.get_field('_hash').name, expr))
+
     def compile_AddToken(self, node):
         place_type = self.env.marking_type.get_place_type_by_name(node.place_name)
         return place_type.add_token_stmt(env = self.env,
@@ -439,10 +493,13 @@ class CompilerVisitor(coreir.CompilerVisitor):
     def compile_InitialPid(self, node):
         return pyast.E("Pid.from_str('1')")
 
+    def compile_PlaceCard(self, node):
+        place_type = self.env.marking_type.get_place_type_by_name(node.place_name)
+        return place_type.card_expr(self.env, node.marking_var)
+
     def compile_UpdateHashSet(self, node):
-        # return []
-        pidfree_hash_set = "{}.pid_free_hash".format(node.ctx_var.name)
-        return pyast.stmt(pyast.E("{}.add({}.__pid_free_hash__())".format(pidfree_hash_set, node.marking_var.name)))
+        # normalized markings are canonical, the pid-free hash set is not used
+        return []
 
 ################################################################################
 # EOF
@@ -4,6 +4,7 @@ from neco.core.info import TypeInfo, PlaceInfo
 from priv import pyast
 import neco.core.nettypes as coretypes
 import neco.utils as utils
+import hashlib
 import priv.mrkmethods
 import priv.mrkpidmethods
 import priv.placetypes
@@ -66,6 +67,8 @@ class StaticMarkingType(coretypes.MarkingType):
         self.add_method_generator(priv.mrkmethods.ReprGenerator())
         self.add_method_generator(priv.mrkmethods.DumpGenerator())
         self.add_method_generator(priv.mrkmethods.LineDumpGenerator())
+        self.add_method_generator(priv.mrkmethods.PackGenerator())
+        self.add_method_generator(priv.mrkmethods.UnpackGenerator())
         
         if self.config.normalize_pids:
             self.add_method_generator(priv.mrkpidmethods.EqGenerator())
@@ -91,6 +94,65 @@ class StaticMarkingType(coretypes.MarkingType):
                 return field
         raise KeyError
 
+    def candidates_field(self):
+        """ Get the field holding the candidate transitions of a marking.
+
+        Bit I{i} is set if the I{i}-th transition may be enabled, the field
+        is created if enabledness is tracked.
+
+        @rtype: C{Field}
+        """
+        try:
+            return self.get_field('_candidates')
+        except KeyError:
+            return self.create_field('_candidates', TypeInfo.get('Int'))
+
+    def place_hash_magic(self, place_name):
+        """ Get the factor applied to the hash of a place.
+
+        Factors are derived from a digest of the place name, unlike
+        C{hash(place_name)} similar names do not lead to similar factors,
+        thus xored contributions of places do not cancel.
+
+        @param place_name: name of the place type.
+        @type place_name: C{str}
+        @rtype: C{int}
+        """
+        magic = int(hashlib.md5(place_name).hexdigest()[:16], 16)
+        if magic >= 1 << 63:
+            magic -= 1 << 64
+        return magic
+
+    def place_hash_expr(self, place_name, marking_var):
+        """ Get the hash contribution of a place.
+
+        The hash of a marking is the xor of all place contributions.
+
+        @param place_name: name of the place type.
+        @type place_name: C{str}
+        @param marking_var: marking variable.
+        @type marking_var: C{VariableInfo}
+        @rtype: C{str}
+        """
+        place_type = self.place_types[place_name]
+        return 'hash({}) * {}'.format(place_type.field.access_from(marking_var), self.place_hash_magic(place_name))
+
+    def place_type_names(self, place_infos):
+        """ Get the names of place types storing some places.
+
+        Flow control places are stored in the place type of their process.
+
+        @param place_infos: places.
+        @rtype: C{list}
+        """
+        names = set()
+        for place_info in place_infos:
+            if self.place_types.has_key(place_info.name):
+                names.add(place_info.name)
+            else:
+                names.add(place_info.process_name)
+        return sorted(names)
+
     def __str__(self):
         s = []
         s.append('Marking:')
@@ -154,6 +216,9 @@ class StaticMarkingType(coretypes.MarkingType):
         return pyast.E("Marking()")
 
     def generate_api(self, env):
+        if self.tracked_transitions:
+            self.candidates_field()
+
         cls = pyast.ClassDef('Marking', bases=[pyast.Name(id='object')])
 
         elts = []
@@ -18,7 +18,11 @@ class InitGenerator(MarkingTypeMethodGenerator):
         for place_type in marking_type.place_types.values():
             if_block.body.append(place_type.new_place_stmt(env, self_var))
 
-        function.body = [ pyast.E('self.{} = None'.format(marking_type.get_field('_hash').name)), if_block ]
+        function.body = [ pyast.E('self.{} = None'.format(marking_type.get_field('_hash').name)) ]
+        if marking_type.tracked_transitions:
+            # all transitions are candidates of markings built from scratch
+            function.body.append(pyast.E('self.{} = -1'.format(marking_type.candidates_field().name)))
+        function.body.append(if_block)
         return function
 
 class CopyGenerator(MarkingTypeMethodGenerator):
@@ -83,15 +87,54 @@ class HashGenerator(MarkingTypeMethodGenerator):
 
         builder.emit(pyast.E('h = 0'))
 
-        for (name, place_type) in marking_type.place_types.iteritems():
-            magic = hash(name)
-            builder.emit(pyast.E('h ^= hash(' + place_type.field.access_from(self_var) + ') * ' + str(magic)))
+        for name in marking_type.place_types:
+            builder.emit(pyast.E('h ^= ' + marking_type.place_hash_expr(name, self_var)))
 
         # builder.emit(pyast.E("print h"))
+        builder.emit(pyast.E('self.{} = h'.format(marking_type.get_field('_hash').name)))
         builder.emit_Return(pyast.E("h"))
         builder.end_FunctionDef()
         return builder.ast()
 
+class PackGenerator(MarkingTypeMethodGenerator):
+
+    def generate(self, env):
+        marking_type = env.marking_type
+
+        items = list(marking_type.place_types.iteritems())
+        items.sort(lambda (n1, t1), (n2, t2) : cmp(n1, n2))
+
+        vp = VariableProvider()
+        self_var = vp.new_variable(marking_type.type, name = 'self')
+        buf_var = vp.new_variable(name = 'buf')
+
+        builder = pyast.Builder()
+        builder.begin_FunctionDef(name = '__pack__', args = pyast.A(self_var.name).param(buf_var.name).ast())
+        for (_, place_type) in items:
+            builder.emit(place_type.pack_stmt(env, self_var, buf_var))
+        builder.end_FunctionDef()
+        return builder.ast()
+
+class UnpackGenerator(MarkingTypeMethodGenerator):
+
+    def generate(self, env):
+        marking_type = env.marking_type
+
+        items = list(marking_type.place_types.iteritems())
+        items.sort(lambda (n1, t1), (n2, t2) : cmp(n1, n2))
+
+        vp = VariableProvider()
+        self_var = vp.new_variable(marking_type.type, name = 'self')
+        unpacker_var = vp.new_variable(name = 'unpacker')
+
+        builder = pyast.Builder()
+        builder.begin_FunctionDef(name = '__unpack__', args = pyast.A(self_var.name).param(unpacker_var.name).ast())
+        builder.emit(pyast.E('self.{} = None'.format(marking_type.get_field('_hash').name)))
+        for (_, place_type) in items:
+            builder.emit(place_type.unpack_stmt(env, self_var, unpacker_var))
+        builder.end_FunctionDef()
+        return builder.ast()
+
 class ReprGenerator(MarkingTypeMethodGenerator):
 
     def generate(self, env):
@@ -79,7 +79,7 @@ class BuildPidTreeGenerator(MarkingTypeMethodGenerator):
             if name == GENERATOR_PLACE:
                 enum_body = [ pyast.If(test=pyast.E('not {}.has_key({}[0])'.format(pid_dict_var.name, token_var.name)),
                                        body=[pyast.E("{}[ {}[0] ] = Marking(True)".format(pid_dict_var.name, token_var.name))]),
-                              pyast.E("{}[ Pid.from_list({}[0].data + [{}[1] + 1]) ] = 'next_pid'".format(pid_dict_var.name, token_var.name, token_var.name)) ]
+                              pyast.E("{}[ {}[0].next({}[1]) ] = 'next_pid'".format(pid_dict_var.name, token_var.name, token_var.name)) ]
 
                 body.append( place_type.enumerate( env, self_var, token_var, enum_body ) )
             else:
@@ -145,7 +145,7 @@ class HashGenerator(MarkingTypeMethodGenerator):
             if name == GENERATOR_PLACE and config.normalize_pids:
                 continue
             
-            magic = hash(name)
+            magic = marking_type.place_hash_magic(name)
             builder.emit( pyast.E('h ^= hash(' + place_type.field.access_from(self_var) + ') * ' + str(magic) ) )
 
         builder.emit(pyast.E("self.{} = h".format(marking_type.get_field('_hash').name)))
@@ -171,7 +171,7 @@ class PidFreeHashGenerator(MarkingTypeMethodGenerator):
         
         
         for (name, place_type) in marking_type.place_types.iteritems():
-            magic = hash(name)
+            magic = marking_type.place_hash_magic(name)
             type_info = place_type.token_type
 
             if type_info.is_Pid:
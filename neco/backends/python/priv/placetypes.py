@@ -18,6 +18,14 @@ class PythonPlaceType(object):
     def is_ProcessPlace(self):
         return False
 
+    def pack_stmt(self, env, marking_var, buf_var):
+        """ Produce a statement appending the place content to a bytearray. """
+        return pyast.stmt(pyast.E("data.pack_object({}, {})".format(buf_var.name, self.field.access_from(marking_var))))
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        """ Produce a statement reading back the place content produced by L{pack_stmt}. """
+        return pyast.E("{} = {}.read_object()".format(self.field.access_from(marking_var), unpacker_var.name))
+
 ################################################################################
 
 # multiple inheritance is used to allow type matching.
@@ -26,6 +34,7 @@ class ObjectPlaceType(coretypes.ObjectPlaceType, PythonPlaceType):
     """ Python implementation of the fallback place type. """
 
     allow_pids = True
+    _lookup_ = True
 
     def __init__(self, place_info, marking_type):
         coretypes.ObjectPlaceType.__init__(self,
@@ -42,9 +51,17 @@ class ObjectPlaceType(coretypes.ObjectPlaceType, PythonPlaceType):
     def size_expr(self, env, marking_var):
         return pyast.E("len({})".format(self.field.access_from(marking_var)))
 
+    def card_expr(self, env, marking_var):
+        return self.size_expr(env, marking_var)
+
     def iterable_expr(self, env, marking_var):
         return pyast.E("{}".format(self.field.access_from(marking_var)))
 
+    def contains_expr(self, env, marking_var, compiled_token):
+        return pyast.Compare(left=compiled_token,
+                             ops=[pyast.In()],
+                             comparators=[pyast.E(self.field.access_from(marking_var))])
+
     def remove_token_stmt(self, env, compiled_token, marking_var, *args):
         remove_expr = pyast.E("{}.remove".format(self.field.access_from(marking_var)))
         return pyast.stmt(pyast.Call(func=remove_expr, args=[compiled_token]))
@@ -56,6 +73,12 @@ class ObjectPlaceType(coretypes.ObjectPlaceType, PythonPlaceType):
     def token_expr(self, env, value):
         return pyast.E(repr(value))
 
+    def pack_stmt(self, env, marking_var, buf_var):
+        return pyast.stmt(pyast.E("data.pack_multiset({}, {})".format(buf_var.name, self.field.access_from(marking_var))))
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        return pyast.E("{} = {}.read_multiset()".format(self.field.access_from(marking_var), unpacker_var.name))
+
     def copy_stmt(self, env, dst_marking_var, src_marking_var):
         return pyast.E("{} = {}.copy()".format(self.field.access_from(dst_marking_var),
                                                self.field.access_from(src_marking_var)))
@@ -210,6 +233,12 @@ class OneSafePlaceType(coretypes.OneSafePlaceType, PythonPlaceType):
     def new_place_stmt(self, env, marking_var):
         return pyast.E("{} = None".format(self.field.access_from(marking_var)))
 
+    def not_empty_expr(self, env, marking_var):
+        return pyast.E("{} is not None".format(self.field.access_from(marking_var)))
+
+    def card_expr(self, env, marking_var):
+        return pyast.E("(0 if {} is None else 1)".format(self.field.access_from(marking_var)))
+
     @property
     def token_type(self):
         return self.info.type
@@ -279,6 +308,12 @@ class BTPlaceType(coretypes.BTPlaceType, PythonPlaceType):
     def new_place_stmt(self, env, marking_var):
         return pyast.E("{} = 0".format(self.field.access_from(marking_var)))
 
+    def not_empty_expr(self, env, marking_var):
+        return pyast.E("{} > 0".format(self.field.access_from(marking_var)))
+
+    def card_expr(self, env, marking_var):
+        return pyast.E(self.field.access_from(marking_var))
+
     def iterable_expr(self, env, marking_var):
         return pyast.E("xrange(0, {})".format(self.field.access_from(marking_var)))
 #        place_expr = self.place_expr(env, marking_var)
@@ -298,6 +333,12 @@ class BTPlaceType(coretypes.BTPlaceType, PythonPlaceType):
     def token_expr(self, env, value):
         return pyast.E('dot')
 
+    def pack_stmt(self, env, marking_var, buf_var):
+        return pyast.stmt(pyast.E("data.pack_int({}, {})".format(buf_var.name, self.field.access_from(marking_var))))
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        return pyast.E("{} = {}.read_int()".format(self.field.access_from(marking_var), unpacker_var.name))
+
     def dump_expr(self, env, marking_var):
         return pyast.E("'[' + ','.join(['dot'] * {}) + ']'".format(self.field.access_from(marking_var)))
 
@@ -373,6 +414,12 @@ class FlowPlaceType(coretypes.PlaceType, PythonPlaceType):
         field = self.field
         return pyast.E("{} = {}".format(field.access_from(dst_marking_var), field.access_from(src_marking_var)))
 
+    def pack_stmt(self, env, marking_var, buf_var):
+        return pyast.stmt(pyast.E("data.pack_int({}, {})".format(buf_var.name, self.field.access_from(marking_var))))
+
+    def unpack_stmt(self, env, marking_var, unpacker_var):
+        return pyast.E("{} = {}.read_int()".format(self.field.access_from(marking_var), unpacker_var.name))
+
     def add_place(self, place_info):
         """ Adds a flow control place.
 
@@ -1,10 +1,11 @@
-import itertools
+from collections import OrderedDict
 from neco.extsnakes import Pid
 
 def sibling_order(left, right):
     return left.frag - right.frag
 
-def pid_free_marking_order(left, right):
+def pid_free_marking_order(left, right, compare = None):
+    # children are compared with compare if given, see PidFreeCache
     # forbids
     if left.is_next_pid():
         if right.is_next_pid():
@@ -23,7 +24,7 @@ def pid_free_marking_order(left, right):
             return -tmp
 
         for li, ri in zip(left.children, right.children):
-            tmp = pid_free_marking_order(li, ri)
+            tmp = compare(li, ri) if compare else pid_free_marking_order(li, ri)
             if tmp != 0:
                 return tmp
     return -res
@@ -36,30 +37,14 @@ class mydefaultdict(dict):
 
 NEXT_PID = "next_pid"
 
-def perm(l):
-    if not l:
-        yield l
-    for i, e in enumerate(l):
-        tail = l[0:i] + l[i + 1:]
-        for t in perm(tail):
-            yield [e] + t
-
-def prod_perm(l):
-    if not l:
-        yield l
-    else:
-        for p in perm(l[0]):
-            for tail in prod_perm(l[1:]):
-                yield p + tail
-
-
 class PidTree(object):
 
     def __init__(self, frag):
         self.frag = frag
         self.children = {}    # defaultdict(lambda : PidTree())
         self.marking = None
-        self.orbits = None    # will be build during orderings
+        self.cells = None     # will be build during orderings
+        self.signature = None # see PidFreeCache
 
     def set_nextpid(self):
         self.marking = NEXT_PID
@@ -97,83 +82,31 @@ class PidTree(object):
 
     def order_tree(self, compare):
         #
-        # Each time a child is ordered, its orbits are updated.
-        # In initial state, all children have singleton orbits.
-        # When compare detects an equality orbits are fused together.
+        # Children are ordered and split into cells of consecutive
+        # children that compare equal, i.e., children that cannot be
+        # distinguished without looking at pids.
         #
-        # We use fragments as unique identifiers in orbits because
-        # there are no clashes (cf. Pid-tree definition)
+        # Next pids are never equal to another child.
         #
 
-        # order children and populate orbits with singletons
-        orbits = {}
         for child in self.children.itervalues():
             child.order_tree(compare)
-            orbits[child.frag] = set([child])
-
-        # the following function is used to order children, it will use order
-        # to compare elements and if they are equal update respective orbits
-
-        def comparison_function(left, right):
-            # left and right are (pid-fragment x pid-tree) pairs.
-            comparison_result = compare(left, right)
-            # assert( comparison_result == -(compare(right, left)) )
-            if comparison_result == 0:
-                if left.is_next_pid():
-                    return comparison_result
-                # fuse orbits
-                left_frag, right_frag = left.frag, right.frag
-                left_orbit = orbits[left_frag]
-                right_orbit = orbits[right_frag]
-
-                left_orbit = left_orbit.union(right_orbit)
-
-                for c in left_orbit:
-                    orbits[c.frag] = left_orbit
 
-            # return the comparison_result since it's a comparison function
-            return comparison_result
+        self.children = sorted(self.children.itervalues(), cmp = compare)
 
-        # sort children and rebuild orbits
-        self.children = sorted(list(self.children.itervalues()), cmp = comparison_function)
-        # don't forget to store orbits
-        self.orbits = orbits
+        cells = []
+        for child in self.children:
+            if cells and not child.is_next_pid() and compare(cells[-1][0], child) == 0:
+                cells[-1].append(child)
+            else:
+                cells.append([child])
+        self.cells = cells
 
     def order_tree_without_orbits(self, compare):
         for child in self.children.itervalues():
             child.order_tree_without_orbits(compare)
         self.children = sorted(list(self.children.itervalues()), cmp = compare)
 
-    def permutable_children(self):
-        identities = set()
-        permutable_children = []
-
-        for child in self.children:
-            value = self.orbits[child.frag]
-
-            identity = id(value)
-            if not identity in identities:
-                identities.add(identity)
-                permutable_children.append(list(value))
-
-        return permutable_children
-
-    def permutations(self):
-        permutable = self.permutable_children()
-        return prod_perm(permutable)
-        # for permutation in itertools.product(*[itertools.permutations(p) for p in permutable]):
-        #      yield itertools.chain.from_iterable(permutation)
-
-    def itertrees(self, n = 0):
-        for permutation in self.permutations():
-            tmp = list(permutation)
-            for children in itertools.product(*(child.itertrees(n + 1) for child in tmp)):    # permutation) ):
-
-                tree = PidTree(self.frag)
-                tree.marking = self.marking
-                tree.children = children
-                yield tree
-
     def build_map(self):
         """
         >>> from pprint import pprint
@@ -274,6 +207,288 @@ class PidTree(object):
             child.print_structure(child_prefix, new_prefix)
 
 
+class LRUCache(object):
+    """ Dictionary holding at most C{capacity} items, the least recently
+    used items are evicted first.
+    """
+
+    __slots__ = ('capacity', 'items')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.items = OrderedDict()
+
+    def get(self, key, default = None):
+        try:
+            value = self.items.pop(key)
+        except KeyError:
+            return default
+        self.items[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        items = self.items
+        items.pop(key, None)
+        items[key] = value
+        if len(items) > self.capacity:
+            items.popitem(last = False)
+
+    def __len__(self):
+        return len(self.items)
+
+PID_FREE_CACHE_SIZE = 1 << 16
+
+class PidFreeCache(object):
+    """ Memoization of pid-free orderings of pid tree nodes.
+
+    Node markings are grouped by pid-free hash and identified by the first
+    marking found equal with respect to C{pid_free_compare}. Each subtree is
+    then given a signature built from the identifier of its marking and the
+    signatures of its ordered children. Equal signatures mean equal
+    subtrees and comparisons of distinct signatures are cached, so repeated
+    sub-markings are ordered once.
+
+    All tables use LRU eviction. An evicted marking gets a new identifier
+    when seen again, this only leads to cache misses.
+    """
+
+    def __init__(self, capacity = PID_FREE_CACHE_SIZE):
+        self.classes = LRUCache(capacity)      # pid-free hash -> [(marking, id)]
+        self.signatures = LRUCache(capacity)   # subtree signature -> id
+        self.orders = LRUCache(capacity)       # (id, id) -> comparison result
+        self.next_id = 0
+
+    def _new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def marking_id(self, marking):
+        """ Returns the identifier of the pid-free class of C{marking}. """
+        h = marking.__pid_free_hash__()
+        bucket = self.classes.get(h)
+        if bucket is None:
+            bucket = []
+            self.classes[h] = bucket
+        for representative, ident in bucket:
+            if representative.pid_free_compare(marking) == 0:
+                return ident
+        ident = self._new_id()
+        bucket.append((marking, ident))
+        return ident
+
+    def signature(self, node):
+        """ Returns the signature of a node, its children must be ordered. """
+        if node.signature is None:
+            if node.is_next_pid():
+                key = NEXT_PID
+            else:
+                key = (self.marking_id(node.marking) if node.marking else None,
+                       tuple(self.signature(child) for child in node.children))
+            ident = self.signatures.get(key)
+            if ident is None:
+                ident = self._new_id()
+                self.signatures[key] = ident
+            node.signature = ident
+        return node.signature
+
+    def compare(self, left, right):
+        """ Same as L{pid_free_marking_order} with memoization. """
+        left_signature = self.signature(left)
+        right_signature = self.signature(right)
+        if left_signature == right_signature:
+            return 0
+
+        key = (left_signature, right_signature)
+        res = self.orders.get(key)
+        if res is None:
+            res = pid_free_marking_order(left, right, self.compare)
+            self.orders[key] = res
+        return res
+
+class _PidRecorder(dict):
+    """ Pid map keeping pids unchanged and recording the ones looked up. """
+
+    def __missing__(self, key):
+        self[key] = key
+        return key
+
+def _relabel(marking, pid_map):
+    tmp = marking.copy()
+    tmp.update_pids(pid_map)
+    return tmp
+
+def _packed(marking):
+    buf = bytearray()
+    marking.__pack__(buf)
+    return buf
+
+class CanonicalLabelling(object):
+    """ Canonical labelling of ordered pid trees.
+
+    Each node of a tree ordered by L{PidTree.order_tree} splits its children
+    into cells of children that pid-free markings cannot distinguish. Cells
+    are refined with respect to pids held by markings, then remaining cells
+    are split by individualizing one of their children and refining again,
+    as nauty or bliss do on graphs. Each leaf of this search gives a
+    labelling, the one producing the marking with the smallest hash is
+    kept so isomorphic markings get the same representative. Distinct
+    markings with the same hash are ordered by their packed bytes.
+
+    Siblings that can be swapped without changing the marking are
+    individualized only once, hence symmetric processes do not lead to
+    enumerating permutations.
+    """
+
+    def __init__(self, marking, tree):
+        self.marking = marking
+        self.nodes = []    # nodes in depth first order, parents come first
+        self.paths = []    # pid fragments of nodes
+        self.cells = {}    # node index -> list of cells of children indices
+        self._index(tree, ())
+
+        path_index = dict((path, i) for i, path in enumerate(self.paths))
+        self.referrers = [ [] for _ in self.nodes ]
+        for i, node in enumerate(self.nodes):
+            if self._has_marking(node):
+                recorder = _PidRecorder()
+                _relabel(node.marking, recorder)
+                for path in recorder:
+                    j = path_index.get(path)
+                    if j is not None:
+                        self.referrers[j].append(i)
+
+        self.best_key = None
+        self.best_marking = None
+
+    def _index(self, node, path):
+        index = len(self.nodes)
+        self.nodes.append(node)
+        self.paths.append(path)
+        self.cells[index] = [ tuple(self._index(child, path + (child.frag,)) for child in cell)
+                              for cell in node.cells ]
+        return index
+
+    @staticmethod
+    def _has_marking(node):
+        return node.marking is not None and not node.is_next_pid()
+
+    def _colours(self, cells):
+        # the colour of a node is the list of cell positions from the root,
+        # it is the new pid of the node once all cells are singletons
+        colours = [ () ] * len(self.nodes)
+        for i in xrange(len(self.nodes)):
+            colour = colours[i]
+            for j, cell in enumerate(cells[i]):
+                for child in cell:
+                    colours[child] = colour + (j + 1,)
+        return colours
+
+    def _invariants(self, cells):
+        colours = self._colours(cells)
+        pid_map = dict(zip(self.paths, colours))
+
+        local = []
+        for i, node in enumerate(self.nodes):
+            own = hash(_relabel(node.marking, pid_map)) if self._has_marking(node) else None
+            # markings holding the pid, the pid is given a colour of its own
+            pid_map[self.paths[i]] = colours[i] + (0,)
+            held = sorted(hash(_relabel(self.nodes[r].marking, pid_map)) for r in self.referrers[i])
+            pid_map[self.paths[i]] = colours[i]
+            local.append((own, tuple(held)))
+
+        invariants = [ None ] * len(self.nodes)
+        for i in xrange(len(self.nodes) - 1, -1, -1):
+            invariants[i] = (local[i], tuple(tuple(sorted(invariants[child] for child in cell))
+                                             for cell in cells[i]))
+        return invariants
+
+    def _refine(self, cells):
+        while True:
+            invariants = self._invariants(cells)
+            refined = {}
+            changed = False
+            for i, node_cells in cells.iteritems():
+                new_cells = []
+                for cell in node_cells:
+                    if len(cell) == 1:
+                        new_cells.append(cell)
+                        continue
+                    members = sorted(cell, key = invariants.__getitem__)
+                    start = 0
+                    for k in xrange(1, len(members) + 1):
+                        if k == len(members) or invariants[members[k]] != invariants[members[start]]:
+                            new_cells.append(tuple(members[start:k]))
+                            start = k
+                if len(new_cells) != len(node_cells):
+                    changed = True
+                refined[i] = new_cells
+            if not changed:
+                return cells
+            cells = refined
+
+    def _target_cell(self, cells):
+        # first non singleton cell, breadth first, nodes before it are
+        # all individualized
+        queue = [0]
+        for i in queue:
+            for j, cell in enumerate(cells[i]):
+                if len(cell) > 1:
+                    return i, j
+                queue.extend(cell)
+        return None
+
+    def _twins(self, left, right):
+        # true iff swapping the subtrees of left and right is an automorphism
+        left_path, right_path = self.paths[left], self.paths[right]
+        depth = len(left_path)
+        pid_map = {}
+        for path in self.paths:
+            prefix = path[:depth]
+            if prefix == left_path:
+                pid_map[path] = right_path + path[depth:]
+            elif prefix == right_path:
+                pid_map[path] = left_path + path[depth:]
+            else:
+                pid_map[path] = path
+        if set(pid_map.itervalues()) != set(pid_map):
+            return False
+        return _relabel(self.marking, pid_map) == self.marking
+
+    def _search(self, cells):
+        cells = self._refine(cells)
+        target = self._target_cell(cells)
+        if target is None:
+            bijection = dict(zip(self.paths[1:], self._colours(cells)[1:]))
+            marking = _relabel(self.marking, bijection)
+            key = hash(marking)
+            if self.best_key is None or key < self.best_key:
+                self.best_key = key
+                self.best_marking = marking
+            elif key == self.best_key and marking != self.best_marking:
+                if _packed(marking) < _packed(self.best_marking):
+                    self.best_marking = marking
+            return
+
+        node, index = target
+        cell = cells[node][index]
+        explored = []
+        for member in cell:
+            if any(self._twins(other, member) for other in explored):
+                continue
+            explored.append(member)
+            node_cells = list(cells[node])
+            node_cells[index:index + 1] = [ (member,), tuple(other for other in cell if other != member) ]
+            individualized = dict(cells)
+            individualized[node] = node_cells
+            self._search(individualized)
+
+    def canonical_marking(self):
+        """ Returns the canonical representative of the marking. """
+        if self.best_marking is None:
+            self._search(self.cells)
+        return self.best_marking
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
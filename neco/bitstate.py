@@ -0,0 +1,176 @@
+""" Bit-state hashing exploration (supertrace).
+
+Visited markings are not stored: each marking sets C{k} bits of a large
+bit array, indexes being derived from a base hash of the marking by
+double hashing. A marking whose bits are all set is considered visited,
+thus some markings may be wrongly ignored. The search is depth first,
+only the markings on the stack are kept in memory.
+
+The base hash is a 64 bit digest of the binary serialization of markings
+when the net provides one (C{neco_marking_pack}), the 32 bit C{hash} of
+markings is used otherwise.
+
+A new marking is ignored if its bits are all set by the previous ones or
+if its base hash equals the one of a stored marking, in which case all
+its indexes are the same. This probability is estimated with the fill
+ratio of the table and the number of stored markings at the time it is
+tested, these probabilities are summed over the exploration to estimate
+the number of missed markings and the coverage.
+"""
+
+import hashlib
+import re
+import struct
+
+DEFAULT_HASHES = 3
+
+_mask32 = (1 << 32) - 1
+_mask64 = (1 << 64) - 1
+_units = { '' : 1, 'K' : 1 << 10, 'M' : 1 << 20, 'G' : 1 << 30 }
+
+def parse_size(text):
+    """ Parse a memory size such as C{512M} or C{2G}.
+
+    @param text: size with an optional K, M or G suffix.
+    @type text: C{str}
+    @return: size in bytes.
+    @rtype: C{int}
+    """
+    match = re.match(r'^(\d+)([KMG]?)B?$', text.strip().upper())
+    if not match:
+        raise ValueError("invalid size: {}".format(text))
+    size = int(match.group(1)) * _units[match.group(2)]
+    if size <= 0:
+        raise ValueError("invalid size: {}".format(text))
+    return size
+
+def _mix(h):
+    # splitmix64 finalizer
+    h = ((h ^ (h >> 30)) * 0xbf58476d1ce4e5b9) & _mask64
+    h = ((h ^ (h >> 27)) * 0x94d049bb133111eb) & _mask64
+    return h ^ (h >> 31)
+
+def marking_hash(net, marking):
+    """ Select the base hash function of markings.
+
+    @param net: compiled net module.
+    @param marking: marking used to check that markings can be serialized.
+    @type marking: C{Marking}
+    @return: the hash function and the width of its results in bits.
+    @rtype: C{tuple}
+    """
+    try:
+        pack = net.neco_marking_pack
+        pack(marking, bytearray())
+    except (AttributeError, NotImplementedError):
+        return (lambda m : hash(m) & _mask32), 32
+
+    unpack = struct.Struct('<Q').unpack_from
+    md5 = hashlib.md5
+    def digest(m):
+        buf = bytearray()
+        pack(m, buf)
+        return unpack(md5(buf).digest())[0]
+    return digest, 64
+
+class BitState(object):
+    """ Bit array indexed by marking hashes. """
+
+    def __init__(self, size, hashes = DEFAULT_HASHES, hash_bits = 32):
+        """ Allocate the bit array.
+
+        @param size: table size in bytes.
+        @type size: C{int}
+        @param hashes: number of bits set per marking.
+        @type hashes: C{int}
+        @param hash_bits: width of base hashes in bits.
+        @type hash_bits: C{int}
+        """
+        self.table = bytearray(size)
+        self.bits = size * 8
+        self.hashes = hashes
+        self.hash_bits = hash_bits
+        self.set_bits = 0
+        self.stored = 0
+        self.missed = 0.0
+
+    def add(self, h):
+        """ Set the bits of a marking hash.
+
+        @param h: base hash of the marking.
+        @type h: C{int}
+        @return: C{False} if all bits were already set, ie., the marking
+        is considered visited.
+        @rtype: C{bool}
+        """
+        h1 = _mix(h & _mask64)
+        h2 = _mix(h1) | 1
+        table = self.table
+        bits = self.bits
+
+        # probability that this marking is wrongly considered visited
+        missed = self.collision_probability()
+
+        new = False
+        for i in xrange(self.hashes):
+            index = (h1 + i * h2) % bits
+            byte, mask = index >> 3, 1 << (index & 7)
+            if not table[byte] & mask:
+                table[byte] |= mask
+                self.set_bits += 1
+                new = True
+
+        if new:
+            self.stored += 1
+            self.missed += missed
+        return new
+
+    def fill_ratio(self):
+        """ Fraction of set bits. """
+        return float(self.set_bits) / self.bits
+
+    def collision_probability(self):
+        """ Probability that a new marking is considered visited.
+
+        Either its base hash equals the one of a stored marking or its
+        bits were all set by other markings.
+        """
+        same_hash = float(self.stored) / (1 << self.hash_bits)
+        all_set = self.fill_ratio() ** self.hashes
+        return 1.0 - (1.0 - min(same_hash, 1.0)) * (1.0 - all_set)
+
+    def coverage(self):
+        """ Estimated fraction of reachable markings that were explored. """
+        if not self.stored:
+            return 1.0
+        return self.stored / (self.stored + self.missed)
+
+def state_space(net, size, hashes = DEFAULT_HASHES):
+    """ Explore the state space of a compiled net with bit-state hashing.
+
+    @param net: compiled net module.
+    @param size: table size in bytes.
+    @type size: C{int}
+    @param hashes: number of bits set per marking.
+    @type hashes: C{int}
+    @return: the table and the number of fired transitions.
+    @rtype: C{tuple}
+    """
+    ctx = net.NecoCtx()
+    succs = net.succs
+
+    m = net.init()
+    base_hash, hash_bits = marking_hash(net, m)
+    table = BitState(size, hashes, hash_bits)
+    add = table.add
+
+    add(base_hash(m))
+    stack = [m]
+    edges = 0
+    while stack:
+        m = stack.pop()
+        for s_mrk in succs(m, ctx):
+            edges += 1
+            if add(base_hash(s_mrk)):
+                stack.append(s_mrk)
+    return table, edges
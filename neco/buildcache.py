@@ -0,0 +1,250 @@
+""" Content addressed cache of compiled net modules.
+
+A compilation is identified by a hash of the model sources and of the
+python modules they import, of the compilation options, of the neco
+sources (python code, templates and C++ headers) and of the tool chain
+(python, Cython and C++ compiler versions), thus a change in any of them
+produces a new entry. On a hit
+the files produced by the backend are copied back and neither code
+generation nor the C++ build is run.
+
+The directory used to store entries is given by the C{NECO_CACHE}
+environment variable and defaults to C{~/.cache/neco}.
+"""
+
+from distutils import sysconfig
+import hashlib
+import imp
+import modulefinder
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'neco')
+
+_source_extensions = frozenset(['.py', '.pyx', '.pxd', '.h', '.cpp'])
+_neco_digest = None
+_toolchain = {}
+
+def default_directory():
+    """ Get the cache directory from the environment.
+
+    @rtype: C{str}
+    """
+    return os.environ.get('NECO_CACHE', DEFAULT_DIRECTORY)
+
+def neco_digest():
+    """ Hash the sources of the neco package, computed once.
+
+    @rtype: C{str}
+    """
+    global _neco_digest
+    if _neco_digest is None:
+        digest = hashlib.sha1()
+        root = os.path.dirname(os.path.abspath(__file__))
+        for path, dirs, files in os.walk(root):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1] not in _source_extensions:
+                    continue
+                file_path = os.path.join(path, name)
+                digest.update(os.path.relpath(file_path, root))
+                with open(file_path, 'rb') as f:
+                    digest.update(f.read())
+        _neco_digest = digest.hexdigest()
+    return _neco_digest
+
+def find_module_source(module_name):
+    """ Find the source file of a python module.
+
+    @param module_name: module name.
+    @type module_name: C{str}
+    @return: path of the source file or C{None} if the module is not a
+    python source file.
+    @rtype: C{str}
+    """
+    try:
+        fp, pathname, description = imp.find_module(module_name)
+    except ImportError:
+        return None
+    if fp:
+        fp.close()
+    if description[2] != imp.PY_SOURCE:
+        return None
+    return pathname
+
+class _ModelFinder(modulefinder.ModuleFinder):
+    """ Module finder that does not scan modules of some directories.
+
+    Modules of the python installation and of neco are not model sources,
+    skipping them avoids scanning most of the standard library.
+    """
+
+    def __init__(self, path, skipped):
+        modulefinder.ModuleFinder.__init__(self, path)
+        self.skipped = skipped
+
+    def load_module(self, fqname, fp, pathname, file_info):
+        if file_info[2] != imp.PKG_DIRECTORY and pathname and pathname.startswith(self.skipped):
+            module = self.add_module(fqname)
+            module.__file__ = pathname
+            return module
+        return modulefinder.ModuleFinder.load_module(self, fqname, fp, pathname, file_info)
+
+def imported_sources(source):
+    """ Find the files of the modules imported by a python model.
+
+    Modules of the python installation and of neco are left out.
+
+    @param source: model source file.
+    @type source: C{str}
+    @return: paths of the imported modules, or C{None} if one of the
+    modules imported by the model or its helpers cannot be found.
+    @rtype: C{list}
+    """
+    neco_root = os.path.dirname(os.path.abspath(__file__))
+    skipped = tuple(os.path.abspath(p) + os.sep for p in set([sys.prefix, sys.exec_prefix, neco_root]))
+    finder = _ModelFinder([os.path.dirname(os.path.abspath(source))] + sys.path, skipped)
+    finder.run_script(source)
+
+    helpers = {}
+    for name, module in finder.modules.iteritems():
+        path = module.__file__
+        if name != '__main__' and path and not os.path.abspath(path).startswith(skipped):
+            helpers[name] = path
+
+    # names imported from found modules may be attributes, only modules
+    # whose top level package is missing are reported
+    importers = set(helpers)
+    importers.add('__main__')
+    for name, importing in finder.badmodules.iteritems():
+        if not name.split('.')[0] in finder.modules and importers.intersection(importing):
+            return None
+    return sorted(helpers.itervalues())
+
+def toolchain_identity(backend):
+    """ Describe the tools a backend compiles modules with, computed once.
+
+    @rtype: C{str}
+    """
+    if not backend in _toolchain:
+        identity = [ sys.version ]
+        if backend == 'cython':
+            try:
+                import Cython
+                identity.append(Cython.__version__)
+            except ImportError:
+                identity.append(None)
+            compiler = sysconfig.get_config_var('CXX') or sysconfig.get_config_var('CC') or 'c++'
+            try:
+                process = subprocess.Popen(compiler.split() + ['--version'], stdout = subprocess.PIPE,
+                                           stderr = subprocess.STDOUT)
+                version = process.communicate()[0]
+            except OSError:
+                version = None
+            identity.extend([compiler, version])
+        _toolchain[backend] = repr(identity)
+    return _toolchain[backend]
+
+def produced_files(config):
+    """ Get the files produced by a compilation.
+
+    @param config: compilation options.
+    @type config: C{Config}
+    @return: paths relative to the working directory.
+    @rtype: C{list}
+    """
+    module_name = config.out_module
+    if config.backend == 'cython':
+        return [ module_name + '.so' ] + [ os.path.join('build', module_name + ext)
+                                          for ext in ('.pyx', '.pxd', '.h', '_api.h', '.cpp') ]
+    return [ module_name + '.py' ]
+
+def compute_key(config, sources, netvar = None):
+    """ Compute the cache key of a compilation.
+
+    @param config: compilation options.
+    @type config: C{Config}
+    @param sources: model source files.
+    @type sources: C{list}
+    @param netvar: name of the net variable of a python model.
+    @type netvar: C{str}
+    @rtype: C{str}
+    """
+    digest = hashlib.sha1()
+    digest.update(neco_digest())
+    digest.update(toolchain_identity(config.backend))
+    digest.update(repr(sorted(config.config.iteritems())))
+    digest.update(repr(netvar))
+    for path in sources:
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha1(f.read()).hexdigest())
+    return digest.hexdigest()
+
+class BuildCache(object):
+    """ Directory of compiled modules indexed by their key. """
+
+    def __init__(self, directory = None):
+        """ Initialize the cache.
+
+        @param directory: cache directory, L{default_directory} is used if
+        C{None}.
+        @type directory: C{str}
+        """
+        self.directory = directory if directory else default_directory()
+
+    def entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def lookup(self, key, config):
+        """ Restore produced files from the cache.
+
+        @param key: compilation key.
+        @type key: C{str}
+        @param config: compilation options.
+        @type config: C{Config}
+        @return: C{True} if the files were restored, C{False} otherwise.
+        @rtype: C{bool}
+        """
+        entry = self.entry(key)
+        files = produced_files(config)
+        if not all(os.path.exists(os.path.join(entry, f)) for f in files):
+            return False
+
+        for f in files:
+            directory = os.path.dirname(f)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            shutil.copy2(os.path.join(entry, f), f)
+        return True
+
+    def store(self, key, config):
+        """ Store produced files in the cache.
+
+        Files are copied into a temporary directory that is then renamed,
+        thus concurrent compilations never see a partial entry.
+
+        @param key: compilation key.
+        @type key: C{str}
+        @param config: compilation options.
+        @type config: C{Config}
+        """
+        entry = self.entry(key)
+        if os.path.exists(entry):
+            return
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        tmp = tempfile.mkdtemp(prefix = key + '.', dir = self.directory)
+        try:
+            for f in produced_files(config):
+                target = os.path.join(tmp, f)
+                directory = os.path.dirname(target)
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                shutil.copy2(f, target)
+            os.rename(tmp, entry)
+        except (IOError, OSError):
+            shutil.rmtree(tmp, ignore_errors = True)
@@ -6,8 +6,8 @@ The loading of the module will raise a runtime error
 if loaded with wrong python version.
 """
 
-from neco import compile_net, g_logo, produce_pnml_file, load_pnml_file, \
-    load_snakes_net
+from neco import buildcache, compile_net, g_logo, pgo, produce_pnml_file, \
+    load_pnml_file, load_snakes_net
 from neco.utils import fatal_error
 from time import time
 import argparse
@@ -74,6 +74,16 @@ class Main(object):
         optimize_group.add_argument('--optimize-flow', '-Of', default = False, dest = 'optimize_flow', action = 'store_true',
                                     help = 'enable flow control optimizations.')
 
+        optimize_group.add_argument('--por', default = None, dest = 'por', nargs = '?', const = 'deadlock', choices = ['deadlock', 'ltl'],
+                                    help = 'enable partial order reduction with stubborn sets, preserving deadlocks or stutter invariant LTL properties.')
+        optimize_group.add_argument('--por-visible', default = [], dest = 'por_visible', metavar = 'PLACE', action = 'append',
+                                    help = 'place observed by LTL properties, used with --por ltl.')
+
+        optimize_group.add_argument('--pgo-collect', default = None, dest = 'pgo_collect', metavar = 'FILE', type = str, nargs = '?', const = pgo.DEFAULT_STATS_FILE,
+                                    help = 'produce a module recording exploration statistics into FILE (defaults to {}), used with --pgo-use.'.format(pgo.DEFAULT_STATS_FILE))
+        optimize_group.add_argument('--pgo-use', default = None, dest = 'pgo_use', metavar = 'FILE', type = str,
+                                    help = 'optimize using exploration statistics produced by a module compiled with --pgo-collect.')
+
         pid_group = parser.add_argument_group('Dynamic process creation')
         pid_group.add_argument('--detect-pid-symmetries', '-dps', default = False, dest = 'detect_pid_symmetries', action = 'store_true',
                                help = 'enable reductions by symmetries.')
@@ -98,6 +108,10 @@ class Main(object):
         other_group.add_argument('--include', '-I', default = [], dest = 'includes', action = 'append',
                                  help = 'additional include paths.')
 
+        cache_group = parser.add_argument_group('Build cache')
+        cache_group.add_argument('--cache', '-C', default = None, dest = 'cache', metavar = 'DIR', type = str, nargs = '?', const = '',
+                                 help = 'reuse compiled modules from a build cache keyed by model, options and neco sources (DIR defaults to $NECO_CACHE or ~/.cache/neco)')
+
         if cli_args:
             args = parser.parse_args(cli_args)
         else:
@@ -147,6 +161,17 @@ class Main(object):
         elif pnml:
             model_file = pnml
 
+        if args.por:
+            if args.optimize_flow:
+                fatal_error("Partial order reduction cannot be used with flow control optimizations.")
+            if args.por == 'ltl' and not args.por_visible:
+                fatal_error("LTL preserving partial order reduction needs observed places (--por-visible).")
+
+        if args.pgo_collect and (args.por or args.optimize_flow):
+            fatal_error("Statistics collection cannot be used with partial order reduction or flow control optimizations.")
+        if args.pgo_use and not os.path.isfile(args.pgo_use):
+            fatal_error("{} is not a file.".format(args.pgo_use))
+
         # setup config
         self.config = Config()
         self.config.set_options(optimize = args.optimize,
@@ -164,8 +189,28 @@ class Main(object):
                                 pid_sibling = args.pid_sibling,
                                 normalize_only = args.normalize_only,
                                 pid_first = args.pid_first,
+                                por = args.por,
+                                por_visible = args.por_visible,
+                                pgo_collect = args.pgo_collect,
+                                pgo_use = args.pgo_use,
                                 model = model_file)
 
+        # lookup the build cache before loading the model
+        self.cache = None
+        self.cache_key = None
+        if args.cache is not None:
+            sources = self.model_sources(abcd, pnml, module, args.imports, args.pgo_use)
+            if sources is None:
+                print >> sys.stderr, "WARNING: model sources or modules they import not found, build cache disabled"
+            else:
+                self.cache = buildcache.BuildCache(args.cache)
+                self.cache_key = buildcache.compute_key(self.config, sources, None if abcd or pnml else netvar)
+                self.remove_produced_files()
+                if self.cache.lookup(self.cache_key, self.config):
+                    print "build cache hit ({})".format(self.cache_key)
+                    return
+                print "build cache miss ({})".format(self.cache_key)
+
         # retrieve the Petri net from abcd file (produces a pnml file)
         remove_pnml = not pnml
         if abcd:
@@ -194,12 +239,43 @@ class Main(object):
         else:    # without profiler
             self.compile()
 
-    def compile(self):
-        """ Compile the model. """
+    def model_sources(self, abcd, pnml, module, imports, profile = None):
+        """ Get the files the compiled model depends on.
+
+        Python modules imported by a python model and statistics used for
+        profile-guided optimization are included.
+
+        @return: source files or C{None} if one of them cannot be found.
+        @rtype: C{list}
+        """
+        if abcd:
+            sources = [abcd]
+        elif pnml:
+            sources = [pnml]
+        else:
+            source = buildcache.find_module_source(module if module else 'spec')
+            if source is None:
+                return None
+            helpers = buildcache.imported_sources(source)
+            if helpers is None:
+                return None
+            sources = [source] + helpers
+        sources.extend(buildcache.find_module_source(mod) for mod in imports)
+        if profile:
+            sources.append(profile)
+        if None in sources:
+            return None
+        return sources
+
+    def remove_produced_files(self):
         for f in g_produced_files:
             try:   os.remove(f)
             except OSError: pass    # ignore errors
 
+    def compile(self):
+        """ Compile the model. """
+        self.remove_produced_files()
+
         start = time()
         compiled_net = compile_net(net = self.petri_net, config = self.config)
         end = time()
@@ -208,6 +284,9 @@ class Main(object):
             print "Error during compilation."
             exit(-1)
         print "compilation time: ", end - start
+
+        if self.cache:
+            self.cache.store(self.cache_key, self.config)
         return end - start
 
 if __name__ == '__main__':
@@ -19,6 +19,10 @@ class Config(object):
                          imports=[],
                          model=[],
                          normalize_pids=False,
+                         por=None,
+                         por_visible=[],
+                         pgo_collect=None,
+                         pgo_use=None,
                          out_module='net')
         self.set_options(**kwargs)
         
@@ -4,7 +4,9 @@ import itertools, pickle
 from collections import defaultdict
 from snakes.nets import *
 import neco.config as config
-from neco.utils import flatten_lists
+from neco.utils import fatal_error, flatten_lists
+import neco.pgo
+import neco.por
 import netir, nettypes
 from info import *
 from itertools import izip_longest
@@ -34,6 +36,16 @@ class CompilingEnvironment(object):
         self._succ_function_names = {}
         self._process_succ_function_names = set()
 
+        # static relations used by partial order reduction
+        self.por = None
+
+        # statistics collected at run time for profile-guided optimization
+        self.pgo = None
+
+        # transition index and affected transitions used by incremental
+        # enabledness tracking, indexed by transition names
+        self.candidates = None
+
     def function_nodes(self):
         for node in self.successor_function_nodes:
             yield node
@@ -197,6 +209,10 @@ class SuccTGenerator(object):
         self.function_name = function_name
         self.marking_type = marking_type
 
+        # guard conjuncts that remain to be checked
+        guard = ExpressionInfo(transition.trans.guard._str)
+        self.pending_guards = guard.conjuncts() if config.optimize else [ guard ]
+
         # this helper will create new variables and take care of shared instances
         helper = SharedVariableHelper(transition.shared_input_variables(),
                                        WordSet(transition.variables().keys()))
@@ -253,6 +269,111 @@ class SuccTGenerator(object):
                     return True
             return False
 
+    def gen_guard(self, guard):
+        """ Produce a guard check, trivially true guards are omitted.
+
+        @param guard: guard or guard conjunct.
+        @type guard: C{ExpressionInfo}
+        """
+        try:
+            if eval(guard.raw) != True:
+                self.builder.begin_GuardCheck(condition = netir.PyExpr(guard))
+        except:
+            self.builder.begin_GuardCheck(condition = netir.PyExpr(guard))
+
+    def guard_available(self, guard, bound):
+        """ Check if all variables of a guard are available.
+
+        Shared variables are only available once unified, new pids are
+        only available after all enumerations.
+
+        @param guard: guard or guard conjunct.
+        @type guard: C{ExpressionInfo}
+        @param bound: names of variables bound by enclosing blocks.
+        @type bound: C{set}
+        @rtype: C{bool}
+        """
+        input_variables = self.transition.input_variables()
+        generator_arc = self.transition.generator_arc
+        new_pids = set(pid.name for pid in generator_arc.new_pids) if generator_arc else set()
+
+        for name in guard.names():
+            if name in input_variables:
+                if not name in bound:
+                    return False
+                variable = VariableInfo(name = name)
+                if self.variable_helper.is_shared(variable) and not self.variable_helper.unified(variable):
+                    return False
+            elif name in new_pids:
+                return False
+        return True
+
+    def gen_guards(self, bound = None):
+        """ Produce checks of pending guard conjuncts.
+
+        Conjuncts are checked in order as soon as their variables are
+        available, ie., right after the enumeration binding their last
+        variable. A conjunct is never checked before the previous ones,
+        thus short-circuit evaluation of the guard is preserved.
+
+        @param bound: names of variables bound by enclosing blocks, all
+        pending conjuncts are produced if C{None}.
+        @type bound: C{set}
+        """
+        pending = self.pending_guards
+        while pending:
+            if bound is not None and not self.guard_available(pending[0], bound):
+                break
+            self.gen_guard(pending.pop(0))
+
+    def bound_occurence(self, variable):
+        """ Get a local variable already holding the value of a shared variable.
+
+        Occurences are bound by enclosing blocks, thus they can be used to
+        search tokens instead of enumerating places.
+
+        @param variable: initial variable (appearing in the model)
+        @type variable: C{VariableInfo}
+        @return: a used local variable or C{None}.
+        @rtype: C{VariableInfo}
+        """
+        if self.variable_helper.is_shared(variable):
+            local_variables = self.variable_helper.get_local_variables(variable)
+            if local_variables:
+                return local_variables[0]
+        return None
+
+    def begin_token_access(self, input_arc, token_var, key = None):
+        """ Begin a block binding a token of an input place.
+
+        Tokens are searched by value in place types providing lookups if
+        their value is known, ie., for constants and bound variables, or
+        enumerated otherwise.
+
+        @param input_arc: input arc.
+        @type input_arc: C{ArcInfo}
+        @param token_var: variable receiving the token.
+        @type token_var: C{VariableInfo}
+        @param key: expression of the token value if known.
+        @type key: C{netir.Expr}
+        @return: C{True} if a lookup was produced, C{False} otherwise.
+        @rtype: C{bool}
+        """
+        place_type = self.marking_type.get_place_type_by_name(input_arc.place_name)
+        if key and place_type.provides_lookup:
+            self.builder.begin_TokenLookup(arc = input_arc,
+                                           token_var = token_var,
+                                           marking_var = self.arg_marking_var,
+                                           place_name = input_arc.place_name,
+                                           key = key)
+            return True
+
+        self.builder.begin_TokenEnumeration(arc = input_arc,
+                                            token_var = token_var,
+                                            marking_var = self.arg_marking_var,
+                                            place_name = input_arc.place_name)
+        return False
+
     def gen_enumerators(self):
         """ Produces all the token enumeration blocs.
         """
@@ -272,6 +393,9 @@ class SuccTGenerator(object):
         if self.config.optimize:
             trans.order_inputs()
 
+        # names of variables bound by enclosing blocks
+        bound_names = set()
+
         # loop over input_arcs
         for input_arc in trans.input_arcs:
             if self.config.optimize_flow and input_arc.place_info.flow_control:
@@ -293,6 +417,7 @@ class SuccTGenerator(object):
             # variable
             if input_arc.is_Variable:
                 variable = input_arc.variable
+                bound = self.bound_occurence(variable)
 
                 # if the variable is shared a new variable is produced, the variable is used otherwise
                 local_variable = variable_helper.new_variable_occurence(variable)
@@ -300,10 +425,9 @@ class SuccTGenerator(object):
                 # notify that the variable is used
                 variable_helper.mark_as_used(variable, local_variable)
 
-                builder.begin_TokenEnumeration(arc = input_arc,
-                                                token_var = local_variable,
-                                                marking_var = self.arg_marking_var,
-                                                place_name = input_arc.place_name)
+                if self.begin_token_access(input_arc, local_variable,
+                                           key = netir.Name(bound.name) if bound else None):
+                    index = None
 
                 input_arc.data.register('local_variable', local_variable)
                 input_arc.data.register('index', index)
@@ -316,14 +440,14 @@ class SuccTGenerator(object):
 
                 if inner.is_Variable:
                     variable = inner
+                    bound = self.bound_occurence(variable)
 
                     local_variable = variable_helper.new_variable_occurence(variable)
                     variable_helper.mark_as_used(variable, local_variable)
 
-                    builder.begin_TokenEnumeration(arc = input_arc,
-                                                    token_var = local_variable,
-                                                    marking_var = self.arg_marking_var,
-                                                    place_name = input_arc.place_name)
+                    if self.begin_token_access(input_arc, local_variable,
+                                               key = netir.Name(bound.name) if bound else None):
+                        index = None
 
                     self.try_unify_shared_variable(variable)
                     input_arc.data.register('local_variable', local_variable)
@@ -335,13 +459,16 @@ class SuccTGenerator(object):
 
                     local_variable = variable_helper.new_variable(variable_type = place_type.token_type)
 
-                    # get a token
-                    builder.begin_TokenEnumeration(arc = input_arc,
-                                                    token_var = local_variable,
-                                                    marking_var = self.arg_marking_var,
-                                                    place_name = input_arc.place_name)
+                    if place_info.type.is_BlackToken:
+                        # get a token
+                        self.begin_token_access(input_arc, local_variable)
+
+                    elif self.begin_token_access(input_arc, local_variable,
+                                                 key = netir.Value(value = input_arc.value,
+                                                                   place_name = input_arc.place_name)):
+                        index = None
 
-                    if not place_info.type.is_BlackToken:
+                    else:
                         # check token value
                         builder.begin_If(netir.Compare(left = netir.Name(name = local_variable.name),
                                                          ops = [ netir.EQ() ],
@@ -384,22 +511,25 @@ class SuccTGenerator(object):
 
                 local_variable = variable_helper.new_variable(place_type.token_type)
 
-                # get a token
-                builder.begin_TokenEnumeration(arc = input_arc,
-                                                token_var = local_variable,
-                                                marking_var = self.arg_marking_var,
-                                                place_name = input_arc.place_name)
+                if place_info.type.is_BlackToken:
+                    # get a token
+                    self.begin_token_access(input_arc, local_variable)
 
-                input_arc.data.register('local_variable', local_variable)
-                input_arc.data.register('index', index)
+                elif self.begin_token_access(input_arc, local_variable,
+                                             key = netir.Value(value = input_arc.value,
+                                                               place_name = input_arc.place_name)):
+                    index = None
 
-                if not place_info.type.is_BlackToken:
+                else:
                     # check token value
                     builder.begin_If(netir.Compare(left = netir.Name(name = local_variable.name),
                                                      ops = [ netir.EQ() ],
                                                      comparators = [ netir.Value(value = input_arc.value,
                                                                                   place_name = input_arc.place_name) ]))
 
+                input_arc.data.register('local_variable', local_variable)
+                input_arc.data.register('index', index)
+
 
             # flush
             elif input_arc.is_Flush:
@@ -487,6 +617,10 @@ class SuccTGenerator(object):
             else:
                 raise NotImplementedError, input_arc.arc_annotation.__class__
 
+            bound_names.update(input_arc.variables())
+            if self.config.optimize:
+                self.gen_guards(bound_names)
+
     def _gen_names(self, token_info):
         """ Produce names for intermediary variables when handling tuples.
 
@@ -791,13 +925,8 @@ class SuccTGenerator(object):
                 builder.emit_Assign(variable = new_pid, expr = PyExpr(expr))
                 i += 1
 
-        # guard
-        guard = ExpressionInfo(trans.trans.guard._str)
-        try:
-            if eval(guard.raw) != True:
-                builder.begin_GuardCheck(condition = netir.PyExpr(guard))
-        except:
-            builder.begin_GuardCheck(condition = netir.PyExpr(guard))
+        # guard conjuncts not checked during enumerations
+        self.gen_guards()
 
         computed_productions = defaultdict(list)
         for output in trans.outputs:
@@ -885,6 +1014,16 @@ class SuccTGenerator(object):
             builder.emit_UpdateHashSet(ctx_var = self.ctx_var,
                                        marking_var = normalized_marking_var)
         else:
+            # only modified places contribute to the hash change
+            builder.emit_UpdateHash(marking_var = new_marking_var,
+                                    src_marking_var = self.arg_marking_var,
+                                    mod = trans.modified_places())
+            if self.env.candidates:
+                index, affected = self.env.candidates[trans.name]
+                builder.emit_UpdateCandidates(marking_var = new_marking_var,
+                                              src_marking_var = self.arg_marking_var,
+                                              transition = index,
+                                              affected = affected)
             # add marking to set
             builder.emit_AddMarking(marking_set_var = self.marking_acc_var,
                                      marking_var = new_marking_var)
@@ -916,6 +1055,17 @@ class Compiler(object):
         self.backend = backend
         self.net_info = NetInfo(net)
 
+        # statistics of a previous exploration, used to estimate place sizes
+        # and order successor function calls
+        self.profile = None
+        if self.config.pgo_use:
+            try:
+                self.profile = neco.pgo.Profile.load(self.config.pgo_use)
+            except (IOError, ValueError), e:
+                fatal_error("cannot load profile {}: {}".format(self.config.pgo_use, e))
+            for place_info in self.net_info.places:
+                place_info.profiled_size = self.profile.place_size(place_info.name)
+
         if self.config.normalize_pids:
             if self.config.pid_first and not self.check_first_pid():
                 exit(-1)
@@ -1055,13 +1205,38 @@ class Compiler(object):
         marking_arg_node = netir.Name(arg_marking_var.name)
         ctx_node = netir.Name(arg_ctx_var.name)
 
-        if self.config.optimize_flow:
+        if self.env.pgo:
+            sizes = [ netir.PlaceCard(marking_var = arg_marking_var, place_name = place_info.name)
+                      for place_info in self.profiled_places() ]
+            builder.emit_ProcedureCall(function_name = '_neco_pgo.succs',
+                                       arguments = [ marking_arg_node,
+                                                     marking_acc_node,
+                                                     ctx_node ] + sizes)
+
+        elif self.env.por:
+            builder.emit_ProcedureCall(function_name = '_neco_por.succs',
+                                       arguments = [ marking_arg_node,
+                                                     marking_acc_node,
+                                                     ctx_node ])
+
+        elif self.config.optimize_flow:
             for function_name in self.env.process_succ_functions:
                 builder.emit_ProcedureCall(function_name = function_name,
                                            arguments = [ marking_arg_node,
                                                          marking_acc_node,
                                                          ctx_node ])
 
+        elif self.config.optimize:
+            self._gen_enabling_prefilter(builder, vp, arg_marking_var, arg_marking_acc_var,
+                                         [ marking_arg_node, marking_acc_node, ctx_node ])
+
+        elif self.profile:
+            for _, transition in self._ordered_transitions():
+                builder.emit_ProcedureCall(function_name = self.env.get_succ_function_name(transition),
+                                           arguments = [ marking_arg_node,
+                                                         marking_acc_node,
+                                                         ctx_node ])
+
         else:
             for function_name in self.env.succ_functions:
                 builder.emit_ProcedureCall(function_name = function_name,
@@ -1072,6 +1247,138 @@ class Compiler(object):
         builder.end_function()
         return builder.ast()
 
+    def profiled_places(self):
+        """ Get the places whose sizes are recorded with C{--pgo-collect}.
+
+        Flow control and generator places are internal, they are ignored.
+
+        @rtype: C{list}
+        """
+        return [ place_info for place_info in self.net_info.places
+                 if not (place_info.flow_control or place_info.is_generator_place) ]
+
+    def _ordered_transitions(self):
+        """ Get transitions in successor function call order.
+
+        Transitions keep their net order unless a profile is used, most
+        frequently enabled transitions are then called first.
+
+        @return: transition index and transition pairs.
+        @rtype: C{list}
+        """
+        transitions = self.net_info.transitions
+        indices = dict((transition.name, i) for i, transition in enumerate(transitions))
+        if self.profile:
+            transitions = self.profile.order_transitions(transitions)
+        return [ (indices[transition.name], transition) for transition in transitions ]
+
+    def _required_places(self, transition):
+        """ Get the places that must be non empty for a transition to be enabled.
+
+        Flushes never disable a transition and generator places are never
+        empty, their arcs are thus ignored.
+
+        @param transition: transition.
+        @type transition: C{TransitionInfo}
+        @rtype: C{list}
+        """
+        places = []
+        for arc in transition.input_arcs:
+            if arc.place_info.is_generator_place:
+                continue
+            if arc.is_Flush or arc.is_GeneratorMultiArc:
+                continue
+            if arc.is_MultiArc and not arc.sub_arcs:
+                continue
+            if not arc.place_info in places:
+                places.append(arc.place_info)
+        return places
+
+    def _candidate_relations(self):
+        """ Compute the transitions whose enabledness may change when a transition fires.
+
+        Only transitions having an input place modified by the fired one
+        are affected, the other ones keep their enabledness.
+
+        @return: the index and the sorted affected transition indexes of
+        each transition, indexed by transition names.
+        @rtype: C{dict}
+        """
+        transitions = self.net_info.transitions
+        indices = dict((transition.name, i) for i, transition in enumerate(transitions))
+        candidates = {}
+        for i, transition in enumerate(transitions):
+            affected = set()
+            for place_info in transition.modified_places():
+                affected.update(indices[consumer.name] for consumer in place_info.post)
+            candidates[transition.name] = (i, sorted(affected))
+        return candidates
+
+    def _gen_enabling_prefilter(self, builder, vp, marking_var, marking_acc_var, arguments):
+        """ Produce successor function calls guarded by input place emptiness.
+
+        A mask of non empty places is computed once per marking, bit I{i}
+        being set if the I{i}-th input place holds tokens. Each successor
+        function is then called only if all input places of its transition
+        are non empty, ie., if the bits of its required mask are set.
+
+        If enabledness is tracked, only the candidate transitions of the
+        marking are considered. Successor functions record the enabled
+        transitions into the candidates of the marking and set the
+        candidates of new markings to the transitions affected by the
+        firing, the enabled transitions are then added to the candidates
+        of all successors.
+
+        @param builder: builder of the main successor function.
+        @param vp: variable provider of the main successor function.
+        @param marking_var: marking argument.
+        @type marking_var: C{VariableInfo}
+        @param marking_acc_var: successor set.
+        @type marking_acc_var: C{VariableInfo}
+        @param arguments: successor function arguments.
+        @type arguments: C{list}
+        """
+        required = []
+        bits = {}
+        places = []
+        for transition in self.net_info.transitions:
+            mask = []
+            for place_info in self._required_places(transition):
+                try:
+                    bit = bits[place_info.name]
+                except KeyError:
+                    bit = bits[place_info.name] = len(places)
+                    places.append(place_info.name)
+                mask.append(bit)
+            required.append(sorted(mask))
+
+        mask_var = vp.new_variable()
+        if places:
+            builder.emit_EnablingMask(marking_var = marking_var,
+                                      mask_var = mask_var,
+                                      place_names = places)
+
+        candidates_var = vp.new_variable()
+        if self.env.candidates:
+            builder.emit_LoadCandidates(marking_var = marking_var,
+                                        candidates_var = candidates_var)
+
+        for i, transition in self._ordered_transitions():
+            mask = required[i]
+            function_name = self.env.get_succ_function_name(transition)
+            if self.env.candidates:
+                builder.begin_IfEnabled(mask_var = candidates_var, required = [ i ])
+            if mask:
+                builder.begin_IfEnabled(mask_var = mask_var, required = mask)
+            builder.emit_ProcedureCall(function_name = function_name,
+                                       arguments = arguments)
+            builder.end_all_blocks()
+
+        if self.env.candidates:
+            builder.emit_SpreadCandidates(marking_acc_var = marking_acc_var,
+                                          marking_var = marking_var,
+                                          successor_var = vp.new_variable(variable_type = self.marking_type.type))
+
     def _gen_init(self):
         """ Produce initial marking function abstract representation node. """
 
@@ -1129,8 +1436,25 @@ class Compiler(object):
         """
         env = self.env
 
+        if self.config.optimize and not (self.config.por or self.config.optimize_flow or
+                                         self.config.normalize_pids or self.config.pgo_collect):
+            env.candidates = self._candidate_relations()
+            self.marking_type.tracked_transitions = len(self.net_info.transitions)
+
         env.successor_function_nodes = flatten_lists(self._gen_all_spec_succs())
         env.process_successor_function_nodes = flatten_lists(self._gen_all_process_spec_succs())
+        if self.config.por:
+            transitions = self.net_info.transitions
+            env.por = neco.por.StaticRelations(transitions,
+                                               [ env.get_succ_function_name(t) for t in transitions ],
+                                               self.config.por,
+                                               self.config.por_visible)
+        if self.config.pgo_collect:
+            transitions = self.net_info.transitions
+            env.pgo = neco.pgo.Instrumentation(transitions,
+                                               [ env.get_succ_function_name(t) for t in transitions ],
+                                               [ place_info.name for place_info in self.profiled_places() ],
+                                               self.config.pgo_collect)
         env.main_successor_function_node = flatten_lists(self._gen_main_succ())
         env.init_function_node = flatten_lists(self._gen_init())
 
@@ -5,13 +5,20 @@ from neco.core import netir
 from neco.extsnakes import Pid
 from neco.utils import Enum, TypeMatch, RegDict
 from snakes.nets import BlackToken, dot, Place
+from snakes.lang import ast, getvars, unparse
 from snakes.plugins import status
-from snakes.typing import Instance, tNatural, CrossProduct, tAll
+from snakes.typing import Instance, tNatural, CrossProduct, tAll, tBoolean
+import math
 import sys
 
 
 TypeKind = Enum('AnyType', 'TupleType', 'UserType')
 
+# estimated size of places without bounds, used for input arc ordering
+DEFAULT_CARDINALITY = 10
+# estimated fraction of bindings satisfying a guard
+GUARD_SELECTIVITY = 0.5
+
 class TypeInfo(object):
     """ Class representing and providing types.
     """
@@ -194,14 +201,18 @@ class TypeInfo(object):
             return TypeInfo.BlackToken
         elif checker == Instance(str):
             return TypeInfo.String
+        elif checker == tBoolean or checker == Instance(bool):
+            return TypeInfo.Bool
         elif checker == Instance(Pid):
             return TypeInfo.Pid
         elif isinstance(checker, CrossProduct):
             return TypeInfo.TupleType([ TypeInfo.from_snakes_checker(t) for t in checker._types ])
         elif checker == Instance(object) or checker == tAll:
             return TypeInfo.AnyType
-        else:
+        elif isinstance(checker, Instance):
             return TypeInfo.UserType(checker._class.__name__)
+        else:
+            return TypeInfo.AnyType
         raise RuntimeError('unrechable')
 
     @classmethod
@@ -521,6 +532,33 @@ class ExpressionInfo(TokenInfo):
     def variables(self):
         return defaultdict(lambda : 0)    # To do
 
+    def names(self):
+        """ Get names appearing in the expression.
+
+        @rtype: C{set}
+        """
+        return getvars(self.raw)
+
+    def conjuncts(self):
+        """ Split the expression into its conjuncts.
+
+        Nested conjunctions are flattened, an expression that is not a
+        conjunction is its own unique conjunct.
+
+        @return: conjuncts in evaluation order.
+        @rtype: C{list} of C{ExpressionInfo}
+        """
+        def split(node):
+            if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+                return [ conjunct for value in node.values for conjunct in split(value) ]
+            return [ node ]
+
+        tree = ast.parse(self.raw.strip(), mode = 'eval')
+        conjuncts = split(tree.body)
+        if len(conjuncts) == 1:
+            return [ self ]
+        return [ ExpressionInfo(unparse(conjunct)) for conjunct in conjuncts ]
+
     def base_names(self):
         return (self.name, self.local_name)
 
@@ -880,18 +918,67 @@ class TransitionInfo(object):
         self._intermediary_variables.append(variable)
 
     def order_inputs(self):
-        def transform(p):
-            if p.place_info.one_safe:
-                if p.place_info.type.is_BlackToken:
+        """ Order input arcs to reduce the number of enumerated bindings.
+
+        Arcs are chosen greedily: at each step the arc producing the
+        fewest bindings, given the variables bound by previously chosen
+        arcs, is enumerated next. Arcs whose variables are all bound, as
+        well as value arcs, select at most one token, other arcs enumerate
+        their place. An arc is favored for each guard conjunct whose
+        variables it completes, since the conjunct can be checked right
+        after it. Ties are broken by a static ranking of arc kinds then by
+        the current order, thus ordering is stable. Place sizes are
+        estimated by C{PlaceInfo.cardinality}.
+        """
+        def rank(arc):
+            if arc.place_info.one_safe:
+                if arc.place_info.type.is_BlackToken:
                     return 1
                 else: return 2
-            elif p.is_Value:
+            elif arc.is_Value:
                 return 4
-            elif p.is_Test:
+            elif arc.is_Test:
                 return 5
             else:
                 return 6
-        self.input_arcs.sort(key = transform)
+
+        def bindings(arc, bound):
+            if arc.is_Flush:
+                return 1
+            token = arc.inner if arc.is_Test else arc
+            if token.is_Value:
+                return 1
+            free = [ name for name in arc.variables() if not name in bound ]
+            if not free:
+                return 1
+            size = arc.place_info.cardinality
+            if arc.is_MultiArc:
+                return size ** len(arc.sub_arcs)
+            return size
+
+        input_variables = set(self.input_variables())
+        guard = ExpressionInfo(self.trans.guard._str)
+        guard_variables = [ conjunct.names() & input_variables for conjunct in guard.conjuncts() ]
+        guard_variables = [ names for names in guard_variables if names ]
+
+        remaining = list(self.input_arcs)
+        bound = set()
+        ordered = []
+        while remaining:
+            def cost(item):
+                position, arc = item
+                estimate = bindings(arc, bound)
+                arc_bound = bound.union(arc.variables())
+                for names in guard_variables:
+                    if not names <= bound and names <= arc_bound:
+                        estimate *= GUARD_SELECTIVITY
+                return (estimate, rank(arc), position)
+
+            position, arc = min(enumerate(remaining), key = cost)
+            ordered.append(remaining.pop(position))
+            bound.update(arc.variables())
+
+        self.input_arcs = ordered
 
     def shared_input_variables(self):
         variables = self.input_variables()
@@ -967,6 +1054,9 @@ class PlaceInfo(object):
     def __init__(self, place, one_safe = False, bound = None, process_name = None, flow_control = False):
 
         self._1safe = place.one_safe if hasattr(place, 'one_safe') else one_safe
+        self.bound = bound
+        # mean size measured by a profiling run, if any
+        self.profiled_size = None
         if not self._1safe:
             try:
                 capacity = place.label('capacity') if hasattr(place, 'label') else None
@@ -976,6 +1066,8 @@ class PlaceInfo(object):
                 (_, high) = capacity
                 if high == 1:
                     self._1safe = True
+                if high is not None and self.bound is None:
+                    self.bound = high
 
         self.snk_place = place
         self._name = place.name
@@ -1043,6 +1135,25 @@ class PlaceInfo(object):
     def type(self):
         return self._type
 
+    @property
+    def cardinality(self):
+        """ Estimated number of tokens held by the place.
+
+        One-safe places hold at most one token, otherwise the size
+        measured by a profiling run or the declared bound is used if
+        available. The initial marking size is used as a last resort, with
+        a lower bound of C{DEFAULT_CARDINALITY}.
+
+        @rtype: C{int}
+        """
+        if self.one_safe:
+            return 1
+        elif self.profiled_size is not None:
+            return max(int(math.ceil(self.profiled_size)), 1)
+        elif self.bound is not None:
+            return self.bound
+        return max(len(self.tokens), DEFAULT_CARDINALITY)
+
     @classmethod
     def Dummy(cls, name, one_safe = False, process_name = None, flow_control = False):
         place = Place(name)
@@ -21,6 +21,7 @@ class PlaceType(object):
 
     _by_index_access_   = False
     _by_index_deletion_ = False
+    _lookup_            = False
 
     def __init__(self, place_info, marking_type, type_info, token_type):
         """ Initialise the place type_info.
@@ -56,6 +57,11 @@ class PlaceType(object):
     def provides_by_index_deletion(self):
         return self._by_index_deletion
 
+    @property
+    def provides_lookup(self):
+        """ Check if tokens can be searched by value, see C{contains_expr}. """
+        return self._lookup_
+
     def disable_by_index_access(self):
         self._by_index_access = False
 
@@ -107,6 +113,9 @@ class MarkingType(object):
         self._flow_control_places = set()
         self._one_safe_places = set()
 
+        # number of transitions whose enabledness is tracked in markings
+        self.tracked_transitions = 0
+
 
     def add_method_generator(self, method_generator):
         self._method_generators.append(method_generator)
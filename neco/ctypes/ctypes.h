@@ -5,9 +5,11 @@
 #include <cstdio>
 #include <cstdlib>
 #include <cstring>
+#include <algorithm>
 #include <vector>
 #include <utility>
 #include <iostream>
+#include <stdexcept>
 
 #define INT_INIT_MAX_SIZE 2
 #define INT_RESIZE 4
@@ -57,7 +59,7 @@ struct THashProvider<int>
 template <typename T>
 struct TDefaultComparisonProvider
 {
-	inline static int 		compare(T& left, T& right) 		{ ASSERT(0, "no suitable specialization (DefaultComparisonProvider)"); return 0; }
+	inline static int 		compare(const T& left, const T& right) 		{ ASSERT(0, "no suitable specialization (DefaultComparisonProvider)"); return 0; }
 };
 
 template <typename T>
@@ -77,7 +79,7 @@ template <>
 struct TDefaultComparisonProvider<int>
 {
 	typedef int T;
-	inline static int 		compare(T& left, T& right) 		{ return left - right; }
+	inline static int 		compare(const T& left, const T& right) 		{ return left - right; }
 };
 
 
@@ -113,16 +115,21 @@ public:
 
 	inline void 			decrement_ref();
 	inline void 			increment_ref();
+	inline int 				refs() const;
 
     void 					add(DataType value);
     inline void 			remove_by_index(int index);
     void 					remove_by_value(DataType value);
+    inline void 			set(int index, const DataType& value);
+    void 					sort();
     void 					update(const TGenericPlaceType& right);
     inline void 			clean();
+    inline void 			compact();
 
     inline int 				size() const;
 	inline bool 			not_empty() const;
     inline const DataType& 	get(int index) const;
+    inline const DataType* 	data() const;
     int 					index_of(const DataType& value) const;
 
     int 					equals(const TGenericPlaceType<DataType>& right) const;
@@ -172,6 +179,19 @@ void TGenericPlaceType_CLS::clean()
 	mSize = 0;
 }
 
+// release unused capacity, the place must not be modified afterwards
+TGenericPlaceType_TARGS
+void TGenericPlaceType_CLS::compact()
+{
+	if (mMaxSize == mSize)
+		return;
+	DataType* data = new DataType[mSize];
+	memcpy(data, mData, mSize * sizeof(DataType));
+	delete[] mData;
+	mData = data;
+	mMaxSize = mSize;
+}
+
 TGenericPlaceType_TARGS
 void TGenericPlaceType_CLS::decrement_ref()
 {
@@ -186,6 +206,12 @@ void TGenericPlaceType_CLS::increment_ref()
 	mRefs++;
 }
 
+TGenericPlaceType_TARGS
+int TGenericPlaceType_CLS::refs() const
+{
+	return mRefs;
+}
+
 TGenericPlaceType_TARGS
 bool TGenericPlaceType_CLS::not_empty() const
 {
@@ -198,7 +224,7 @@ char* TGenericPlaceType_CLS::cstr() const
 	static char s_buf[1024];
 
     // TO DO accept bigger strings
-    char tmp[20];
+    char tmp[256];
     int i, size;
 
     s_buf[0] = '\0';
@@ -290,7 +316,7 @@ void TGenericPlaceType_CLS::add(DataType value)
 		for (int i = 0; i < mSize; ++i) {
 			new_data[i] = mData[i];
 		}
-		delete mData;
+		delete[] mData;
 		mData = new_data;
     }
     // find suitable index
@@ -302,7 +328,7 @@ void TGenericPlaceType_CLS::add(DataType value)
     }
 
     // shift values
-    for (j = mSize+1; j > i; j--) {
+    for (j = mSize; j > i; j--) {
     	mData[j] = mData[j-1];
     }
 
@@ -322,15 +348,30 @@ void TGenericPlaceType_CLS::remove_by_index(int index)
 TGenericPlaceType_TARGS
 void TGenericPlaceType_CLS::remove_by_value(DataType value)
 {
-    int index = 0;
-    for (; index < mSize; index++) {
-		if (mData[index] == value) {
-			mSize--;
-			mData[index] = mData[mSize];
-			break;
+    int index = index_of(value);
+    if (index >= 0)
+    	remove_by_index(index);
+}
+
+// replace a value, the place must be sorted again afterwards
+TGenericPlaceType_TARGS
+void TGenericPlaceType_CLS::set(int index, const DataType& value)
+{
+	mData[index] = value;
+}
+
+// insertion sort, places are small and often almost sorted
+TGenericPlaceType_TARGS
+void TGenericPlaceType_CLS::sort()
+{
+	for (int i = 1; i < mSize; i++) {
+		DataType value = mData[i];
+		int j = i;
+		for (; j > 0 && ComparisonProvider_t::compare(mData[j-1], value) > 0; j--) {
+			mData[j] = mData[j-1];
 		}
-    }
-    qsort(mData, mSize, sizeof(int), int_cmp);
+		mData[j] = value;
+	}
 }
 
 TGenericPlaceType_TARGS
@@ -339,6 +380,12 @@ const DataType& TGenericPlaceType_CLS::get(int index) const
 	return mData[index];
 }
 
+TGenericPlaceType_TARGS
+const DataType* TGenericPlaceType_CLS::data() const
+{
+	return mData;
+}
+
 TGenericPlaceType_TARGS
 int TGenericPlaceType_CLS::size() const
 {
@@ -355,7 +402,7 @@ TGenericPlaceType_TARGS
 int TGenericPlaceType_CLS::index_of(const DataType& value) const
 {
 	for (int i = 0; i < mSize; ++i) {
-		if (mData[i] == value) {
+		if (ComparisonProvider_t::compare(mData[i], value) == 0) {
 			return i;
 		}
 	}
@@ -366,127 +413,239 @@ int TGenericPlaceType_CLS::index_of(const DataType& value) const
 #undef TGenericPlaceType_CLS
 
 
+/////////////////////////////////////////////////////
+// pids
+/////////////////////////////////////////////////////
+
+#ifndef NECO_PID_MAX_DEPTH
+#define NECO_PID_MAX_DEPTH 16
+#endif
+
 #define TPid_TARGS 		template< typename T >
 #define TPid_CLS		TPid<T>
 
+// pids are stored by value in place types, fragments are kept in a fixed
+// size array so that pids remain trivially copyable. Going deeper than
+// NECO_PID_MAX_DEPTH throws std::overflow_error, ie., OverflowError on the
+// python side.
 template< typename T >
 class TPid
 {
 public:
 	inline				TPid();
 	inline				TPid(int i);
-	inline				TPid(const TPid<T>& pid);
 	inline				TPid(const TPid<T>& pid, int next);
-	inline				~TPid();
 
-	inline bool 		operator == (const TPid<T>& right);
-	inline int 			compare(const TPid<T>& right);
-	inline size_t 		format(char* buffer);
+	inline bool 		operator == (const TPid<T>& right) const;
+	inline int 			compare(const TPid<T>& right) const;
+	inline int 			hash() const;
+	inline int 			size() const;
+	inline T 			at(int i) const;
+	inline void 		append(T frag);
+	inline TPid<T> 		next(int counter) const;
+	inline size_t 		format(char* buffer) const;
 
 private:
-	std::vector<T> 		mData;
+	int 				mSize;
+	T 					mData[NECO_PID_MAX_DEPTH];
 };
 
-
-
 TPid_TARGS
 TPid_CLS::TPid()
+		: mSize(0)
 {
 }
 
 TPid_TARGS
 TPid_CLS::TPid(int i)
+		: mSize(1)
 {
-	mData.push_back(i);
+	mData[0] = i;
 }
 
 TPid_TARGS
-TPid_CLS::TPid(const TPid<T>& pid)
+TPid_CLS::TPid(const TPid<T>& pid, int next)
 {
-	for (size_t i = 0; i < pid.mData.size(); ++i) {
-		mData.push_back(pid.mData[i]);
+	*this = pid;
+	append(next);
+}
+
+TPid_TARGS
+bool TPid_CLS::operator == (const TPid<T>& right) const
+{
+	return compare(right) == 0;
+}
+
+// lexicographic order, a pid comes before its children
+TPid_TARGS
+int TPid_CLS::compare(const TPid<T>& right) const
+{
+	int size = mSize < right.mSize ? mSize : right.mSize;
+	for (int i = 0; i < size; ++i) {
+		int cmp = mData[i] - right.mData[i];
+		if (cmp != 0) {
+			return cmp;
+		}
 	}
+	return mSize - right.mSize;
 }
 
 TPid_TARGS
-TPid_CLS::TPid(const TPid<T>& pid, int next)
+int TPid_CLS::hash() const
 {
-	for (size_t i = 0; i < pid.mData.size(); ++i) {
-		mData.push_back(pid.mData[i]);
+	unsigned int hash = mSize;
+	for (int i = 0; i < mSize; ++i) {
+		hash = (hash << 5) ^ (hash >> 27) ^ int_hash(mData[i]);
 	}
-	mData.push_back(next);
+	return hash;
 }
 
 TPid_TARGS
-TPid_CLS::~TPid()
+int TPid_CLS::size() const
 {
+	return mSize;
 }
 
 TPid_TARGS
-bool TPid_CLS::operator == (const TPid<T>& right)
+T TPid_CLS::at(int i) const
 {
-	for (size_t i = 0; i < right.mData.size(); ++i) {
-		if (mData[i] != right.mData[i])
-			return false;
-	}
-	return true;
+	return mData[i];
 }
 
 TPid_TARGS
-int TPid_CLS::compare(const TPid<T>& right)
+void TPid_CLS::append(T frag)
 {
-	for (size_t i = 0; i < right.mData.size(); ++i) {
-		int cmp = mData[i] - right.mData[i];
-		if (cmp != 0) {
-			return cmp;
-		}
+	if (mSize >= NECO_PID_MAX_DEPTH) {
+		throw std::overflow_error("pid deeper than NECO_PID_MAX_DEPTH");
 	}
-	return 0;
+	mData[mSize++] = frag;
 }
 
+// pid of the next child, given the number of already spawned children
 TPid_TARGS
-size_t TPid_CLS::format(char* buffer)
+TPid<T> TPid_CLS::next(int counter) const
+{
+	return TPid<T>(*this, counter + 1);
+}
+
+TPid_TARGS
+size_t TPid_CLS::format(char* buffer) const
 {
 	size_t offset = 0;
-	for (size_t i = 0; i < mData.size(); ++i) {
+	for (int i = 0; i < mSize; ++i) {
 		if (i > 0) {
 			offset += sprintf(buffer + offset, ".");
 		}
 		offset += sprintf(buffer + offset, "%d", mData[i]);
 	}
 	*(buffer + offset) = '\0';
-	std::cout << "BUFFER !!! " << buffer << std::endl;
 	return offset;
 }
 
 #undef TPid_TARGS
 #undef TPid_CLS
 
+template <typename T>
+struct THashProvider< TPid<T> >
+{
+	inline static int hash(const TPid<T>& value) {
+		return value.hash();
+	}
+};
+
+template <typename T>
+struct TDefaultComparisonProvider< TPid<T> >
+{
+	inline static int compare(const TPid<T>& left, const TPid<T>& right) {
+		return left.compare(right);
+	}
+};
+
+template <typename T>
+struct TFormatter< TPid<T> >
+{
+	inline static size_t format(char* buffer, const TPid<T>& pid) {
+		return pid.format(buffer);
+	}
+};
+
+/////////////////////////////////////////////////////
+// generator places
+/////////////////////////////////////////////////////
+
+// (pid, number of spawned children) pair stored by generator places
+template< typename PidType, typename CounterType >
+struct TGeneratorEntry
+{
+	PidType 			mPid;
+	CounterType 		mCounter;
+
+	inline 				TGeneratorEntry() {}
+	inline 				TGeneratorEntry(const PidType& pid, CounterType counter)
+								: mPid(pid), mCounter(counter) {}
+
+	inline const PidType& 	get_first() const 					{ return mPid; }
+	inline CounterType 		get_second() const 					{ return mCounter; }
+	inline void 			set_second(CounterType counter) 	{ mCounter = counter; }
+};
+
+template< typename PidType, typename CounterType >
+struct THashProvider< TGeneratorEntry<PidType, CounterType> >
+{
+	inline static int hash(const TGeneratorEntry<PidType, CounterType>& value) {
+		return THashProvider<PidType>::hash(value.mPid) ^ int_hash(value.mCounter);
+	}
+};
+
+template< typename PidType, typename CounterType >
+struct TDefaultComparisonProvider< TGeneratorEntry<PidType, CounterType> >
+{
+	inline static int compare(const TGeneratorEntry<PidType, CounterType>& left,
+							  const TGeneratorEntry<PidType, CounterType>& right) {
+		int cmp = TDefaultComparisonProvider<PidType>::compare(left.mPid, right.mPid);
+		if (cmp != 0)
+			return cmp;
+		return left.mCounter - right.mCounter;
+	}
+};
+
+template< typename PidType, typename CounterType >
+struct TFormatter< TGeneratorEntry<PidType, CounterType> >
+{
+	inline static size_t format(char* buffer, const TGeneratorEntry<PidType, CounterType>& entry) {
+		char *initial_buffer = buffer;
+		buffer += sprintf(buffer, "<");
+		buffer += TFormatter<PidType>::format(buffer, entry.mPid);
+		buffer += sprintf(buffer, ", ");
+		buffer += TFormatter<CounterType>::format(buffer, entry.mCounter);
+		buffer += sprintf(buffer, ">");
+		return buffer - initial_buffer;
+	}
+};
 
 #define TGeneratorPlaceType_TARGS \
-template< typename PidType, typename CounterType, template <typename> class ComparisonProvider >
+template< typename PidType, typename CounterType, template <typename> class DataTypeHandler >
 
 #define TGeneratorPlaceType_CLS \
-TGeneratorPlaceType<PidType, CounterType, ComparisonProvider >
+TGeneratorPlaceType<PidType, CounterType, DataTypeHandler >
 
+// entries are sorted by pid, each pid appears at most once
 template< typename PidType, typename CounterType,
-		  template <typename> class ComparisonProvider = TDefaultComparisonProvider >
+		  template <typename> class DataTypeHandler = TDefaultDataTypeHandler >
 class TGeneratorPlaceType
-		: public TGenericPlaceType< std::pair<PidType, CounterType>, ComparisonProvider >
+		: public TGenericPlaceType< TGeneratorEntry<PidType, CounterType>, DataTypeHandler >
 {
-	typedef std::pair<PidType, CounterType> 											DataType_t;
-	typedef TGeneratorPlaceType<PidType, CounterType, ComparisonProvider> 				ThisType_t;
-	typedef TGenericPlaceType< std::pair<PidType, CounterType>, ComparisonProvider > 	BaseType_t;
+	typedef TGeneratorEntry<PidType, CounterType> 							DataType_t;
+	typedef TGenericPlaceType< DataType_t, DataTypeHandler > 				BaseType_t;
 
 public:
 				TGeneratorPlaceType();
-				TGeneratorPlaceType(const ThisType_t& other);
+				TGeneratorPlaceType(const TGeneratorPlaceType_CLS& other);
 
 	void 		update_pid_counter(const PidType& pid, CounterType counter);
 	void 		remove_pid(const PidType& pid);
 };
 
-
 TGeneratorPlaceType_TARGS
 TGeneratorPlaceType_CLS::TGeneratorPlaceType()
 {
@@ -494,7 +653,7 @@ TGeneratorPlaceType_CLS::TGeneratorPlaceType()
 
 TGeneratorPlaceType_TARGS
 TGeneratorPlaceType_CLS::TGeneratorPlaceType(const TGeneratorPlaceType_CLS& other)
-		: TGenericPlaceType< DataType_t >(other)
+		: BaseType_t(other)
 {
 }
 
@@ -503,26 +662,23 @@ void TGeneratorPlaceType_CLS::update_pid_counter(const PidType& pid, CounterType
 {
 	for (int i = 0; i < this->mSize; ++i) {
 		DataType_t& current = this->mData[i];
-		int cmp = ComparisonProvider<PidType>::compare(current.get_first(), pid);
+		int cmp = TDefaultComparisonProvider<PidType>::compare(current.mPid, pid);
 		if (cmp == 0) {
 			current.set_second(counter);
-			this->mData[i] = current;
 			return;
-
 		} else if (cmp > 0) {
 			break;
 		}
 	}
 	// not updated, new pid
-	add( std::pair<PidType, CounterType>(pid, counter) );
+	this->add( DataType_t(pid, counter) );
 }
 
 TGeneratorPlaceType_TARGS
 void TGeneratorPlaceType_CLS::remove_pid(const PidType& pid)
 {
 	for (int i = 0; i < this->mSize; ++i) {
-		DataType_t& current = this->mData[i];
-		int cmp = ComparisonProvider<PidType>::compare(current.get_first(), pid);
+		int cmp = TDefaultComparisonProvider<PidType>::compare(this->mData[i].mPid, pid);
 		if (cmp == 0) {
 			BaseType_t::remove_by_index(i);
 			return;
@@ -532,6 +688,306 @@ void TGeneratorPlaceType_CLS::remove_pid(const PidType& pid)
 	}
 }
 
+#undef TGeneratorPlaceType_TARGS
+#undef TGeneratorPlaceType_CLS
+
+/////////////////////////////////////////////////////
+// pid trees
+/////////////////////////////////////////////////////
+
+// Tree of the pids of a marking used to normalize pids.
+//
+// Each pid is a node and each node holds the pid-free data owned by the pid,
+// ie., values summarizing the tokens the pid owns. Children of each node are
+// ordered with respect to this data, then each pid is renamed into the
+// sequence of positions of its fragments in the ordered tree. The next pid of
+// a generator entry is always put after the other children so that the
+// counter of the renamed entry is the number of children.
+//
+// Nodes are kept between uses of the tree to avoid allocations.
+template< typename T >
+class TPidTree
+{
+	typedef TPid<T> 								Pid_t;
+	typedef TGenericPlaceType< Pid_t > 				PidPlace_t;
+	typedef TGeneratorPlaceType< Pid_t, int > 		GeneratorPlace_t;
+
+	struct Node {
+		T 					mFrag;
+		T 					mNewFrag;
+		bool 				mReferenced;
+		bool 				mNextPid;
+		std::vector<int> 	mChildren;
+		std::vector<int> 	mData;
+	};
+
+public:
+	inline 					TPidTree();
+
+	inline void 			clear();
+	inline void 			insert(const Pid_t& pid);
+	inline void 			add_pid(const Pid_t& pid);
+	inline void 			add_next_pid(const Pid_t& pid);
+	inline void 			add_data(const Pid_t& owner, int value);
+	void 					add_pid_place(const PidPlace_t* place, int value);
+	void 					add_generator_place(const GeneratorPlace_t* place);
+
+	void 					normalize();
+	Pid_t 					map(const Pid_t& pid) const;
+
+	PidPlace_t* 			update_pid_place(PidPlace_t* place) const;
+	GeneratorPlace_t* 		update_generator_place(GeneratorPlace_t* place) const;
+
+	inline size_t 			size() const;
+
+private:
+	int 					node(const Pid_t& pid);
+	int 					child(int parent, T frag);
+	int 					find_child(int parent, T frag) const;
+	int 					order(int left, int right) const;
+	void 					order_children(int index);
+
+	template <typename PlaceType>
+	static PlaceType* 		unshare(PlaceType* place);
+
+	std::vector<Node> 		mNodes;
+	size_t 					mUsed;
+};
+
+template< typename T >
+TPidTree<T>::TPidTree()
+		: mNodes(1)
+		, mUsed(1)
+{
+	clear();
+}
+
+template< typename T >
+void TPidTree<T>::clear()
+{
+	Node& root = mNodes[0];
+	root.mFrag = 0;
+	root.mNewFrag = 0;
+	root.mReferenced = false;
+	root.mNextPid = false;
+	root.mChildren.clear();
+	root.mData.clear();
+	mUsed = 1;
+}
+
+template< typename T >
+size_t TPidTree<T>::size() const
+{
+	return mUsed - 1;
+}
+
+template< typename T >
+int TPidTree<T>::find_child(int parent, T frag) const
+{
+	const std::vector<int>& children = mNodes[parent].mChildren;
+	for (size_t i = 0; i < children.size(); ++i) {
+		if (mNodes[children[i]].mFrag == frag)
+			return children[i];
+	}
+	return -1;
+}
+
+template< typename T >
+int TPidTree<T>::child(int parent, T frag)
+{
+	int index = find_child(parent, frag);
+	if (index >= 0)
+		return index;
+
+	if (mUsed == mNodes.size())
+		mNodes.resize(mNodes.size() * 2);
+
+	index = mUsed++;
+	Node& node = mNodes[index];
+	node.mFrag = frag;
+	node.mNewFrag = 0;
+	node.mReferenced = false;
+	node.mNextPid = false;
+	node.mChildren.clear();
+	node.mData.clear();
+	mNodes[parent].mChildren.push_back(index);
+	return index;
+}
+
+template< typename T >
+int TPidTree<T>::node(const Pid_t& pid)
+{
+	int index = 0;
+	for (int i = 0; i < pid.size(); ++i) {
+		index = child(index, pid.at(i));
+	}
+	return index;
+}
+
+template< typename T >
+void TPidTree<T>::insert(const Pid_t& pid)
+{
+	node(pid);
+}
+
+template< typename T >
+void TPidTree<T>::add_pid(const Pid_t& pid)
+{
+	mNodes[node(pid)].mReferenced = true;
+}
+
+template< typename T >
+void TPidTree<T>::add_next_pid(const Pid_t& pid)
+{
+	mNodes[node(pid)].mNextPid = true;
+}
+
+template< typename T >
+void TPidTree<T>::add_data(const Pid_t& owner, int value)
+{
+	Node& node = mNodes[this->node(owner)];
+	node.mReferenced = true;
+	node.mData.push_back(value);
+}
+
+template< typename T >
+void TPidTree<T>::add_pid_place(const PidPlace_t* place, int value)
+{
+	for (int i = 0; i < place->size(); ++i) {
+		add_data(place->get(i), value);
+	}
+}
+
+template< typename T >
+void TPidTree<T>::add_generator_place(const GeneratorPlace_t* place)
+{
+	for (int i = 0; i < place->size(); ++i) {
+		const TGeneratorEntry<Pid_t, int>& entry = place->get(i);
+		add_pid(entry.mPid);
+		add_next_pid(entry.mPid.next(entry.mCounter));
+	}
+}
+
+// same order as pid_free_marking_order of the python backend: next pids
+// last, then nodes owning more data, then nodes having more children, then
+// children pairwise.
+template< typename T >
+int TPidTree<T>::order(int left_index, int right_index) const
+{
+	const Node& left = mNodes[left_index];
+	const Node& right = mNodes[right_index];
+
+	if (left.mNextPid)
+		return right.mNextPid ? 0 : 1;
+	else if (right.mNextPid)
+		return -1;
+
+	int cmp = (int) right.mReferenced - (int) left.mReferenced;
+	if (cmp != 0)
+		return cmp;
+
+	cmp = (int) right.mData.size() - (int) left.mData.size();
+	if (cmp != 0)
+		return cmp;
+	for (size_t i = 0; i < left.mData.size(); ++i) {
+		if (left.mData[i] != right.mData[i])
+			return left.mData[i] < right.mData[i] ? 1 : -1;
+	}
+
+	cmp = (int) right.mChildren.size() - (int) left.mChildren.size();
+	if (cmp != 0)
+		return cmp;
+	for (size_t i = 0; i < left.mChildren.size(); ++i) {
+		cmp = order(left.mChildren[i], right.mChildren[i]);
+		if (cmp != 0)
+			return cmp;
+	}
+	return 0;
+}
+
+// order a subtree bottom up, children are compared once their own children
+// are ordered
+template< typename T >
+void TPidTree<T>::order_children(int index)
+{
+	Node& node = mNodes[index];
+	std::vector<int>& children = node.mChildren;
+
+	std::sort(node.mData.begin(), node.mData.end());
+	for (size_t i = 0; i < children.size(); ++i) {
+		order_children(children[i]);
+	}
+
+	// stable insertion sort, equivalent children keep the order of the marking
+	for (size_t i = 1; i < children.size(); ++i) {
+		int value = children[i];
+		size_t j = i;
+		for (; j > 0 && order(children[j-1], value) > 0; --j) {
+			children[j] = children[j-1];
+		}
+		children[j] = value;
+	}
+
+	for (size_t i = 0; i < children.size(); ++i) {
+		mNodes[children[i]].mNewFrag = i + 1;
+	}
+}
+
+template< typename T >
+void TPidTree<T>::normalize()
+{
+	order_children(0);
+}
+
+// image of a pid, pids must have been inserted before normalization
+template< typename T >
+TPid<T> TPidTree<T>::map(const Pid_t& pid) const
+{
+	Pid_t result;
+	int index = 0;
+	for (int i = 0; i < pid.size(); ++i) {
+		index = find_child(index, pid.at(i));
+		assert(index >= 0);
+		result.append(mNodes[index].mNewFrag);
+	}
+	return result;
+}
+
+template< typename T >
+template< typename PlaceType >
+PlaceType* TPidTree<T>::unshare(PlaceType* place)
+{
+	if (place->refs() == 1)
+		return place;
+	PlaceType* copy = new PlaceType(*place);
+	place->decrement_ref();
+	return copy;
+}
+
+// rename pids of a place, shared places are copied first
+template< typename T >
+TGenericPlaceType< TPid<T> >* TPidTree<T>::update_pid_place(PidPlace_t* place) const
+{
+	place = unshare(place);
+	for (int i = 0; i < place->size(); ++i) {
+		place->set(i, map(place->get(i)));
+	}
+	place->sort();
+	return place;
+}
+
+template< typename T >
+TGeneratorPlaceType< TPid<T>, int >* TPidTree<T>::update_generator_place(GeneratorPlace_t* place) const
+{
+	place = unshare(place);
+	for (int i = 0; i < place->size(); ++i) {
+		const TGeneratorEntry<Pid_t, int>& entry = place->get(i);
+		Pid_t next = map(entry.mPid.next(entry.mCounter));
+		place->set(i, TGeneratorEntry<Pid_t, int>(map(entry.mPid), next.at(next.size() - 1) - 1));
+	}
+	place->sort();
+	return place;
+}
 
 ///
 
@@ -543,29 +999,554 @@ struct TFormatter<int>
 	}
 };
 
-template <>
-struct TFormatter< TPid<int> >
+/////////////////////////////////////////////////////
+// int tuples
+/////////////////////////////////////////////////////
+
+// tuple of N ints stored by value, used as token type of
+// TGenericPlaceType for places holding flat tuples of ints
+template <int N>
+struct TIntTuple
 {
-	inline static size_t format(char* buffer, TPid<int>& pid) {
-		return pid.format(buffer);
+	int mValues[N];
+};
+
+template <int N>
+struct THashProvider< TIntTuple<N> >
+{
+	inline static int hash(const TIntTuple<N>& value) {
+		unsigned int hash = 0;
+		for (int i = 0; i < N; i++) {
+			hash = (hash << 5) ^ (hash >> 27) ^ int_hash(value.mValues[i]);
+		}
+		return hash;
 	}
 };
 
-template <typename TLeft, typename TRight>
-struct TFormatter< std::pair< TLeft, TRight > >
+// lexicographic order
+template <int N>
+struct TDefaultComparisonProvider< TIntTuple<N> >
 {
-	inline static size_t format(char* buffer, std::pair< TLeft, TRight>& pair) {
+	inline static int compare(const TIntTuple<N>& left, const TIntTuple<N>& right) {
+		for (int i = 0; i < N; i++) {
+			if (left.mValues[i] != right.mValues[i]) {
+				return left.mValues[i] < right.mValues[i] ? -1 : 1;
+			}
+		}
+		return 0;
+	}
+};
+
+template <int N>
+struct TFormatter< TIntTuple<N> >
+{
+	inline static size_t format(char* buffer, const TIntTuple<N>& value) {
 		char *initial_buffer = buffer;
-		buffer += sprintf(buffer, "<");
-		buffer += TFormatter< TLeft >::format(buffer, pair.get_first());
-		buffer += sprintf(buffer, ", ");
-		buffer += TFormatter< TRight >::format(buffer, pair.get_second());
-		buffer += sprintf(buffer, ">");
+		buffer += sprintf(buffer, "(");
+		for (int i = 0; i < N; i++) {
+			if (i > 0) {
+				buffer += sprintf(buffer, ", ");
+			}
+			buffer += sprintf(buffer, "%d", value.mValues[i]);
+		}
+		buffer += sprintf(buffer, ")");
 		return buffer - initial_buffer;
 	}
 };
 
 
+/////////////////////////////////////////////////////
+// marking store
+/////////////////////////////////////////////////////
+
+#define MARKING_STORE_INIT_CAPACITY 1024
+#define MARKING_STORE_ARENA_SIZE (1 << 20)
+
+// Open addressing set of serialized markings.
+//
+// Each marking is stored once, as a byte string, in large arena blocks.
+// Buckets only hold the marking hash and the location of the bytes, so
+// probing compares hashes first and touches marking bytes only on hash
+// equality. Serialized markings must be canonical: two markings are equal
+// iff their byte strings are equal.
+class TMarkingStore
+{
+	struct Bucket {
+		int 			hash;
+		unsigned int 	size;
+		const char* 	data;	// 0 iff the bucket is empty
+	};
+
+public:
+	inline 					TMarkingStore(size_t capacity = MARKING_STORE_INIT_CAPACITY);
+	inline 					~TMarkingStore();
+
+	inline bool 			insert(const char* data, size_t size, int hash);
+	inline bool 			contains(const char* data, size_t size, int hash) const;
+
+	inline size_t 			size() const;
+	inline size_t 			memory() const;
+
+private:
+							TMarkingStore(const TMarkingStore&);
+	TMarkingStore& 			operator = (const TMarkingStore&);
+
+	inline size_t 			lookup(const Bucket* buckets, size_t capacity,
+								   const char* data, size_t size, int hash) const;
+	inline const char* 		store(const char* data, size_t size);
+	inline void 			grow();
+
+	Bucket* 				mBuckets;
+	size_t 					mCapacity;	// always a power of two
+	size_t 					mSize;
+
+	std::vector<char*> 		mArenas;
+	std::vector<char*> 		mLargeBlocks;
+	size_t 					mArenaOffset;
+	size_t 					mLargeSize;
+};
+
+TMarkingStore::TMarkingStore(size_t capacity)
+		: mBuckets(0)
+		, mCapacity(MARKING_STORE_INIT_CAPACITY)
+		, mSize(0)
+		, mArenaOffset(0)
+		, mLargeSize(0)
+{
+	while (mCapacity < capacity)
+		mCapacity <<= 1;
+	mBuckets = new Bucket[mCapacity];
+	memset(mBuckets, 0, mCapacity * sizeof(Bucket));
+}
+
+TMarkingStore::~TMarkingStore()
+{
+	delete[] mBuckets;
+	for (size_t i = 0; i < mArenas.size(); ++i)
+		delete[] mArenas[i];
+	for (size_t i = 0; i < mLargeBlocks.size(); ++i)
+		delete[] mLargeBlocks[i];
+}
+
+size_t TMarkingStore::size() const
+{
+	return mSize;
+}
+
+size_t TMarkingStore::memory() const
+{
+	return mCapacity * sizeof(Bucket) + mArenas.size() * MARKING_STORE_ARENA_SIZE + mLargeSize;
+}
+
+// returns the index of the bucket holding the marking, or of the empty
+// bucket where it should be inserted.
+size_t TMarkingStore::lookup(const Bucket* buckets, size_t capacity,
+							 const char* data, size_t size, int hash) const
+{
+	size_t mask = capacity - 1;
+	size_t index = int_hash(hash) & mask;
+	for (;;) {
+		const Bucket& bucket = buckets[index];
+		if (bucket.data == 0)
+			return index;
+		if (bucket.hash == hash && bucket.size == size
+			&& memcmp(bucket.data, data, size) == 0)
+			return index;
+		index = (index + 1) & mask;
+	}
+}
+
+const char* TMarkingStore::store(const char* data, size_t size)
+{
+	char* dst;
+	if (size > MARKING_STORE_ARENA_SIZE / 4) {
+		// large markings get their own block
+		dst = new char[size];
+		mLargeBlocks.push_back(dst);
+		mLargeSize += size;
+	} else {
+		if (mArenas.empty() || mArenaOffset + size > MARKING_STORE_ARENA_SIZE) {
+			mArenas.push_back(new char[MARKING_STORE_ARENA_SIZE]);
+			mArenaOffset = 0;
+		}
+		dst = mArenas.back() + mArenaOffset;
+		mArenaOffset += size;
+	}
+	memcpy(dst, data, size);
+	return dst;
+}
+
+void TMarkingStore::grow()
+{
+	size_t capacity = mCapacity << 1;
+	Bucket* buckets = new Bucket[capacity];
+	memset(buckets, 0, capacity * sizeof(Bucket));
+
+	// hashes are kept in buckets, markings are not hashed again
+	for (size_t i = 0; i < mCapacity; ++i) {
+		const Bucket& bucket = mBuckets[i];
+		if (bucket.data == 0)
+			continue;
+		size_t mask = capacity - 1;
+		size_t index = int_hash(bucket.hash) & mask;
+		while (buckets[index].data != 0)
+			index = (index + 1) & mask;
+		buckets[index] = bucket;
+	}
+
+	delete[] mBuckets;
+	mBuckets = buckets;
+	mCapacity = capacity;
+}
+
+bool TMarkingStore::insert(const char* data, size_t size, int hash)
+{
+	// keep load factor under 3/4
+	if (4 * (mSize + 1) > 3 * mCapacity)
+		grow();
+
+	size_t index = lookup(mBuckets, mCapacity, data, size, hash);
+	Bucket& bucket = mBuckets[index];
+	if (bucket.data != 0)
+		return false;
+
+	bucket.hash = hash;
+	bucket.size = size;
+	bucket.data = store(data, size);
+	mSize++;
+	return true;
+}
+
+bool TMarkingStore::contains(const char* data, size_t size, int hash) const
+{
+	size_t index = lookup(mBuckets, mCapacity, data, size, hash);
+	return mBuckets[index].data != 0;
+}
+
+/////////////////////////////////////////////////////
+// intern table
+/////////////////////////////////////////////////////
+
+#define INTERN_TABLE_INIT_CAPACITY 256
+
+// Open addressing set of shared place containers.
+//
+// Interned places are never modified, markings share them through
+// reference counting and a modification first copies the place. The
+// table owns one reference on each place it holds. Each interned place
+// gets a sequential id, used to identify place contents.
+template <typename PlaceType>
+class TInternTable
+{
+	struct Bucket {
+		int 			hash;
+		int 			id;
+		PlaceType* 		place;	// 0 iff the bucket is empty
+	};
+
+public:
+	inline 					TInternTable();
+	inline 					~TInternTable();
+
+	inline PlaceType* 		intern(PlaceType* place);
+	inline int 				id(PlaceType* place);
+	inline void 			clear();
+	inline size_t 			size() const;
+
+private:
+							TInternTable(const TInternTable&);
+	TInternTable& 			operator = (const TInternTable&);
+
+	inline Bucket& 			lookup(PlaceType* place);
+	inline void 			grow();
+
+	Bucket* 				mBuckets;
+	size_t 					mCapacity;	// always a power of two
+	size_t 					mSize;
+};
+
+template <typename PlaceType>
+TInternTable<PlaceType>::TInternTable()
+		: mBuckets(new Bucket[INTERN_TABLE_INIT_CAPACITY])
+		, mCapacity(INTERN_TABLE_INIT_CAPACITY)
+		, mSize(0)
+{
+	memset(mBuckets, 0, mCapacity * sizeof(Bucket));
+}
+
+template <typename PlaceType>
+TInternTable<PlaceType>::~TInternTable()
+{
+	clear();
+	delete[] mBuckets;
+}
+
+template <typename PlaceType>
+size_t TInternTable<PlaceType>::size() const
+{
+	return mSize;
+}
+
+template <typename PlaceType>
+void TInternTable<PlaceType>::clear()
+{
+	for (size_t i = 0; i < mCapacity; ++i) {
+		if (mBuckets[i].place != 0)
+			mBuckets[i].place->decrement_ref();
+	}
+	memset(mBuckets, 0, mCapacity * sizeof(Bucket));
+	mSize = 0;
+}
+
+template <typename PlaceType>
+void TInternTable<PlaceType>::grow()
+{
+	size_t capacity = mCapacity << 1;
+	size_t mask = capacity - 1;
+	Bucket* buckets = new Bucket[capacity];
+	memset(buckets, 0, capacity * sizeof(Bucket));
+
+	for (size_t i = 0; i < mCapacity; ++i) {
+		const Bucket& bucket = mBuckets[i];
+		if (bucket.place == 0)
+			continue;
+		size_t index = int_hash(bucket.hash) & mask;
+		while (buckets[index].place != 0)
+			index = (index + 1) & mask;
+		buckets[index] = bucket;
+	}
+
+	delete[] mBuckets;
+	mBuckets = buckets;
+	mCapacity = capacity;
+}
+
+// returns the bucket holding a place equal to place, the place is
+// inserted if needed.
+template <typename PlaceType>
+typename TInternTable<PlaceType>::Bucket& TInternTable<PlaceType>::lookup(PlaceType* place)
+{
+	// keep load factor under 3/4
+	if (4 * (mSize + 1) > 3 * mCapacity)
+		grow();
+
+	int hash = place->hash();
+	size_t mask = mCapacity - 1;
+	size_t index = int_hash(hash) & mask;
+	for (;;) {
+		Bucket& bucket = mBuckets[index];
+		if (bucket.place == 0)
+			break;
+		if (bucket.hash == hash && bucket.place->compare(*place) == 0)
+			return bucket;
+		index = (index + 1) & mask;
+	}
+
+	Bucket& bucket = mBuckets[index];
+	place->compact();
+	place->increment_ref();
+	bucket.hash = hash;
+	bucket.id = mSize++;
+	bucket.place = place;
+	return bucket;
+}
+
+// returns the shared place equal to place, the reference held by the
+// caller on place is transfered to the returned place.
+template <typename PlaceType>
+PlaceType* TInternTable<PlaceType>::intern(PlaceType* place)
+{
+	PlaceType* shared = lookup(place).place;
+	if (shared != place) {
+		shared->increment_ref();
+		place->decrement_ref();
+	}
+	return shared;
+}
+
+template <typename PlaceType>
+int TInternTable<PlaceType>::id(PlaceType* place)
+{
+	return lookup(place).id;
+}
+
+/////////////////////////////////////////////////////
+// tree store
+/////////////////////////////////////////////////////
+
+#define TREE_STORE_INIT_CAPACITY 1024
+
+// Set of markings stored as binary trees of shared nodes.
+//
+// A marking is given as a vector of leaves, ie., ids of place contents.
+// Leaves are folded pairwise into nodes, each distinct pair getting an
+// id, until a single root remains. Markings differing by a few places
+// share most of their nodes, a new marking usually adds a logarithmic
+// number of nodes. Two markings are equal iff their roots are equal.
+//
+// Leaf ids and node ids overlap, and an odd leaf is carried up a level
+// unchanged, thus pairs are keyed by their slot, ie., their position in
+// the tree, which is the same for all markings.
+class TTreeStore
+{
+	struct Bucket {
+		int 			slot;
+		int 			left;
+		int 			right;
+		int 			id;		// 0 iff the bucket is empty
+	};
+
+public:
+	inline 					TTreeStore(int leaf_count);
+	inline 					~TTreeStore();
+
+	inline int* 			leaves();
+	inline bool 			insert();
+
+	inline size_t 			size() const;
+	inline size_t 			nodes() const;
+	inline size_t 			memory() const;
+
+private:
+							TTreeStore(const TTreeStore&);
+	TTreeStore& 			operator = (const TTreeStore&);
+
+	inline int 				node(int slot, int left, int right, bool& created);
+	inline void 			grow();
+
+	Bucket* 				mBuckets;
+	size_t 					mCapacity;	// always a power of two
+	size_t 					mNodes;
+	size_t 					mSize;
+
+	int 					mLeafCount;
+	int* 					mLeaves;
+	int* 					mLevel;
+};
+
+TTreeStore::TTreeStore(int leaf_count)
+		: mBuckets(new Bucket[TREE_STORE_INIT_CAPACITY])
+		, mCapacity(TREE_STORE_INIT_CAPACITY)
+		, mNodes(0)
+		, mSize(0)
+		, mLeafCount(leaf_count)
+		, mLeaves(new int[leaf_count > 0 ? leaf_count : 1])
+		, mLevel(new int[leaf_count > 0 ? leaf_count : 1])
+{
+	memset(mBuckets, 0, mCapacity * sizeof(Bucket));
+	memset(mLeaves, 0, (leaf_count > 0 ? leaf_count : 1) * sizeof(int));
+}
+
+TTreeStore::~TTreeStore()
+{
+	delete[] mBuckets;
+	delete[] mLeaves;
+	delete[] mLevel;
+}
+
+// leaves of the next marking, filled by the caller before insert
+int* TTreeStore::leaves()
+{
+	return mLeaves;
+}
+
+size_t TTreeStore::size() const
+{
+	return mSize;
+}
+
+size_t TTreeStore::nodes() const
+{
+	return mNodes;
+}
+
+size_t TTreeStore::memory() const
+{
+	return mCapacity * sizeof(Bucket);
+}
+
+inline unsigned int pair_hash(int slot, int left, int right)
+{
+	return (int_hash(slot) * 31 + int_hash(left)) * 31 + int_hash(right);
+}
+
+void TTreeStore::grow()
+{
+	size_t capacity = mCapacity << 1;
+	size_t mask = capacity - 1;
+	Bucket* buckets = new Bucket[capacity];
+	memset(buckets, 0, capacity * sizeof(Bucket));
+
+	for (size_t i = 0; i < mCapacity; ++i) {
+		const Bucket& bucket = mBuckets[i];
+		if (bucket.id == 0)
+			continue;
+		size_t index = pair_hash(bucket.slot, bucket.left, bucket.right) & mask;
+		while (buckets[index].id != 0)
+			index = (index + 1) & mask;
+		buckets[index] = bucket;
+	}
+
+	delete[] mBuckets;
+	mBuckets = buckets;
+	mCapacity = capacity;
+}
+
+int TTreeStore::node(int slot, int left, int right, bool& created)
+{
+	// keep load factor under 3/4
+	if (4 * (mNodes + 1) > 3 * mCapacity)
+		grow();
+
+	size_t mask = mCapacity - 1;
+	size_t index = pair_hash(slot, left, right) & mask;
+	for (;;) {
+		Bucket& bucket = mBuckets[index];
+		if (bucket.id == 0)
+			break;
+		if (bucket.slot == slot && bucket.left == left && bucket.right == right) {
+			created = false;
+			return bucket.id;
+		}
+		index = (index + 1) & mask;
+	}
+
+	Bucket& bucket = mBuckets[index];
+	bucket.slot = slot;
+	bucket.left = left;
+	bucket.right = right;
+	bucket.id = ++mNodes;
+	created = true;
+	return bucket.id;
+}
+
+// stores the marking described by leaves, returns true iff it is new
+bool TTreeStore::insert()
+{
+	bool created = false;
+	int count = mLeafCount;
+	int slot = 0;
+
+	if (count <= 1) {
+		node(slot, mLeaves[0], 0, created);
+	} else {
+		memcpy(mLevel, mLeaves, count * sizeof(int));
+		while (count > 1) {
+			int next = 0;
+			for (int i = 0; i + 1 < count; i += 2)
+				mLevel[next++] = node(slot++, mLevel[i], mLevel[i + 1], created);
+			if (count % 2 == 1)
+				mLevel[next++] = mLevel[count - 1];
+			count = next;
+		}
+	}
+
+	// the root node is created iff the marking is new
+	if (created)
+		mSize++;
+	return created;
+}
+
 ///
 
 typedef std::vector<void*> 		neco_list_t;
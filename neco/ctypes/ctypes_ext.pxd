@@ -19,19 +19,33 @@ cdef extern from "ctypes.h":
                 void remove_by_index(int)
 
                 T& get(int)
+                T* data()
                 int size()
                 void update(TGenericPlaceType[T]&)
                 char* cstr()
 
+        # int tuple tokens, see INT_TUPLE_SIZES in neco.backends.cython.priv.common
+        ctypedef struct TIntTuple2 "TIntTuple<2>":
+                int mValues[2]
+        ctypedef struct TIntTuple3 "TIntTuple<3>":
+                int mValues[3]
+        ctypedef struct TIntTuple4 "TIntTuple<4>":
+                int mValues[4]
+
         cdef cppclass TPid[T]:
                 TPid()
                 TPid(int i)
                 TPid(TPid[T]& pid)
-                TPid(TPid[T]& pid, int next)
+                TPid(TPid[T]& pid, int next) except +
                 bint operator == (TPid[T]& right)
                 int compare(TPid[T]& right)
+                int hash()
+                int size()
+                T at(int i)
+                void append(T frag) except +
+                TPid[T] next(int counter) except +
 
-        cdef cppclass Pair[T1, T2]:
+        cdef cppclass TGeneratorEntry[T1, T2]:
                 T1 get_first()
                 T2 get_second()
 
@@ -42,20 +56,58 @@ cdef extern from "ctypes.h":
                 void increment_ref()
                 void decrement_ref()
 
-                void update_pid_counter(PidType&, CounterType&)
+                void update_pid_counter(PidType&, CounterType)
                 void remove_pid(PidType&)
                 char* cstr()
-                Pair[PidType, CounterType] get(int)
+                TGeneratorEntry[PidType, CounterType] get(int)
 
                 int size()
                 int hash()
                 int compare(TGeneratorPlaceType[PidType, CounterType]&)
 
+        cdef cppclass TPidTree[T]:
+                TPidTree()
+                void clear()
+                void insert(TPid[T]& pid)
+                void add_pid(TPid[T]& pid)
+                void add_next_pid(TPid[T]& pid)
+                void add_data(TPid[T]& owner, int value)
+                void add_pid_place(TGenericPlaceType[TPid[T]]* place, int value)
+                void add_generator_place(TGeneratorPlaceType[TPid[T], int]* place) except +
+                void normalize()
+                TPid[T] map(TPid[T]& pid)
+                TGenericPlaceType[TPid[T]]* update_pid_place(TGenericPlaceType[TPid[T]]* place)
+                TGeneratorPlaceType[TPid[T], int]* update_generator_place(TGeneratorPlaceType[TPid[T], int]* place) except +
+                size_t size()
+
         cdef cppclass neco_list_t:
                 neco_list_t()
                 void push_back(void*)
                 int size()
 
+        cdef cppclass TMarkingStore:
+                TMarkingStore()
+                TMarkingStore(size_t capacity)
+                bint insert(char* data, size_t size, int hash)
+                bint contains(char* data, size_t size, int hash)
+                size_t size()
+                size_t memory()
+
+        cdef cppclass TInternTable[T]:
+                TInternTable()
+                T* intern(T* place)
+                int id(T* place)
+                void clear()
+                size_t size()
+
+        cdef cppclass TTreeStore:
+                TTreeStore(int leaf_count)
+                int* leaves()
+                bint insert()
+                size_t size()
+                size_t nodes()
+                size_t memory()
+
     # ctypedef struct neco_list_node_t:
     #     pass
 
@@ -70,12 +122,19 @@ cdef extern from "ctypes.h":
 
 
 cdef class MultiSet:
-        cdef dict _data
+        cdef list _hashes
+        cdef list _keys
+        cdef list _counts
+        cdef long _hash
+        cdef bint _hashed
 
+        cdef Py_ssize_t _find(MultiSet self, object elt, long h)
         cdef MultiSet copy(MultiSet self)
+        cdef void add_count(MultiSet self, object elt, int count)
         cdef void add(MultiSet self, object elt)
         cdef add_items(self, items)
         cdef void remove(MultiSet self, elt)
+        cdef list items(MultiSet self)
         cdef int size(MultiSet self)
         cdef int hash(MultiSet self)
         cdef int compare(MultiSet self, MultiSet other)
@@ -87,6 +146,67 @@ cdef class MultiSet:
 cdef api class Pid[object Pid, type Pid]:
         cdef TPid[int]* mPid
 
+################################################################################
+# pids, pid places and pid trees
+################################################################################
+
+ctypedef TGenericPlaceType[TPid[int]] TPidPlaceType
+ctypedef TGeneratorPlaceType[TPid[int], int] TPidGeneratorPlaceType
+
+cdef Pid pid_from_native(TPid[int] pid)
+cdef TPidTree[int]* neco_pid_tree()
+
+cdef inline TPid[int] pid_to_native(Pid pid):
+        return pid.mPid[0]
+
+cdef MultiSet pid_place_type_to_multiset(TPidPlaceType* place_type)
+cdef generator_place_type_add(TPidGeneratorPlaceType* place_type, tuple token)
+cdef tuple generator_place_type_get(TPidGeneratorPlaceType* place_type, int index)
+cdef MultiSet generator_place_type_to_multiset(TPidGeneratorPlaceType* place_type)
+cdef pack_pid(bytearray buf, TPid[int] pid)
+cdef pack_pid_place_type(bytearray buf, TPidPlaceType* place_type)
+cdef pack_generator_place_type(bytearray buf, TPidGeneratorPlaceType* place_type)
+cdef multiset_update_pid_tree(MultiSet ms, TPidTree[int]* tree, int value)
+cdef MultiSet multiset_update_pids(MultiSet ms, TPidTree[int]* tree)
+
+cdef class Unpacker:
+        cdef bytes data
+        cdef char* ptr
+        cdef Py_ssize_t offset
+
+        cdef check(Unpacker self, int size)
+        cdef int read_byte(Unpacker self) except -1
+        cdef int read_int(Unpacker self) except? -1
+        cdef object read_object(Unpacker self)
+        cdef MultiSet read_multiset(Unpacker self)
+        cdef read_int_place_type(Unpacker self, TGenericPlaceType[int]* place_type)
+        cdef read_int_array(Unpacker self, int* values, int count)
+        cdef read_pid(Unpacker self, TPid[int]* pid)
+        cdef read_pid_place_type(Unpacker self, TPidPlaceType* place_type)
+        cdef read_generator_place_type(Unpacker self, TPidGeneratorPlaceType* place_type)
+
+cdef class MarkingStore:
+        cdef TMarkingStore* mStore
+
+        cpdef bint add(MarkingStore self, bytes data, long h)
+        cpdef bint contains(MarkingStore self, bytes data, long h)
+        cpdef size_t memory(MarkingStore self)
+
+cdef class InternTable:
+        cdef dict mTable
+
+        cdef tuple entry(InternTable self, object obj)
+        cdef object intern(InternTable self, object obj)
+        cdef int id(InternTable self, object obj) except -1
+
+cdef class TreeStore:
+        cdef TTreeStore* mStore
+
+        cdef int* leaves(TreeStore self)
+        cdef bint insert(TreeStore self)
+        cpdef size_t nodes(TreeStore self)
+        cpdef size_t memory(TreeStore self)
+
 # cdef class Pid:
 #       cdef list data
 
@@ -123,3 +243,65 @@ cdef api class Pid[object Pid, type Pid]:
 
 cdef MultiSet int_place_type_to_multiset(TGenericPlaceType[int]* place_type)
 
+cdef pack_byte(bytearray buf, unsigned char value)
+cdef pack_int(bytearray buf, int value)
+cdef pack_object(bytearray buf, object obj)
+cdef pack_multiset(bytearray buf, MultiSet ms)
+cdef pack_int_place_type(bytearray buf, TGenericPlaceType[int]* place_type)
+
+################################################################################
+# int tuple places, tokens are handled as int arrays
+################################################################################
+
+cdef int int_tuple_from_object(int* values, int size, object t) except -1
+cdef tuple int_tuple_to_object(const int* values, int size)
+cdef MultiSet int_tuple_place_type_to_multiset(int* values, int count, int size)
+cdef pack_int_tuple_place_type(bytearray buf, int* values, int count, int size)
+
+################################################################################
+# bool and string places
+################################################################################
+
+cdef MultiSet bool_place_type_to_multiset(int false_count, int true_count)
+cdef int string_code(tuple strings, object token) except -1
+cdef string_place_type_cstr(TGenericPlaceType[int]* place_type, tuple strings)
+cdef MultiSet string_place_type_to_multiset(TGenericPlaceType[int]* place_type, tuple strings)
+
+cdef inline TIntTuple2 int_tuple2_from_object(object t) except *:
+        cdef TIntTuple2 value
+        int_tuple_from_object(value.mValues, 2, t)
+        return value
+
+cdef inline read_int_tuple2_place_type(Unpacker unpacker, TGenericPlaceType[TIntTuple2]* place_type):
+        cdef TIntTuple2 value
+        cdef int count = unpacker.read_int()
+
+        for 0 <= i < count:
+                unpacker.read_int_array(value.mValues, 2)
+                place_type.add(value)
+
+cdef inline TIntTuple3 int_tuple3_from_object(object t) except *:
+        cdef TIntTuple3 value
+        int_tuple_from_object(value.mValues, 3, t)
+        return value
+
+cdef inline read_int_tuple3_place_type(Unpacker unpacker, TGenericPlaceType[TIntTuple3]* place_type):
+        cdef TIntTuple3 value
+        cdef int count = unpacker.read_int()
+
+        for 0 <= i < count:
+                unpacker.read_int_array(value.mValues, 3)
+                place_type.add(value)
+
+cdef inline TIntTuple4 int_tuple4_from_object(object t) except *:
+        cdef TIntTuple4 value
+        int_tuple_from_object(value.mValues, 4, t)
+        return value
+
+cdef inline read_int_tuple4_place_type(Unpacker unpacker, TGenericPlaceType[TIntTuple4]* place_type):
+        cdef TIntTuple4 value
+        cdef int count = unpacker.read_int()
+
+        for 0 <= i < count:
+                unpacker.read_int_array(value.mValues, 4)
+                place_type.add(value)
@@ -1,6 +1,8 @@
 cimport ctypes_ext # this line will be replaced in profiler mode !
+from libc.string cimport memcpy
 
-import operator, sys, traceback
+import cPickle, operator, sys, traceback
+from neco.utils import canonical_dumps
 
 ################################################################################
 # Multisets
@@ -19,20 +21,78 @@ cpdef __neco_compare__(object left, object right):
         return 1
     return 0
 
+cdef inline Py_ssize_t _hash_lower_bound(list hashes, long h):
+    """ Index of the first hash greater or equal to C{h} in sorted C{hashes}. """
+    cdef Py_ssize_t lo = 0
+    cdef Py_ssize_t hi = len(hashes)
+    cdef Py_ssize_t mid
+    cdef long value
+
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        value = hashes[mid]
+        if value < h:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+cdef inline Py_ssize_t _hash_run_end(list hashes, Py_ssize_t i, Py_ssize_t n, long h):
+    """ Index following the run of hashes equal to C{h} starting at C{i}. """
+    cdef long value
+
+    while i < n:
+        value = hashes[i]
+        if value != h:
+            break
+        i += 1
+    return i
+
 cdef class MultiSet:
-    # cdef dict _data
+    """ Multiset of python objects.
+
+    Elements and their multiplicities are kept in parallel lists sorted by
+    element hash, elements with equal hashes are kept in insertion order.
+    Lookups are binary searches on hashes while comparisons and updates
+    merge both multisets, elements do not need to be ordered. The hash is
+    computed once and kept until the multiset is modified.
+    """
+    # cdef list _hashes
+    # cdef list _keys
+    # cdef list _counts
+    # cdef long _hash
+    # cdef bint _hashed
 
     def __call__(MultiSet self, object value) :
-        return self._data.get(value, 0)
+        cdef Py_ssize_t i = self._find(value, hash(value))
+        return self._counts[i] if i >= 0 else 0
 
     def __cinit__(MultiSet self, dict initial_data = {}):
         """ builds a brand new MultiSet from some initial data
 
-        @param initial_data: list of elements (eventually with repetitions
+        @param initial_data: elements mapped to their multiplicities
         @type initial_data: C{dict}
         """
-        self._data = {}
-        self._data.update(initial_data)
+        self._hashes = []
+        self._keys = []
+        self._counts = []
+        self._hashed = False
+        for elt, count in initial_data.iteritems():
+            self.add_count(elt, count)
+
+    cdef Py_ssize_t _find(MultiSet self, object elt, long h):
+        """ Index of C{elt}, or C{-i - 1} if C{elt} is missing and should
+        be inserted at C{i}.
+        """
+        cdef Py_ssize_t i = _hash_lower_bound(self._hashes, h)
+        cdef Py_ssize_t end = _hash_run_end(self._hashes, i, len(self._hashes), h)
+
+        while i < end:
+            key = self._keys[i]
+            if key is elt or key == elt:
+                return i
+            i += 1
+        return -i - 1
 
     cdef MultiSet copy(MultiSet self):
         """ copy the MultiSet
@@ -40,28 +100,40 @@ cdef class MultiSet:
         @return: a copy of the MultiSet
         @rtype: C{MultiSet}
         """
-        cdef MultiSet result = MultiSet(self._data)
+        cdef MultiSet result = MultiSet()
+        result._hashes = self._hashes[:]
+        result._keys = self._keys[:]
+        result._counts = self._counts[:]
+        result._hash = self._hash
+        result._hashed = self._hashed
         return result
 
     def __add__(MultiSet self, MultiSet other):
         cdef MultiSet new = self.copy()
-        for (e, m) in other._data.iteritems():
-            try:
-                new._data[e] += m
-            except IndexError:
-                new._data[e] = m
+        new.update(other)
         return new
 
+    cdef void add_count(MultiSet self, object elt, int count):
+        """ adds C{count} occurrences of an element to the MultiSet """
+        cdef long h = hash(elt)
+        cdef Py_ssize_t i = self._find(elt, h)
+
+        if i >= 0:
+            self._counts[i] += count
+        else:
+            i = -i - 1
+            self._hashes.insert(i, h)
+            self._keys.insert(i, elt)
+            self._counts.insert(i, count)
+        self._hashed = False
+
     cdef void add(MultiSet self, object elt):
         """ adds an element to the MultiSet
 
         @param elt: element to be added
         @type elt: C{object}
         """
-        try :
-            self._data[elt] += 1
-        except KeyError :
-            self._data[elt] = 1
+        self.add_count(elt, 1)
 
     cdef add_items(self, items):
         """ adds a list of items to the MultiSet
@@ -78,19 +150,28 @@ cdef class MultiSet:
         @param elt: element to be removed
         @type elt: C{object}
         """
-        if self._data.get(elt, 0) <= 0:
+        cdef Py_ssize_t i = self._find(elt, hash(elt))
+
+        if i < 0:
             raise ValueError, "not enough occurrences"
-        self._data[elt] -= 1
-        if self._data[elt] == 0:
-            del self._data[elt]
+        if self._counts[i] == 1:
+            del self._hashes[i]
+            del self._keys[i]
+            del self._counts[i]
+        else:
+            self._counts[i] -= 1
+        self._hashed = False
+
+    cdef list items(MultiSet self):
+        """ elements paired with their multiplicities """
+        return zip(self._keys, self._counts)
 
     def __iter__(MultiSet self):
         """ iterator over the values (with repetitions)
         """
-        for e, m in self._data.iteritems():
+        for e, m in zip(self._keys, self._counts):
             for i in range(0, m):
                 yield e
-        #return self._data.__iter__()
 
     def __str__(MultiSet self):
         """ return a human readable string representation
@@ -112,87 +193,104 @@ cdef class MultiSet:
         """ number of elements, including repetitions
         @rtype: C{int}
         """
-        return len(self._data)
+        return len(self._keys)
 
     cdef int size(MultiSet self):
         """ number of elements, excluding repetitions
 
         @rtype: C{int}
         """
-        return sum(self._data.values())
+        return sum(self._counts)
 
     cdef int hash(MultiSet self):
-        cdef long x = 0x345678L
-        cdef long y
-        cdef int l = len(self._data)
-        #cdef long mult = 1000003L
-
-        for i in self._data:
-            l -= 1
-            y = hash(i)
-            if (y == -1):
-                return -1
-            x = (x ^ y)
-        x += 97531L
-        return x
+        cdef long x
+        cdef long h
+
+        if not self._hashed:
+            x = 0x345678L
+            for h in self._hashes:
+                x = (x ^ h)
+            self._hash = x + 97531L
+            self._hashed = True
+        return self._hash
 
     def __hash__ (MultiSet self) :
         """
         """
-        cdef int x = 0x345678L
-        cdef int y
-        cdef int l = len(self._data)
-        #cdef int mult = 1000003L
-
-        for i in self._data:
-            l -= 1
-            y = hash(i)
-            if (y == -1):
-                return -1
-            x = (x ^ y) # ^ mult
-            #mult += 82520L + l + l
-        x += 97531L
-        return x
+        return self.hash()
 
     cdef int compare(MultiSet self, MultiSet other):
-        cdef list self_keys = self._data.keys()
-        cdef list other_keys = other._data.keys()
-        cdef int l1 = len(self_keys)
-        cdef int l2 = len(other_keys)
-
-        cdef int p1 = 0
-        cdef int n1 = 0
-        cdef int p2 = 0
-        cdef int n2 = 0
-
-        self_keys.sort()
-        other_keys.sort()
-
-        for 0 <= i < l1:
-            if self(self_keys[i]) < other(self_keys[i]):
-                n1 = 1
-                if n1 + p1 == 2:
-                    return -2
-            elif self(self_keys[i]) > other(self_keys[i]):
-                p1 = 1
-                if n1 + p1 == 2:
-                    return -2
-
-        for 0 <= i < l2:
-            if self(other_keys[i]) < other(other_keys[i]):
-                n2 = 1
-                if n2 + p2 == 2:
-                    return -2
-            elif self(other_keys[i]) > other(other_keys[i]):
-                p2 = 1
-                if n2 + p2 == 2:
-                    return -2
-
-        if p1 == 1:
+        """ Compare multisets with respect to inclusion.
+
+        @return: 0 if multisets are equal, -1 if C{self} is included in
+        C{other}, 1 if C{other} is included in C{self}, -2 otherwise.
+        """
+        cdef Py_ssize_t n1 = len(self._keys)
+        cdef Py_ssize_t n2 = len(other._keys)
+        cdef Py_ssize_t i = 0
+        cdef Py_ssize_t j = 0
+        cdef Py_ssize_t i_end, j_end, k, l
+        cdef long h1, h2
+        cdef int c1, c2
+        cdef bint less = False
+        cdef bint greater = False
+        cdef list matched
+
+        if self is other:
+            return 0
+
+        # hashes do not depend on multiplicities, different hashes mean
+        # different domains
+        if n1 == n2 and self._hashed and other._hashed and self._hash != other._hash:
+            return -2
+
+        while i < n1 and j < n2:
+            h1 = self._hashes[i]
+            h2 = other._hashes[j]
+            if h1 < h2:
+                greater = True
+                i += 1
+            elif h1 > h2:
+                less = True
+                j += 1
+            else:
+                # elements with equal hashes are matched by equality
+                i_end = _hash_run_end(self._hashes, i, n1, h1)
+                j_end = _hash_run_end(other._hashes, j, n2, h2)
+                matched = [ False ] * (j_end - j)
+                for k in range(i, i_end):
+                    key = self._keys[k]
+                    for l in range(j, j_end):
+                        if not matched[l - j] and (other._keys[l] is key or other._keys[l] == key):
+                            matched[l - j] = True
+                            c1 = self._counts[k]
+                            c2 = other._counts[l]
+                            if c1 < c2:
+                                less = True
+                            elif c1 > c2:
+                                greater = True
+                            break
+                    else:
+                        greater = True
+                if not all(matched):
+                    less = True
+                i = i_end
+                j = j_end
+
+            if less and greater:
+                return -2
+
+        if i < n1:
+            greater = True
+        if j < n2:
+            less = True
+
+        if less and greater:
+            return -2
+        elif greater:
             return 1
-        elif n1 == 1:
+        elif less:
             return -1
-
         return 0
 
     def __richcmp__(MultiSet self, MultiSet other, int op):
@@ -204,29 +302,94 @@ cdef class MultiSet:
         elif op == 2:
             return res == 0
         elif op == 3:
-            return res != 0 and res != -2
+            return res != 0
         elif op == 4:
             return res > 0
         elif op == 5:
             return res >= 0
 
     cdef void update(MultiSet self, MultiSet other):
-        self._data.update(self, other._data)
+        """ adds the elements of C{other}, both multisets are merged """
+        cdef Py_ssize_t n1 = len(self._keys)
+        cdef Py_ssize_t n2 = len(other._keys)
+        cdef Py_ssize_t i = 0
+        cdef Py_ssize_t j = 0
+        cdef Py_ssize_t i_end, j_end, k, l, start
+        cdef long h1, h2
+        cdef list hashes, keys, counts
+
+        if n2 == 0:
+            return
+        elif n1 == 0:
+            self._hashes = other._hashes[:]
+            self._keys = other._keys[:]
+            self._counts = other._counts[:]
+            self._hash = other._hash
+            self._hashed = other._hashed
+            return
+
+        hashes = []
+        keys = []
+        counts = []
+        while i < n1 and j < n2:
+            h1 = self._hashes[i]
+            h2 = other._hashes[j]
+            if h1 < h2:
+                hashes.append(h1)
+                keys.append(self._keys[i])
+                counts.append(self._counts[i])
+                i += 1
+            elif h1 > h2:
+                hashes.append(h2)
+                keys.append(other._keys[j])
+                counts.append(other._counts[j])
+                j += 1
+            else:
+                i_end = _hash_run_end(self._hashes, i, n1, h1)
+                j_end = _hash_run_end(other._hashes, j, n2, h2)
+                start = len(keys)
+                hashes.extend(self._hashes[i:i_end])
+                keys.extend(self._keys[i:i_end])
+                counts.extend(self._counts[i:i_end])
+                for l in range(j, j_end):
+                    key = other._keys[l]
+                    for k in range(start, start + i_end - i):
+                        if keys[k] is key or keys[k] == key:
+                            counts[k] += other._counts[l]
+                            break
+                    else:
+                        hashes.append(h2)
+                        keys.append(key)
+                        counts.append(other._counts[l])
+                i = i_end
+                j = j_end
+
+        hashes.extend(self._hashes[i:])
+        keys.extend(self._keys[i:])
+        counts.extend(self._counts[i:])
+        hashes.extend(other._hashes[j:])
+        keys.extend(other._keys[j:])
+        counts.extend(other._counts[j:])
+
+        self._hashes = hashes
+        self._keys = keys
+        self._counts = counts
+        self._hashed = False
 
     cdef list domain(MultiSet self):
-        return self._data.keys()
+        return self._keys[:]
 
 
     cpdef __dump__(MultiSet self):
         cdef list elts = []
 
-        for elt, count in self._data.iteritems():
+        for elt, count in zip(self._keys, self._counts):
             elts.extend( [dump(elt)] * count )
 
         return '[' + ', '.join(elts) + ']'
 
     cdef has_key(MultiSet self, object key):
-        return self._data.has_key(key)
+        return self._find(key, hash(key)) >= 0
 
 
 
@@ -240,6 +403,322 @@ cdef MultiSet int_place_type_to_multiset(TGenericPlaceType[int]* place_type):
     return ms
 
 
+################################################################################
+# Binary serialization
+################################################################################
+
+cdef pack_byte(bytearray buf, unsigned char value):
+    buf.append(value)
+
+cdef pack_int(bytearray buf, int value):
+    buf.extend((<char*> &value)[:sizeof(int)])
+
+cdef bytes _dumps(object obj):
+    return canonical_dumps(obj)
+
+cdef pack_object(bytearray buf, object obj):
+    """ Append a length prefixed pickle of C{obj} to C{buf}. """
+    cdef bytes data = _dumps(obj)
+    pack_int(buf, len(data))
+    buf.extend(data)
+
+cdef pack_multiset(bytearray buf, MultiSet ms):
+    """ Append a multiset to C{buf}.
+
+    Tokens are sorted with respect to their serialized form, this gives a
+    canonical form even if tokens are not totally ordered.
+    """
+    cdef list items = sorted([ (_dumps(token), count) for token, count in ms.items() ])
+    cdef bytes data
+
+    pack_int(buf, len(items))
+    for data, count in items:
+        pack_int(buf, len(data))
+        buf.extend(data)
+        pack_int(buf, count)
+
+cdef pack_int_place_type(bytearray buf, TGenericPlaceType[int]* place_type):
+    cdef int size = place_type.size()
+
+    pack_int(buf, size)
+    for 0 <= i < size:
+        pack_int(buf, place_type.get(i))
+
+cdef int int_tuple_from_object(int* values, int size, object t) except -1:
+    if len(t) != size:
+        raise ValueError("expected a tuple of {} ints, got {!r}".format(size, t))
+    for 0 <= i < size:
+        values[i] = t[i]
+    return 0
+
+cdef tuple int_tuple_to_object(const int* values, int size):
+    return tuple([ values[i] for i in range(size) ])
+
+cdef MultiSet int_tuple_place_type_to_multiset(int* values, int count, int size):
+    cdef MultiSet ms = MultiSet()
+    cdef int i
+
+    for 0 <= i < count:
+        ms.add(int_tuple_to_object(values + i * size, size))
+    return ms
+
+cdef pack_int_tuple_place_type(bytearray buf, int* values, int count, int size):
+    """ Append C{count} tuples of C{size} ints stored in C{values}. """
+    pack_int(buf, count)
+    for 0 <= i < count * size:
+        pack_int(buf, values[i])
+
+################################################################################
+# bool and string places
+################################################################################
+
+cdef MultiSet bool_place_type_to_multiset(int false_count, int true_count):
+    cdef MultiSet ms = MultiSet()
+
+    if false_count > 0:
+        ms.add_count(False, false_count)
+    if true_count > 0:
+        ms.add_count(True, true_count)
+    return ms
+
+cdef int string_code(tuple strings, object token) except -1:
+    """ Get the code of an interned string, ie., its index in C{strings}. """
+    return strings.index(token)
+
+cdef string_place_type_cstr(TGenericPlaceType[int]* place_type, tuple strings):
+    cdef int i
+
+    return '[' + ', '.join([ repr(strings[<int> place_type.get(i)]) for i in range(place_type.size()) ]) + ']'
+
+cdef MultiSet string_place_type_to_multiset(TGenericPlaceType[int]* place_type, tuple strings):
+    cdef MultiSet ms = MultiSet()
+    cdef int i
+
+    for 0 <= i < place_type.size():
+        ms.add(strings[<int> place_type.get(i)])
+    return ms
+
+cdef class Unpacker:
+    """ Sequential reader of data produced by the C{pack_*} functions.
+
+    Integers are stored in native byte order, serialized markings are
+    meant to be read back on the same host.
+    """
+
+    def __cinit__(Unpacker self, object data):
+        self.data = bytes(data)
+        self.ptr = self.data
+        self.offset = 0
+
+    cdef check(Unpacker self, int size):
+        if self.offset + size > len(self.data):
+            raise ValueError("truncated marking data")
+
+    cdef int read_byte(Unpacker self) except -1:
+        self.check(1)
+        self.offset += 1
+        return <unsigned char> self.ptr[self.offset - 1]
+
+    cdef int read_int(Unpacker self) except? -1:
+        cdef int value
+        self.check(sizeof(int))
+        memcpy(&value, self.ptr + self.offset, sizeof(int))
+        self.offset += sizeof(int)
+        return value
+
+    cdef object read_object(Unpacker self):
+        cdef int size = self.read_int()
+        self.check(size)
+        obj = cPickle.loads(self.data[self.offset:self.offset + size])
+        self.offset += size
+        return obj
+
+    cdef MultiSet read_multiset(Unpacker self):
+        cdef MultiSet ms = MultiSet()
+        cdef int size = self.read_int()
+
+        for 0 <= i < size:
+            token = self.read_object()
+            ms.add_count(token, self.read_int())
+        return ms
+
+    cdef read_int_place_type(Unpacker self, TGenericPlaceType[int]* place_type):
+        cdef int size = self.read_int()
+        cdef int value
+
+        for 0 <= i < size:
+            value = self.read_int()
+            place_type.add(value)
+
+    cdef read_int_array(Unpacker self, int* values, int count):
+        for 0 <= i < count:
+            values[i] = self.read_int()
+
+    cdef read_pid(Unpacker self, TPid[int]* pid):
+        cdef int size = self.read_int()
+
+        for 0 <= i < size:
+            pid.append(self.read_int())
+
+    cdef read_pid_place_type(Unpacker self, TPidPlaceType* place_type):
+        cdef TPid[int] pid
+        cdef int size = self.read_int()
+
+        for 0 <= i < size:
+            pid = TPid[int]()
+            self.read_pid(&pid)
+            place_type.add(pid)
+
+    cdef read_generator_place_type(Unpacker self, TPidGeneratorPlaceType* place_type):
+        cdef TPid[int] pid
+        cdef int size = self.read_int()
+
+        for 0 <= i < size:
+            pid = TPid[int]()
+            self.read_pid(&pid)
+            place_type.update_pid_counter(pid, self.read_int())
+
+
+################################################################################
+# Marking store
+################################################################################
+
+cdef class MarkingStore:
+    """ Set of serialized markings backed by a C++ open addressing table.
+
+    Markings are given as canonical byte strings together with their hash,
+    each one is stored once in compact memory blocks.
+    """
+
+    def __cinit__(MarkingStore self, size_t capacity = 1024):
+        self.mStore = new TMarkingStore(capacity)
+
+    def __dealloc__(MarkingStore self):
+        del self.mStore
+
+    cpdef bint add(MarkingStore self, bytes data, long h):
+        """ Add a serialized marking to the store.
+
+        @param data: serialized marking.
+        @type data: C{bytes}
+        @param h: hash of the marking.
+        @type h: C{int}
+        @return: C{True} if the marking was not already in the store.
+        @rtype: C{bool}
+        """
+        return self.mStore.insert(data, len(data), <int> h)
+
+    cpdef bint contains(MarkingStore self, bytes data, long h):
+        """ Test if a serialized marking is in the store.
+
+        @param data: serialized marking.
+        @type data: C{bytes}
+        @param h: hash of the marking.
+        @type h: C{int}
+        @rtype: C{bool}
+        """
+        return self.mStore.contains(data, len(data), <int> h)
+
+    cpdef size_t memory(MarkingStore self):
+        """ Memory used by the store, in bytes.
+
+        @rtype: C{int}
+        """
+        return self.mStore.memory()
+
+    def __len__(MarkingStore self):
+        return self.mStore.size()
+
+
+################################################################################
+# Intern table
+################################################################################
+
+cdef class InternTable:
+    """ Table of shared python place containers, e.g., C{MultiSet}s.
+
+    Interned containers must not be modified, markings copy a place
+    before modifying it. Each interned container gets a sequential id.
+    """
+
+    def __cinit__(InternTable self):
+        self.mTable = {}
+
+    cdef tuple entry(InternTable self, object obj):
+        cdef tuple entry = self.mTable.get(obj)
+        if entry is None:
+            entry = (obj, len(self.mTable))
+            self.mTable[obj] = entry
+        return entry
+
+    cdef object intern(InternTable self, object obj):
+        """ Get the shared container equal to C{obj}.
+
+        @param obj: container to intern.
+        @return: C{obj} if no equal container was interned before.
+        """
+        return self.entry(obj)[0]
+
+    cdef int id(InternTable self, object obj) except -1:
+        """ Get the id of a container, interning it if needed.
+
+        @param obj: container.
+        @rtype: C{int}
+        """
+        return self.entry(obj)[1]
+
+    def clear(InternTable self):
+        self.mTable.clear()
+
+    def __len__(InternTable self):
+        return len(self.mTable)
+
+
+################################################################################
+# Tree store
+################################################################################
+
+cdef class TreeStore:
+    """ Set of markings stored as trees of shared nodes.
+
+    Markings are given as vectors of leaves, ie., ids of place contents,
+    written in the buffer returned by L{leaves} before calling L{insert}.
+    """
+
+    def __cinit__(TreeStore self, int leaf_count):
+        self.mStore = new TTreeStore(leaf_count)
+
+    def __dealloc__(TreeStore self):
+        del self.mStore
+
+    cdef int* leaves(TreeStore self):
+        return self.mStore.leaves()
+
+    cdef bint insert(TreeStore self):
+        """ Add the marking described by the leaves buffer.
+
+        @return: C{True} if the marking was not already in the store.
+        @rtype: C{bool}
+        """
+        return self.mStore.insert()
+
+    cpdef size_t nodes(TreeStore self):
+        """ Number of tree nodes.
+
+        @rtype: C{int}
+        """
+        return self.mStore.nodes()
+
+    cpdef size_t memory(TreeStore self):
+        """ Memory used by the store, in bytes.
+
+        @rtype: C{int}
+        """
+        return self.mStore.memory()
+
+    def __len__(TreeStore self):
+        return self.mStore.size()
+
 
 ################################################################################
 #
@@ -718,6 +1197,231 @@ cdef MultiSet int_place_type_to_multiset(TGenericPlaceType[int]* place_type):
 #
 #    return 0
 
+################################################################################
+# Pids
+################################################################################
+
 cdef class Pid:
-    def __cinit__(self):
+    """ Process identifier stored as a native C{TPid}.
+
+    This class provides the interface of L{neco.extsnakes.Pid} and replaces
+    it in compiled modules when pids are normalized, thus pids can be copied
+    into native pid places without conversion.
+    """
+
+    def __cinit__(Pid self, l = None):
         self.mPid = new TPid[int]()
+        if l:
+            for frag in l:
+                self.mPid.append(frag)
+
+    def __dealloc__(Pid self):
+        del self.mPid
+
+    @classmethod
+    def from_str(cls, str_repr = None):
+        return Pid([ int(s) for s in str_repr.split('.') ] if str_repr else None)
+
+    @classmethod
+    def from_list(cls, frag_list = None):
+        return Pid(frag_list)
+
+    property data:
+        def __get__(Pid self):
+            return tuple([ self.mPid.at(i) for i in range(self.mPid.size()) ])
+
+    def copy(Pid self):
+        return pid_from_native(self.mPid[0])
+
+    def __iter__(Pid self):
+        return iter(self.data)
+
+    def __len__(Pid self):
+        return self.mPid.size()
+
+    def __getitem__(Pid self, index):
+        return self.data[index]
+
+    def __add__(Pid self, Pid frag):
+        cdef Pid pid = self.copy()
+        for 0 <= i < frag.mPid.size():
+            pid.mPid.append(frag.mPid.at(i))
+        return pid
+
+    def at(Pid self, int i):
+        return self.data[i]
+
+    def subpid(Pid self, int begin = 0, end = None):
+        return Pid(self.data[begin:end] if end else self.data[begin:])
+
+    def prefix(Pid self):
+        return Pid(self.data[:-1])
+
+    def suffix(Pid self):
+        return Pid(self.data[1:])
+
+    def ends_with(Pid self):
+        return self.mPid.at(self.mPid.size() - 1)
+
+    def next(Pid self, pid_component):
+        return pid_from_native(self.mPid.next(int(pid_component)))
+
+    def parent(Pid self, Pid other):
+        """ C{True} if C{self} is an ancestor of C{other}. """
+        return (other.mPid.size() > self.mPid.size()
+                and self.is_prefix_of(other))
+
+    def parent1(Pid self, Pid other):
+        """ C{True} if C{self} is the parent of C{other}. """
+        return (other.mPid.size() == self.mPid.size() + 1
+                and self.is_prefix_of(other))
+
+    def sibling(Pid self, Pid other):
+        """ C{True} if C{other} is a younger sibling of C{self}. """
+        cdef int last = self.mPid.size() - 1
+        return (other.mPid.size() == self.mPid.size()
+                and self.prefix().is_prefix_of(other)
+                and self.mPid.at(last) < other.mPid.at(last))
+
+    def sibling1(Pid self, Pid other):
+        """ C{True} if C{other} is the next sibling of C{self}. """
+        cdef int last = self.mPid.size() - 1
+        return (other.mPid.size() == self.mPid.size()
+                and self.prefix().is_prefix_of(other)
+                and self.mPid.at(last) + 1 == other.mPid.at(last))
+
+    def is_prefix_of(Pid self, Pid other):
+        for 0 <= i < self.mPid.size():
+            if self.mPid.at(i) != other.mPid.at(i):
+                return False
+        return True
+
+    def __hash__(Pid self):
+        return self.mPid.hash()
+
+    def __richcmp__(self, other, int op):
+        # either side may be another object, including None
+        if not isinstance(self, Pid) or not isinstance(other, Pid):
+            return NotImplemented
+        cdef int res = (<Pid> self).mPid.compare((<Pid> other).mPid[0])
+        if op == 0:
+            return res < 0
+        elif op == 1:
+            return res <= 0
+        elif op == 2:
+            return res == 0
+        elif op == 3:
+            return res != 0
+        elif op == 4:
+            return res > 0
+        elif op == 5:
+            return res >= 0
+
+    def __reduce__(Pid self):
+        return (Pid, (self.data,))
+
+    def __repr__(Pid self):
+        return 'Pid([' + ','.join([ repr(e) for e in self.data ]) + '])'
+
+    def __str__(Pid self):
+        return '.'.join([ repr(e) for e in self.data ])
+
+    def __dump__(Pid self):
+        return str(self)
+
+cdef Pid pid_from_native(TPid[int] pid):
+    cdef Pid result = Pid()
+    result.mPid[0] = pid
+    return result
+
+################################################################################
+# pid places and pid trees
+################################################################################
+
+cdef MultiSet pid_place_type_to_multiset(TPidPlaceType* place_type):
+    cdef MultiSet ms = MultiSet()
+
+    for 0 <= i < place_type.size():
+        ms.add(pid_from_native(place_type.get(i)))
+    return ms
+
+cdef generator_place_type_add(TPidGeneratorPlaceType* place_type, tuple token):
+    place_type.update_pid_counter(pid_to_native(token[0]), token[1])
+
+cdef tuple generator_place_type_get(TPidGeneratorPlaceType* place_type, int index):
+    cdef TGeneratorEntry[TPid[int], int] entry = place_type.get(index)
+    return (pid_from_native(entry.get_first()), entry.get_second())
+
+cdef MultiSet generator_place_type_to_multiset(TPidGeneratorPlaceType* place_type):
+    cdef MultiSet ms = MultiSet()
+
+    for 0 <= i < place_type.size():
+        ms.add(generator_place_type_get(place_type, i))
+    return ms
+
+cdef pack_pid(bytearray buf, TPid[int] pid):
+    """ Append the depth of C{pid} then its fragments. """
+    pack_int(buf, pid.size())
+    for 0 <= i < pid.size():
+        pack_int(buf, pid.at(i))
+
+cdef pack_pid_place_type(bytearray buf, TPidPlaceType* place_type):
+    # pids are kept sorted, thus the layout is canonical
+    pack_int(buf, place_type.size())
+    for 0 <= i < place_type.size():
+        pack_pid(buf, place_type.get(i))
+
+cdef pack_generator_place_type(bytearray buf, TPidGeneratorPlaceType* place_type):
+    cdef TGeneratorEntry[TPid[int], int] entry
+
+    pack_int(buf, place_type.size())
+    for 0 <= i < place_type.size():
+        entry = place_type.get(i)
+        pack_pid(buf, entry.get_first())
+        pack_int(buf, entry.get_second())
+
+# the tree is shared by all normalizations, it keeps its nodes between uses
+cdef TPidTree[int]* _pid_tree = new TPidTree[int]()
+
+cdef TPidTree[int]* neco_pid_tree():
+    return _pid_tree
+
+cdef multiset_update_pid_tree(MultiSet ms, TPidTree[int]* tree, int value):
+    """ Add the pids of the tuples of a multiset to a pid tree.
+
+    A pid heading a tuple owns the token, it gets the hash of the token
+    with all its pids removed, mixed with C{value}. Other pids are only
+    referenced.
+    """
+    cdef long h
+    cdef int count
+
+    for token, count in ms.items():
+        if isinstance(token, Pid):
+            for 0 <= i < count:
+                tree.add_data(pid_to_native(token), value)
+        elif isinstance(token, tuple):
+            h = hash(tuple([ None if isinstance(e, Pid) else e for e in token ])) ^ value
+            for index, e in enumerate(token):
+                if not isinstance(e, Pid):
+                    continue
+                if index == 0:
+                    for 0 <= j < count:
+                        tree.add_data(pid_to_native(e), h)
+                else:
+                    tree.add_pid(pid_to_native(e))
+
+cdef object _update_pids(object token, TPidTree[int]* tree):
+    if isinstance(token, Pid):
+        return pid_from_native(tree.map(pid_to_native(token)))
+    elif isinstance(token, tuple):
+        return tuple([ _update_pids(e, tree) for e in token ])
+    return token
+
+cdef MultiSet multiset_update_pids(MultiSet ms, TPidTree[int]* tree):
+    """ Get a copy of a multiset with pids renamed by a normalized pid tree. """
+    cdef MultiSet result = MultiSet()
+
+    for token, count in ms.items():
+        result.add_count(_update_pids(token, tree), count)
+    return result
@@ -41,11 +41,13 @@ cpdef state_space():
         visit = set([init()])
         succ = set()
         count = 0
+        ctx.state_space = visited
+        ctx.remaining = visit
         start = time()
         while True:
             count += 1
             m = visit.pop()
-            visited.add(m)
+            visited.add(neco_marking_intern(m))
             succ = succs(m, ctx)
             visit.update(succ.difference(visited))
             if (count % 250 == 0):
@@ -62,6 +64,53 @@ cpdef state_space():
         return visited
     return visited
 
+cpdef state_space_compact():
+    """ State space exploration with serialized visited markings.
+
+    Visited markings are stored in binary form in a marking store, only
+    the markings still to be visited are kept as objects.
+
+    @return: store of visited markings.
+    @rtype: C{ctypes_ext.MarkingStore}
+    """
+    cdef ctypes_ext.MarkingStore visited = ctypes_ext.MarkingStore()
+    cdef set visit
+    cdef bytearray buf
+    cdef NecoCtx ctx = NecoCtx()
+    cdef int count = 0
+    start = time()
+    last_time = start
+
+    cdef Marking m = init()
+    cdef Marking s_mrk
+
+    buf = bytearray()
+    neco_marking_pack(m, buf)
+    visited.add(bytes(buf), hash(m))
+    visit = set([m])
+    ctx.remaining = visit
+
+    while visit:
+        count += 1
+        m = visit.pop()
+        for s_mrk in succs(m, ctx):
+            buf = bytearray()
+            neco_marking_pack(s_mrk, buf)
+            if visited.add(bytes(buf), hash(s_mrk)):
+                visit.add(s_mrk)
+        if (count % 250 == 0):
+            new_time = time()
+            elapsed_time = new_time - start
+            sys.stdout.write("\r{}st {:5.3f}s (global {:5.0f}st/s, since last log {:5.0f}st/s, {} bytes)".format(count,
+                                                                                                                  elapsed_time,
+                                                                                                                  count / elapsed_time,
+                                                                                                                  250 / (new_time-last_time),
+                                                                                                                  visited.memory()))
+            sys.stdout.flush()
+            last_time = new_time
+    print
+    return visited
+
 cpdef state_space_graph():
     """ State space exploration function with on the fly marking dump. """
     cdef NecoCtx ctx = NecoCtx() 
@@ -83,11 +132,14 @@ cpdef state_space_graph():
     mrk_id_map[m] = next
     next += 1
 
+    ctx.state_space = visited
+    ctx.remaining = visit
+
     try:
         while True:
             count += 1
             m = visit.pop()
-            visited.add(m)
+            visited.add(neco_marking_intern(m))
 
             # new marking, get the id
             current_node_id = mrk_id_map[m]
@@ -37,13 +37,45 @@ cpdef state_space():
 
         while True:
             m = visit.pop()
-            visited.add(m)
+            visited.add(neco_marking_intern(m))
             succ = succs(m, ctx)
             visit.update(succ.difference(visited))
     except KeyError:
         return visited
     return visited
 
+cpdef state_space_compact():
+    """ State space exploration with serialized visited markings.
+
+    Visited markings are stored in binary form in a marking store, only
+    the markings still to be visited are kept as objects.
+
+    @return: store of visited markings.
+    @rtype: C{ctypes_ext.MarkingStore}
+    """
+    cdef ctypes_ext.MarkingStore visited = ctypes_ext.MarkingStore()
+    cdef set visit
+    cdef bytearray buf
+    cdef NecoCtx ctx = NecoCtx()
+
+    cdef Marking m = init()
+    cdef Marking s_mrk
+
+    buf = bytearray()
+    neco_marking_pack(m, buf)
+    visited.add(bytes(buf), hash(m))
+    visit = set([m])
+    ctx.remaining = visit
+
+    while visit:
+        m = visit.pop()
+        for s_mrk in succs(m, ctx):
+            buf = bytearray()
+            neco_marking_pack(s_mrk, buf)
+            if visited.add(bytes(buf), hash(s_mrk)):
+                visit.add(s_mrk)
+    return visited
+
 cpdef state_space_graph():
     cdef set visit
     cdef set visited = set()
@@ -69,7 +101,7 @@ cpdef state_space_graph():
     try:
         while True:
             m = visit.pop()
-            visited.add(m)
+            visited.add(neco_marking_intern(m))
 
             # new marking, get the id
             current_node_id = mrk_id_map[m]
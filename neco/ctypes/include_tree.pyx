@@ -0,0 +1,44 @@
+cpdef state_space_tree():
+    """ State space exploration with visited markings stored as trees.
+
+    Visited markings are reduced to the ids of their place contents,
+    these vectors are stored in a tree store sharing common subtrees.
+    Only the markings still to be visited are kept as objects.
+
+    @return: store of visited markings.
+    @rtype: C{ctypes_ext.TreeStore}
+    """
+    cdef ctypes_ext.TreeStore visited = ctypes_ext.TreeStore(neco_leaf_count)
+    cdef set visit
+    cdef NecoCtx ctx = NecoCtx()
+    cdef int count = 0
+    start = time()
+    last_time = start
+
+    cdef Marking m = init()
+    cdef Marking s_mrk
+
+    neco_marking_leaves(m, visited)
+    visited.insert()
+    visit = set([m])
+    ctx.remaining = visit
+
+    while visit:
+        count += 1
+        m = visit.pop()
+        for s_mrk in succs(m, ctx):
+            neco_marking_leaves(s_mrk, visited)
+            if visited.insert():
+                visit.add(s_mrk)
+        if (count % 250 == 0):
+            new_time = time()
+            elapsed_time = new_time - start
+            sys.stdout.write("\r{}st {:5.3f}s (global {:5.0f}st/s, since last log {:5.0f}st/s, {} nodes)".format(count,
+                                                                                                                  elapsed_time,
+                                                                                                                  count / elapsed_time,
+                                                                                                                  250 / (new_time-last_time),
+                                                                                                                  visited.nodes()))
+            sys.stdout.flush()
+            last_time = new_time
+    print
+    return visited
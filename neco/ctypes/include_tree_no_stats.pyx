@@ -0,0 +1,29 @@
+cpdef state_space_tree():
+    """ State space exploration with visited markings stored as trees.
+
+    Visited markings are reduced to the ids of their place contents,
+    these vectors are stored in a tree store sharing common subtrees.
+    Only the markings still to be visited are kept as objects.
+
+    @return: store of visited markings.
+    @rtype: C{ctypes_ext.TreeStore}
+    """
+    cdef ctypes_ext.TreeStore visited = ctypes_ext.TreeStore(neco_leaf_count)
+    cdef set visit
+    cdef NecoCtx ctx = NecoCtx()
+
+    cdef Marking m = init()
+    cdef Marking s_mrk
+
+    neco_marking_leaves(m, visited)
+    visited.insert()
+    visit = set([m])
+    ctx.remaining = visit
+
+    while visit:
+        m = visit.pop()
+        for s_mrk in succs(m, ctx):
+            neco_marking_leaves(s_mrk, visited)
+            if visited.insert():
+                visit.add(s_mrk)
+    return visited
@@ -6,7 +6,7 @@ The loading of the module will raise a runtime error
 if loaded with wrong python version.
 """
 
-from neco import g_logo
+from neco import g_logo, bitstate, external, graphio, parallel
 from neco.utils import fatal_error
 from time import time
 import argparse
@@ -65,11 +65,35 @@ class Main(object):
 
         parser.add_argument('--graph', '-g', default=None, dest='graph', nargs=2, metavar=('MAPFILE',
                                                                                           'GRAPHFILE'),
-                            help='produce reachability graph (supports bz2 and gz compression)')
+                            help='produce reachability graph, GRAPHFILE is a binary edge list readable with neco-graph (supports bz2 and gz compression)')
 
         parser.add_argument('--profile', '-p', default=False, dest='profile', action='store_true',
                             help='enable profiling support')
 
+        parser.add_argument('--workers', '-w', default=1, dest='workers', type=int, metavar='N',
+                            help='number of worker processes used for exploration')
+
+        parser.add_argument('--batch-size', default=parallel.DEFAULT_BATCH_SIZE, dest='batch_size', type=int,
+                            metavar='SIZE', help='number of markings exchanged at once between workers')
+
+        parser.add_argument('--compact', '-c', default=False, dest='compact', action='store_true',
+                            help='store visited markings serialized in a compact marking store [cython only]')
+
+        parser.add_argument('--tree', '-t', default=False, dest='tree', action='store_true',
+                            help='store visited markings as trees of shared place contents [cython only]')
+
+        parser.add_argument('--external', '-e', default=None, dest='external', metavar='DIR', type=str,
+                            help='keep frontier and visited markings in files created in DIR')
+
+        parser.add_argument('--external-batch', default=external.DEFAULT_BATCH_SIZE, dest='external_batch', type=int,
+                            metavar='SIZE', help='number of successors kept in memory before writing them as a sorted run on disk')
+
+        parser.add_argument('--bitstate', '-b', default=None, dest='bitstate', metavar='SIZE', type=str,
+                            help='probabilistic exploration storing visited markings as bits of a SIZE bytes table, eg., 512M or 2G')
+
+        parser.add_argument('--bitstate-hashes', default=bitstate.DEFAULT_HASHES, dest='bitstate_hashes', type=int,
+                            metavar='K', help='number of bits set per marking with --bitstate')
+
         parser.add_argument('--print-mcc', default=False, dest='print_mcc', action='store_true',
                             help='prints only states count as output (ignored if any other option is given).')
 
@@ -81,6 +105,14 @@ class Main(object):
 
         # setup config
         self.print_mcc = args.print_mcc
+        self.workers = args.workers
+        self.batch_size = args.batch_size
+        self.compact = args.compact
+        self.tree = args.tree
+        self.external = args.external
+        self.external_batch = args.external_batch
+        self.bitstate = args.bitstate
+        self.bitstate_hashes = args.bitstate_hashes
         self.profile=profile,
 
         if not args.print_mcc:
@@ -99,6 +131,30 @@ class Main(object):
             if graph:
                 fatal_error("dump markings option cannot be used with graph option.")
 
+        if self.workers < 1:
+            fatal_error("the number of workers must be positive.")
+        if self.workers > 1 and (dump_markings or graph):
+            fatal_error("parallel exploration cannot be used with dump markings or graph options.")
+        if self.compact and (self.workers > 1 or dump_markings or graph):
+            fatal_error("compact exploration cannot be used with workers, dump markings or graph options.")
+        if self.tree and (self.compact or self.workers > 1 or dump_markings or graph):
+            fatal_error("tree exploration cannot be used with compact, workers, dump markings or graph options.")
+        if self.external and (self.compact or self.tree or self.workers > 1 or dump_markings or graph):
+            fatal_error("external exploration cannot be used with compact, tree, workers, dump markings or graph options.")
+        if self.external and not os.path.isdir(self.external):
+            fatal_error("{} is not a directory.".format(self.external))
+        if self.external_batch < 1:
+            fatal_error("the external batch size must be positive.")
+        if self.bitstate:
+            if self.external or self.compact or self.tree or self.workers > 1 or dump_markings or graph:
+                fatal_error("bit-state exploration cannot be used with external, compact, tree, workers, dump markings or graph options.")
+            try:
+                self.bitstate_size = bitstate.parse_size(self.bitstate)
+            except ValueError, e:
+                fatal_error(str(e))
+            if self.bitstate_hashes < 1:
+                fatal_error("the number of bit-state hashes must be positive.")
+
         # load module
         try:
             fp, pathname, description = imp.find_module("net")
@@ -106,6 +162,12 @@ class Main(object):
         except ImportError:
             fatal_error("No net module in PYTHONPATH", -1)
 
+        # the cycle proviso reads the visited set of the exploration
+        por = getattr(self.compiled_net, '_neco_por', None)
+        if por is not None and por.proviso:
+            if self.external or self.compact or self.tree or self.bitstate or self.workers > 1:
+                fatal_error("LTL preserving partial order reduction cannot be used with external, compact, tree, bit-state or workers options.")
+
         # explore
         if profile:
             # produce exploration trace
@@ -115,14 +177,29 @@ class Main(object):
 
             elif self.dump_markings:
                 # produce exploration trace with marking dump
-                cProfile.run('neco.explorecli.Main._instance_.dump_markings()', 'explore_dump.prof')
+                cProfile.run('neco.explorecli.Main._instance_.explore_dump()', 'explore_dump.prof')
 
             elif self.graph:
                 # produce exploration trace with reachability graph
-                cProfile.run('neco.explorecli.Main._instance_.dump_graph()', 'explore_graph.prof')
+                cProfile.run('neco.explorecli.Main._instance_.explore_graph()', 'explore_graph.prof')
 
         else: # without profiler
-            if not dump_markings and not graph:
+            if self.workers > 1:
+                self.explore_parallel()
+
+            elif self.compact:
+                self.explore_compact()
+
+            elif self.tree:
+                self.explore_tree()
+
+            elif self.external:
+                self.explore_external()
+
+            elif self.bitstate:
+                self.explore_bitstate()
+
+            elif not dump_markings and not graph:
                 self.explore()
 
             elif dump_markings:
@@ -144,6 +221,101 @@ class Main(object):
             print "exploration time: ", end - start
             print "len visited = %d" % (len(ss))
 
+    def explore_parallel(self):
+        """ Explore state space using several worker processes. """
+
+        net = self.compiled_net
+        start = time()
+        try:
+            stats = parallel.state_space(net, self.workers, self.batch_size)
+        except TypeError, e:
+            fatal_error(str(e))
+        end = time()
+
+        count = sum(visited for _, visited, _ in stats)
+        if self.print_mcc:
+            print count
+        else:
+            for index, visited, sent in stats:
+                print "worker {}: {} markings, {} sent".format(index, visited, sent)
+            print "exploration time: ", end - start
+            print "len visited = %d" % (count)
+
+    def explore_compact(self):
+        """ Explore state space storing visited markings in compact form. """
+
+        net = self.compiled_net
+        if not hasattr(net, 'state_space_compact'):
+            fatal_error("compact exploration is only available with the cython backend.")
+
+        start = time()
+        try:
+            store = net.state_space_compact()
+        except NotImplementedError, e:
+            fatal_error("markings of this net cannot be serialized ({})".format(e))
+        end = time()
+        if self.print_mcc:
+            print len(store)
+        else:
+            print "exploration time: ", end - start
+            print "len visited = %d (%d bytes)" % (len(store), store.memory())
+
+    def explore_tree(self):
+        """ Explore state space storing visited markings as trees of place contents. """
+
+        net = self.compiled_net
+        if not hasattr(net, 'state_space_tree'):
+            fatal_error("tree exploration is only available with the cython backend, for nets whose place contents can all be identified.")
+
+        start = time()
+        try:
+            store = net.state_space_tree()
+        except NotImplementedError, e:
+            fatal_error("markings of this net cannot be serialized ({})".format(e))
+        end = time()
+        if self.print_mcc:
+            print len(store)
+        else:
+            print "exploration time: ", end - start
+            print "len visited = %d (%d nodes, %d bytes)" % (len(store), store.nodes(), store.memory())
+
+    def explore_external(self):
+        """ Explore state space keeping markings on disk. """
+
+        net = self.compiled_net
+        start = time()
+        try:
+            count, levels, merges = external.state_space(net, self.external, self.external_batch)
+        except NotImplementedError, e:
+            fatal_error("markings of this net cannot be serialized ({})".format(e))
+        end = time()
+        if self.print_mcc:
+            print count
+        else:
+            print "{} levels, {} merges".format(levels, merges)
+            print "exploration time: ", end - start
+            print "len visited = %d" % (count)
+
+    def explore_bitstate(self):
+        """ Explore state space with bit-state hashing. """
+
+        net = self.compiled_net
+        start = time()
+        table, edges = bitstate.state_space(net, self.bitstate_size, self.bitstate_hashes)
+        end = time()
+        if self.print_mcc:
+            print table.stored
+        else:
+            print "{} bits, {} hashes, {} bits set ({:.4%} full)".format(table.bits, table.hashes,
+                                                                        table.set_bits, table.fill_ratio())
+            print "base hash: {} bits".format(table.hash_bits)
+            print "hash factor: {:.1f}".format(float(table.bits) / max(table.stored, 1))
+            print "collision probability: {:.3g}".format(table.collision_probability())
+            print "estimated coverage: {:.4%} (~{:.0f} markings missed)".format(table.coverage(), table.missed)
+            print "exploration time: ", end - start
+            print "len visited = %d" % (table.stored)
+            print "transitions = %d" % (edges)
+
     def explore_dump(self):
         """ Explore state space. """
 
@@ -164,30 +336,25 @@ class Main(object):
         return (end - start, ss)
 
     def explore_graph(self):
-        """ Build reachability graph. """
+        """ Build reachability graph, nodes are written as soon as they are expanded. """
         # select output stream
         map_file = try_open_file(self.map_file)
         graph_file = try_open_file(self.graph_file)
+        writer = graphio.GraphWriter(map_file, graph_file)
 
         net = self.compiled_net
 
         start = time()
-        graph, map = net.state_space_graph()
+        try:
+            count = graphio.explore(net, writer)
+        finally:
+            writer.close()
         end = time()
         print "exploration time: ", end - start
-        print "len visited = %d" % (len(map.keys()))
-
-        #map_file.write('{\n')
-        for key, value in map.iteritems():
-            map_file.write("{} : {}\n".format(repr(value), key.__dump__()))
-        #map_file.write('}\n')
-
-        #graph_file.write('{\n')
-        for key, value in graph.iteritems():
-            graph_file.write("{} : {}\n".format(repr(key), repr(value)))
-        #graph_file.write('}\n')
+        print "len visited = %d" % (count)
+        print "edges = %d" % (writer.edges)
 
-        return (end - start, graph.keys())
+        return (end - start, count)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,188 @@
+""" External memory state space exploration.
+
+Delayed duplicate detection in the style of Stern and Dill: successors are
+collected in memory as serialized markings, when the batch is full it is
+sorted and written to a run file. Once a level is explored its runs are
+merged with the visited markings stored in a sorted file on disk, in a
+single pass. Markings that were not visited yet form the next frontier
+file and the merge produces the new visited file, thus the visited file is
+rewritten once per level whatever the number of batches.
+
+Only one batch and the unpacked marking being explored are kept in memory,
+the frontier, the runs and the visited markings live on disk.
+"""
+
+import heapq
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+
+DEFAULT_BATCH_SIZE = 100000
+
+_size_struct = struct.Struct('<I')
+
+def write_record(output, data):
+    """ Write a length prefixed record.
+
+    @param output: file opened for writing.
+    @param data: record to write.
+    @type data: C{str}
+    """
+    output.write(_size_struct.pack(len(data)))
+    output.write(data)
+
+def read_records(path):
+    """ Iterate over the records of a file.
+
+    The file is memory mapped, thus only visited pages are loaded.
+
+    @param path: file to read.
+    @type path: C{str}
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        try:
+            offset = 0
+            while offset < size:
+                length, = _size_struct.unpack_from(data, offset)
+                offset += _size_struct.size
+                yield data[offset:offset + length]
+                offset += length
+        finally:
+            data.close()
+
+class Explorer(object):
+    """ State space explorer keeping visited markings on disk. """
+
+    def __init__(self, net, directory, batch_size = DEFAULT_BATCH_SIZE):
+        """ Initialize the explorer.
+
+        @param net: compiled net module.
+        @param directory: directory where temporary files are created.
+        @type directory: C{str}
+        @param batch_size: number of successors kept in memory before a
+        run is written.
+        @type batch_size: C{int}
+        """
+        self.net = net
+        self.batch_size = batch_size
+        self.workdir = tempfile.mkdtemp(prefix = 'neco-', dir = directory)
+
+        self.visited_path = os.path.join(self.workdir, 'visited')
+        self.frontier_path = os.path.join(self.workdir, 'frontier')
+        self.next_path = os.path.join(self.workdir, 'next')
+
+        self.runs = []
+        self.visited = 0
+        self.levels = 0
+        self.merges = 0
+
+    def pack(self, marking):
+        buf = bytearray()
+        self.net.neco_marking_pack(marking, buf)
+        return str(buf)
+
+    def write_run(self, batch):
+        """ Write a batch of serialized markings as a sorted run file.
+
+        @param batch: serialized successors.
+        @type batch: C{set}
+        """
+        path = os.path.join(self.workdir, 'run.{}'.format(len(self.runs)))
+        with open(path, 'wb') as output:
+            for data in sorted(batch):
+                write_record(output, data)
+        batch.clear()
+        self.runs.append(path)
+
+    def merge(self, next_frontier):
+        """ Merge the runs of a level into the visited file.
+
+        New markings are written to C{next_frontier}, run files are removed.
+
+        @param next_frontier: next frontier file opened for writing.
+        """
+        self.merges += 1
+
+        # visited records come first among equal ones
+        sources = [ ((data, 0) for data in read_records(self.visited_path)) ]
+        sources.extend(((data, 1) for data in read_records(path)) for path in self.runs)
+
+        merged_path = self.visited_path + '.merge'
+        with open(merged_path, 'wb') as output:
+            last = None
+            for data, source in heapq.merge(*sources):
+                if data == last:
+                    continue
+                last = data
+                write_record(output, data)
+                if source:
+                    write_record(next_frontier, data)
+                    self.visited += 1
+
+        os.rename(merged_path, self.visited_path)
+        for path in self.runs:
+            os.remove(path)
+        self.runs = []
+
+    def run(self):
+        """ Explore the state space level by level.
+
+        @return: number of reachable markings.
+        @rtype: C{int}
+        """
+        net = self.net
+        succs = net.succs
+        unpack = net.neco_marking_unpack
+        ctx = net.NecoCtx()
+
+        init = self.pack(net.init())
+        for path in (self.visited_path, self.frontier_path):
+            with open(path, 'wb') as output:
+                write_record(output, init)
+        self.visited = 1
+
+        batch = set()
+        while os.path.getsize(self.frontier_path) > 0:
+            self.levels += 1
+            for data in read_records(self.frontier_path):
+                for succ in succs(unpack(data), ctx):
+                    batch.add(self.pack(succ))
+                    if len(batch) >= self.batch_size:
+                        self.write_run(batch)
+            if batch:
+                self.write_run(batch)
+            with open(self.next_path, 'wb') as next_frontier:
+                self.merge(next_frontier)
+            os.rename(self.next_path, self.frontier_path)
+
+        return self.visited
+
+    def cleanup(self):
+        """ Remove temporary files. """
+        shutil.rmtree(self.workdir, ignore_errors = True)
+
+def state_space(net, directory = None, batch_size = DEFAULT_BATCH_SIZE):
+    """ Explore the state space of a compiled net using external memory.
+
+    @param net: compiled net module.
+    @param directory: directory where temporary files are created, the
+    system default is used if C{None}.
+    @type directory: C{str}
+    @param batch_size: number of successors kept in memory before a run
+    is written.
+    @type batch_size: C{int}
+    @return: a (reachable markings, levels, merges) triple.
+    @rtype: C{tuple}
+    """
+    explorer = Explorer(net, directory, batch_size)
+    try:
+        count = explorer.run()
+    finally:
+        explorer.cleanup()
+    return count, explorer.levels, explorer.merges
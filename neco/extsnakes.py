@@ -17,16 +17,47 @@ snakes.plugins.load("gv", "snakes.nets", "nets")
 PetriNet = nets.PetriNet
 
 class Pid(object):
+    """ Process identifier.
+
+    Pids are immutable, fragments are stored in a tuple and the hash is
+    computed once. Pids are ordered as tuples of fragments, which is the
+    order of C{TPid::compare} in C{ctypes.h}.
+    """
+
+    __slots__ = ('_data', '_hash')
 
     def __init__(self, l=None):
         """
 
         >>> pid = Pid()
         >>> pid.data
-        []
+        ()
+
+        """
+        object.__setattr__(self, '_data', tuple(l) if l else ())
+        object.__setattr__(self, '_hash', hash(self._data))
 
+    def __setattr__(self, name, value):
         """
-        self.data = l if l else [] 
+        >>> pid = Pid.from_str('1.2')
+        >>> pid.data = (1, 3)
+        Traceback (most recent call last):
+        ...
+        AttributeError: pids are immutable
+        """
+        raise AttributeError("pids are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("pids are immutable")
+
+    @property
+    def data(self):
+        """ Fragments of the pid.
+
+        >>> Pid.from_str('1.2').data
+        (1, 2)
+        """
+        return self._data
 
     @classmethod
     def from_str(self, str_repr=None):
@@ -34,9 +65,7 @@ class Pid(object):
         >>> str(Pid.from_str('1.2.3'))
         '1.2.3'
         """
-        pid = Pid()
-        pid.data = [ int(s) for s in str_repr.split('.') ] if str_repr else []
-        return pid
+        return Pid([ int(s) for s in str_repr.split('.') ] if str_repr else None)
 
     @classmethod
     def from_list(self, frag_list=None):
@@ -44,58 +73,33 @@ class Pid(object):
         >>> str(Pid.from_list([1,2,3]))
         '1.2.3'
         """
-        pid = Pid()
-        pid.data = list(frag_list) if frag_list else []
-        return pid
+        return Pid(frag_list)
 
     def copy(self):
         """
         >>> p1 = Pid.from_str('1.1')
         >>> p2 = p1.copy()
-        >>> p1.data[1] = 2
-        >>> str(p1), str(p2)
-        ('1.2', '1.1')
+        >>> p1 == p2
+        True
         """
-        p = Pid()
-        p.data = [ x for x in self.data ]
-        return p
+        # pids are immutable
+        return self
 
     def __iter__(self):
-        return iter(self.data)
-#
-#    def __bool__(self):
-#        return self.data # False iff empty
-#
-#    def __int__(self):
-#        assert(len(self.data) == 1)
-#        return self.data[0]
+        return iter(self._data)
 
     def __add__(self, frag):
-        pid = self.copy()
-        for e in frag.data:
-            pid.data.append(int(e))
-        return pid
+        """
+        >>> Pid.from_str('1.2') + Pid.from_str('3')
+        Pid([1,2,3])
+        """
+        return Pid(self._data + tuple(int(e) for e in frag.data))
 
     def __len__(self):
-        return len(self.data)
-#
-#    def __lt__(self, other):
-#        sl = len(self.data)
-#        ol = len(other.data)
-#        if sl < ol:
-#            return True
-#        elif ol > sl:
-#            return False
-#        else:
-#            for se, oe in zip(self.data, other.data):
-#                if se < oe:
-#                    continue
-#                else:
-#                    return False
-#            return True
+        return len(self._data)
 
     def at(self, i):
-        return self.data[i]
+        return self._data[i]
 
     def subpid(self, begin=0, end=None):
         """
@@ -111,20 +115,7 @@ class Pid(object):
         >>> pid.subpid(1, 3)
         Pid([2,3])
         """
-        pid = self.copy()
-        for _ in range(0, begin):
-            pid.data.pop(0)
-
-        if end:
-            if end > 0:
-                for _ in range(end, len(self.data)):
-                    pid.data.pop(-1)
-            elif end < 0:
-                length = len(self.data)
-                for _ in range(length + end, length):
-                    pid.data.pop(-1)
-        return pid
-
+        return Pid(self._data[begin:end] if end else self._data[begin:])
 
     def prefix(self):
         """
@@ -132,9 +123,7 @@ class Pid(object):
         >>> pid.prefix()
         Pid([1,2])
         """
-        pid = self.copy()
-        pid.data.pop(-1)
-        return pid
+        return Pid(self._data[:-1])
 
     def suffix(self):
         """
@@ -142,9 +131,7 @@ class Pid(object):
         >>> pid.suffix()
         Pid([2,3])
         """
-        pid = self.copy()
-        pid.data.pop(0)
-        return pid
+        return Pid(self._data[1:])
 
     def ends_with(self):
         """
@@ -152,7 +139,7 @@ class Pid(object):
         >>> pid.ends_with()
         3
         """
-        return self.data[-1]
+        return self._data[-1]
 
     def __hash__(self):
         """
@@ -161,31 +148,35 @@ class Pid(object):
         >>> hash(Pid.from_str('1.2')) == hash(Pid.from_str('1.3'))
         False
         """
-        # return reduce(operator.xor, (hash(x) for x in self.data), 0)
-        return hash(tuple(self.data))
+        return self._hash
 
     def __eq__(self, other):
         """
         >>> Pid.from_str('1.1.1') == Pid.from_str('1.1.1')
         True
         """
-        if len(self.data) != len(other.data):
-            return False
-
-        for a, b in zip(self.data, other.data):
-            if a != b:
-                return False
-        return True
+        return isinstance(other, Pid) and self._hash == other._hash and self._data == other._data
 
-        return self.data == other.data
+    def __ne__(self, other):
+        """
+        >>> Pid.from_str('1.1.1') != Pid.from_str('1.1.2')
+        True
+        """
+        return not self.__eq__(other)
 
+    def __cmp__(self, other):
+        """
+        >>> Pid.from_str('1.1') < Pid.from_str('1.1.1') < Pid.from_str('1.2')
+        True
+        >>> Pid.from_str('1.1') == 1
+        False
+        """
+        if not isinstance(other, Pid):
+            return NotImplemented
+        return cmp(self._data, other._data)
 
-#    def __ne__(self, other):
-#        """
-#        >>> Pid.from_str('1.1.1') != Pid.from_str('1.1.2')
-#        True
-#        """
-#        return self.data != other.data
+    def __reduce__(self):
+        return (Pid, (self._data,))
 
     def next(self, pid_component):
         """
@@ -194,9 +185,7 @@ class Pid(object):
         >>> Pid.from_str('1.2').next('2').next(3) == Pid.from_str('1.2.3.4')
         True
         """
-        p = self.copy()
-        p.data.append(int(pid_component) + 1)
-        return p
+        return Pid(self._data + (int(pid_component) + 1,))
 
     def parent(self, other):
         """
@@ -210,20 +199,10 @@ class Pid(object):
         >>> p111.parent(p11124)
         True
         """
+        sd = self._data
         od = other.data
-        sd = self.data
-
-        # child must be longer than parent
-        if len(od) > len(sd):
-            i = 0
-            # test if parent is a prefix of the child
-            for i, elt in enumerate(sd):
-                if elt != od[i]:
-                    return False
-            # loop passed ok
-            return True
-        else:
-            return False
+        # child must be longer than parent and parent a prefix of the child
+        return len(od) > len(sd) and od[:len(sd)] == sd
 
     def parent1(self, other):
         """
@@ -237,20 +216,9 @@ class Pid(object):
         >>> p111.parent1(p11124)
         False
         """
+        sd = self._data
         od = other.data
-        sd = self.data
-
-        # child must be longer than parent
-        if len(od) == len(sd) + 1:
-            i = 0
-            # test if parent is a prefix of the child
-            for elt in sd:
-                if elt != od[i]:
-                    return False
-            # loop passed ok
-            return True
-        else:
-            return False
+        return len(od) == len(sd) + 1 and od[:-1] == sd
 
     def sibling(self, other):
         """
@@ -267,20 +235,10 @@ class Pid(object):
         True
 
         """
-        sd = self.data
+        sd = self._data
         od = other.data
-        length = len(sd)
-        # must have the same length
-        if length == len(od):
-            i = 0
-            # prefixes must be equal
-            for e in sd[0:length - 1]:
-                if e != od[i]:
-                    return False
-            # prefix check passed
-            return sd[length - 1] < od[length - 1]
-        else:
-            return False
+        # same length, equal prefixes
+        return len(sd) == len(od) and sd[:-1] == od[:-1] and sd[-1] < od[-1]
 
     def sibling1(self, other):
         """
@@ -296,20 +254,9 @@ class Pid(object):
         >>> p111.sibling1(p115)
         False
         """
-        sd = self.data
+        sd = self._data
         od = other.data
-        length = len(sd)
-        # must have the same length
-        if length == len(od):
-            i = 0
-            # prefixes must be equal
-            for e in sd[0:length - 1]:
-                if e != od[i]:
-                    return False
-            # prefix check passed
-            return sd[length - 1] == od[length - 1] - 1
-        else:
-            return False
+        return len(sd) == len(od) and sd[:-1] == od[:-1] and sd[-1] == od[-1] - 1
 
     def __repr__(self):
         """
@@ -318,14 +265,14 @@ class Pid(object):
         >>> Pid([1,1,1]) == eval(repr(Pid.from_str('1.1.1')))
         True
         """
-        return 'Pid([' + ','.join([repr(e) for e in self.data]) + '])'
+        return 'Pid([' + ','.join([repr(e) for e in self._data]) + '])'
 
     def __str__(self):
         """
         >>> str(Pid.from_str('1.1.1'))
         '1.1.1'
         """
-        return '.'.join([repr(e) for e in self.data])
+        return '.'.join([repr(e) for e in self._data])
 
     def __getitem__(self, index):
         return self.data[index]
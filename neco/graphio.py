@@ -0,0 +1,182 @@
+""" Streaming reachability graph output.
+
+Nodes are written as soon as they are expanded, thus the graph is never
+stored in memory and a partial graph remains on disk if the exploration
+is interrupted.
+
+The map file is a text file with one C{id : marking} line per node. The
+graph file is a binary edge list: a header followed by one record per
+node made of little endian unsigned ints, the node id, the number of
+successors and the successor ids.
+"""
+
+from neco.utils import fatal_error
+import argparse
+import bz2
+import gzip
+import os
+import struct
+import sys
+
+MAGIC = 'NECOGRPH'
+VERSION = 1
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+_header_struct = struct.Struct('<8sI')
+_uint_struct = struct.Struct('<I')
+
+class GraphWriter(object):
+    """ Buffered writer of map and graph files. """
+
+    def __init__(self, map_file, graph_file, buffer_size = DEFAULT_BUFFER_SIZE):
+        """ Initialize the writer, the graph header is written immediately.
+
+        @param map_file: text file receiving node markings.
+        @param graph_file: binary file receiving edges.
+        @param buffer_size: number of bytes buffered before writing edges.
+        @type buffer_size: C{int}
+        """
+        self.map_file = map_file
+        self.graph_file = graph_file
+        self.buffer_size = buffer_size
+        self.buffer = bytearray(_header_struct.pack(MAGIC, VERSION))
+        self.nodes = 0
+        self.edges = 0
+
+    def add_node(self, node_id, marking_dump, successors):
+        """ Write an expanded node.
+
+        @param node_id: node id.
+        @type node_id: C{int}
+        @param marking_dump: dump of the node marking.
+        @type marking_dump: C{str}
+        @param successors: successor ids.
+        @type successors: C{list}
+        """
+        self.map_file.write("{} : {}\n".format(node_id, marking_dump))
+
+        count = len(successors)
+        self.buffer.extend(struct.pack('<{}I'.format(count + 2), node_id, count, *successors))
+        self.nodes += 1
+        self.edges += count
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """ Write buffered edges. """
+        self.graph_file.write(str(self.buffer))
+        del self.buffer[:]
+
+    def close(self):
+        """ Flush and close output files. """
+        self.flush()
+        for f in (self.map_file, self.graph_file):
+            if f not in (sys.stdout, sys.stderr):
+                f.close()
+
+def explore(net, writer):
+    """ Build the reachability graph of a compiled net, streaming nodes.
+
+    Only the map from markings to node ids is kept in memory, it is also
+    the visited set of the exploration context.
+
+    @param net: compiled net module.
+    @param writer: output writer.
+    @type writer: C{GraphWriter}
+    @return: number of nodes.
+    @rtype: C{int}
+    """
+    ctx = net.NecoCtx()
+    succs = net.succs
+
+    m = net.init()
+    mrk_id_map = { m : 1 }
+    next_id = 2
+    todo = set([m])
+
+    ctx.state_space = mrk_id_map
+    ctx.remaining = todo
+
+    while todo:
+        m = todo.pop()
+
+        successors = []
+        for s_mrk in succs(m, ctx):
+            try:
+                node_id = mrk_id_map[s_mrk]
+            except KeyError:
+                node_id = next_id
+                next_id += 1
+                mrk_id_map[s_mrk] = node_id
+                todo.add(s_mrk)
+            successors.append(node_id)
+
+        writer.add_node(mrk_id_map[m], m.__dump__(), successors)
+
+    return len(mrk_id_map)
+
+def open_graph_file(file_name):
+    """ Open a graph file for reading, with compression support (bz2, gz). """
+    _, extension = os.path.splitext(file_name)
+    if extension == '.bz2':
+        return bz2.BZ2File(file_name, 'r')
+    elif extension == '.gz':
+        return gzip.GzipFile(file_name, 'r')
+    return open(file_name, 'rb')
+
+def _read_exactly(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("truncated graph file")
+    return data
+
+def read_graph(file_name):
+    """ Iterate over the nodes of a graph file.
+
+    A truncated last record, produced by an interrupted exploration, ends
+    the iteration.
+
+    @param file_name: graph file name.
+    @type file_name: C{str}
+    @return: an iterator over (node id, successor ids) pairs.
+    """
+    f = open_graph_file(file_name)
+    try:
+        magic, version = _header_struct.unpack(_read_exactly(f, _header_struct.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a neco graph file".format(file_name))
+
+        while True:
+            data = f.read(2 * _uint_struct.size)
+            if len(data) < 2 * _uint_struct.size:
+                return
+            node_id, count = struct.unpack('<2I', data)
+            data = f.read(count * _uint_struct.size)
+            if len(data) < count * _uint_struct.size:
+                return
+            yield node_id, list(struct.unpack('<{}I'.format(count), data))
+    finally:
+        f.close()
+
+def main(progname):
+    """ Graph reader command line tool, prints a graph file as text. """
+    parser = argparse.ArgumentParser(progname)
+    parser.add_argument('graph', metavar='GRAPHFILE', type=str,
+                        help='graph file produced by neco-explore (supports bz2 and gz compression)')
+    parser.add_argument('--stats', '-s', default=False, dest='stats', action='store_true',
+                        help='only print node and edge counts')
+    args = parser.parse_args()
+
+    nodes, edges = 0, 0
+    try:
+        for node_id, successors in read_graph(args.graph):
+            nodes += 1
+            edges += len(successors)
+            if not args.stats:
+                print "{} : {}".format(node_id, successors)
+    except (IOError, ValueError), e:
+        fatal_error(str(e))
+
+    if args.stats:
+        print "nodes = {}".format(nodes)
+        print "edges = {}".format(edges)
@@ -0,0 +1,197 @@
+""" Multi-process state space exploration.
+
+Markings are partitioned among worker processes with respect to their
+hash value: a worker only stores and explores markings it owns, successors
+owned by other workers are exchanged in batches through queues.
+
+Termination is detected with a shared counter of pending work units. A unit
+is either a batch waiting in a queue or a batch being processed by a worker.
+Batches produced while processing a unit are accounted before the unit
+itself is released, thus the counter reaches zero only when all queues are
+empty and all workers are idle.
+"""
+
+from Queue import Empty
+import cPickle
+import multiprocessing
+
+DEFAULT_BATCH_SIZE = 256
+POLL_TIMEOUT = 0.05
+
+def pack_marking(net, marking):
+    """ Serialize a marking in order to send it to another worker.
+
+    The binary serialization generated with the net is used when
+    available, markings are pickled otherwise.
+
+    @param net: compiled net module.
+    @param marking: marking to serialize.
+    @type marking: C{Marking}
+    @rtype: C{str}
+    """
+    try:
+        pack = net.neco_marking_pack
+    except AttributeError:
+        return cPickle.dumps(marking, cPickle.HIGHEST_PROTOCOL)
+    buf = bytearray()
+    pack(marking, buf)
+    return str(buf)
+
+def unpack_marking(net, data):
+    """ Rebuild a marking serialized with L{pack_marking}.
+
+    @param net: compiled net module.
+    @param data: serialized marking.
+    @type data: C{str}
+    @rtype: C{Marking}
+    """
+    try:
+        unpack = net.neco_marking_unpack
+    except AttributeError:
+        return cPickle.loads(data)
+    return unpack(data)
+
+class Worker(object):
+    """ A worker owning a partition of the state space. """
+
+    def __init__(self, net, index, inboxes, pending, results, batch_size):
+        """ Initialize the worker.
+
+        @param net: compiled net module.
+        @param index: worker index, markings with C{hash(m) % len(inboxes) == index} are owned by this worker.
+        @type index: C{int}
+        @param inboxes: one queue of batches per worker.
+        @type inboxes: C{list}
+        @param pending: shared counter of pending work units.
+        @type pending: C{multiprocessing.Value}
+        @param results: queue used to report statistics.
+        @type results: C{multiprocessing.Queue}
+        @param batch_size: number of markings per exchanged batch.
+        @type batch_size: C{int}
+        """
+        self.net = net
+        self.index = index
+        self.inboxes = inboxes
+        self.pending = pending
+        self.results = results
+        self.batch_size = batch_size
+
+        self.workers = len(inboxes)
+        self.outboxes = [ [] for _ in xrange(self.workers) ]
+        self.visited = set()
+        self.todo = set()
+        self.sent = 0
+
+        self.ctx = net.NecoCtx()
+        self.ctx.state_space = self.visited
+        self.ctx.remaining = self.todo
+
+    def send(self, owner):
+        """ Send the current batch of C{owner}. """
+        outbox = self.outboxes[owner]
+        with self.pending.get_lock():
+            self.pending.value += 1
+        self.inboxes[owner].put(outbox)
+        self.outboxes[owner] = []
+        self.sent += len(outbox)
+
+    def flush(self):
+        """ Send all non empty batches. """
+        for owner, outbox in enumerate(self.outboxes):
+            if outbox:
+                self.send(owner)
+
+    def receive(self, batch):
+        """ Add new markings from a received batch to the todo set. """
+        visited = self.visited
+        todo = self.todo
+        for data in batch:
+            marking = unpack_marking(self.net, data)
+            if marking not in visited:
+                todo.add(marking)
+
+    def explore(self):
+        """ Explore owned markings until the todo set is empty. """
+        succs = self.net.succs
+        visited = self.visited
+        todo = self.todo
+        outboxes = self.outboxes
+        workers = self.workers
+        index = self.index
+        ctx = self.ctx
+
+        while todo:
+            marking = todo.pop()
+            visited.add(marking)
+            for succ in succs(marking, ctx):
+                owner = hash(succ) % workers
+                if owner == index:
+                    if succ not in visited:
+                        todo.add(succ)
+                else:
+                    outbox = outboxes[owner]
+                    outbox.append(pack_marking(self.net, succ))
+                    if len(outbox) >= self.batch_size:
+                        self.send(owner)
+
+    def run(self):
+        """ Process batches until global termination. """
+        inbox = self.inboxes[self.index]
+        while True:
+            try:
+                batch = inbox.get(timeout = POLL_TIMEOUT)
+            except Empty:
+                if self.pending.value == 0:
+                    break
+                continue
+
+            self.receive(batch)
+            self.explore()
+            self.flush()
+            # release the unit after all produced batches were accounted
+            with self.pending.get_lock():
+                self.pending.value -= 1
+
+        self.results.put((self.index, len(self.visited), self.sent))
+
+def _worker_main(net, index, inboxes, pending, results, batch_size):
+    Worker(net, index, inboxes, pending, results, batch_size).run()
+
+def state_space(net, workers, batch_size = DEFAULT_BATCH_SIZE):
+    """ Explore the state space of a compiled net using several processes.
+
+    Worker processes are forked, so the net module is shared and does not
+    need to be reloaded.
+
+    @param net: compiled net module.
+    @param workers: number of worker processes.
+    @type workers: C{int}
+    @param batch_size: number of markings per exchanged batch.
+    @type batch_size: C{int}
+    @return: a list of (worker index, owned markings, sent markings) triples.
+    @rtype: C{list}
+    """
+    init = net.init()
+    try:
+        data = pack_marking(net, init)
+    except (cPickle.PicklingError, TypeError, NotImplementedError), e:
+        raise TypeError("markings of this net cannot be serialized ({})".format(e))
+
+    inboxes = [ multiprocessing.Queue() for _ in xrange(workers) ]
+    results = multiprocessing.Queue()
+    pending = multiprocessing.Value('l', 1)
+
+    inboxes[hash(init) % workers].put([data])
+
+    processes = [ multiprocessing.Process(target = _worker_main,
+                                          args = (net, i, inboxes, pending, results, batch_size))
+                  for i in xrange(workers) ]
+    for process in processes:
+        process.start()
+
+    stats = [ results.get() for _ in xrange(workers) ]
+    for process in processes:
+        process.join()
+
+    stats.sort()
+    return stats
@@ -0,0 +1,199 @@
+""" Profile-guided optimization.
+
+Compiling with C{--pgo-collect} produces a net module whose main successor
+function calls a L{Collector} instead of the transition specific successor
+functions. The collector calls them one by one and records, for each
+transition, the number of calls, the number of calls producing successors
+and the number of produced successors, as well as the distribution of
+place sizes over expanded markings. Statistics are saved as JSON when the
+exploring process exits.
+
+Compiling with C{--pgo-use} loads these statistics into a L{Profile} used
+by the compiler to:
+
+  - call the successor functions of frequently enabled transitions first,
+  - estimate place sizes when ordering input arcs.
+"""
+
+from collections import defaultdict
+import atexit
+import json
+
+DEFAULT_STATS_FILE = 'pgo.json'
+VERSION = 1
+
+class Instrumentation(object):
+    """ Compile time description of the collected statistics. """
+
+    def __init__(self, transitions, function_names, place_names, stats_file):
+        """ Initialize the instrumentation.
+
+        @param transitions: net transitions.
+        @type transitions: C{list} of C{TransitionInfo}
+        @param function_names: successor function name of each transition.
+        @type function_names: C{list}
+        @param place_names: names of places whose sizes are recorded.
+        @type place_names: C{list}
+        @param stats_file: file receiving statistics.
+        @type stats_file: C{str}
+        """
+        self.transition_names = [ transition.name for transition in transitions ]
+        self.function_names = function_names
+        self.place_names = place_names
+        self.stats_file = stats_file
+
+    def constructor(self):
+        """ Build the expression creating the run time L{Collector}.
+
+        @rtype: C{str}
+        """
+        return "neco.pgo.Collector([{}], {!r}, {!r}, {!r})".format(", ".join(self.function_names),
+                                                                  self.transition_names,
+                                                                  self.place_names,
+                                                                  self.stats_file)
+
+class Collector(object):
+    """ Run time statistics collection. """
+
+    def __init__(self, transitions, transition_names, place_names, stats_file):
+        """ Initialize the collector, statistics are saved at exit.
+
+        @param transitions: successor function of each transition.
+        @type transitions: C{list}
+        @param transition_names: name of each transition.
+        @type transition_names: C{list}
+        @param place_names: names of places whose sizes are recorded.
+        @type place_names: C{list}
+        @param stats_file: file receiving statistics.
+        @type stats_file: C{str}
+        """
+        self.transitions = transitions
+        self.transition_names = transition_names
+        self.place_names = place_names
+        self.stats_file = stats_file
+
+        count = len(transitions)
+        self.markings = 0
+        self.calls = [0] * count
+        self.enabled = [0] * count
+        self.firings = [0] * count
+        self.sizes = [ defaultdict(int) for _ in place_names ]
+
+        atexit.register(self.save)
+
+    def succs(self, marking, acc, ctx, *sizes):
+        """ Add successors of a marking and record statistics.
+
+        @param marking: marking to expand.
+        @param acc: successor set to update.
+        @type acc: C{set}
+        @param ctx: exploration context.
+        @param sizes: size of each recorded place in C{marking}.
+        """
+        self.markings += 1
+        for histogram, size in zip(self.sizes, sizes):
+            histogram[size] += 1
+
+        for t, function in enumerate(self.transitions):
+            successors = set()
+            function(marking, successors, ctx)
+            self.calls[t] += 1
+            if successors:
+                self.enabled[t] += 1
+                self.firings[t] += len(successors)
+                acc.update(successors)
+
+    def stats(self):
+        """ Get collected statistics.
+
+        @rtype: C{dict}
+        """
+        transitions = {}
+        for t, name in enumerate(self.transition_names):
+            transitions[name] = { 'calls' : self.calls[t],
+                                  'enabled' : self.enabled[t],
+                                  'firings' : self.firings[t] }
+
+        places = {}
+        for name, histogram in zip(self.place_names, self.sizes):
+            total = sum(histogram.itervalues())
+            places[name] = { 'mean' : float(sum(size * n for size, n in histogram.iteritems())) / total if total else 0.0,
+                             'max' : max(histogram) if histogram else 0,
+                             'histogram' : dict((str(size), n) for size, n in histogram.iteritems()) }
+
+        return { 'version' : VERSION,
+                 'markings' : self.markings,
+                 'transitions' : transitions,
+                 'places' : places }
+
+    def save(self):
+        """ Write statistics to the stats file. """
+        if not self.markings:
+            return
+        with open(self.stats_file, 'w') as f:
+            json.dump(self.stats(), f, indent = 1, sort_keys = True)
+
+class Profile(object):
+    """ Statistics collected by a previous exploration. """
+
+    def __init__(self, stats):
+        """ Initialize the profile.
+
+        @param stats: statistics produced by L{Collector.stats}.
+        @type stats: C{dict}
+        """
+        if stats.get('version') != VERSION:
+            raise ValueError("unsupported statistics version")
+        self.transitions = stats.get('transitions', {})
+        self.places = stats.get('places', {})
+
+    @classmethod
+    def load(cls, file_name):
+        """ Load a profile from a stats file.
+
+        @param file_name: stats file produced with C{--pgo-collect}.
+        @type file_name: C{str}
+        @rtype: C{Profile}
+        """
+        with open(file_name) as f:
+            return cls(json.load(f))
+
+    def firings(self, transition_name):
+        """ Number of successors produced by a transition, C{0} if unknown.
+
+        @rtype: C{int}
+        """
+        return self.transitions.get(transition_name, {}).get('firings', 0)
+
+    def enabling_ratio(self, transition_name):
+        """ Fraction of calls producing successors, C{0.0} if unknown.
+
+        @rtype: C{float}
+        """
+        stats = self.transitions.get(transition_name, {})
+        calls = stats.get('calls', 0)
+        return float(stats.get('enabled', 0)) / calls if calls else 0.0
+
+    def order_transitions(self, transitions):
+        """ Order transitions, most frequently enabled ones first.
+
+        Ties are broken by the number of produced successors then by the
+        given order.
+
+        @param transitions: transitions to order.
+        @type transitions: C{list} of C{TransitionInfo}
+        @rtype: C{list}
+        """
+        return sorted(transitions, key = lambda transition: (-self.enabling_ratio(transition.name),
+                                                             -self.firings(transition.name)))
+
+    def place_size(self, place_name):
+        """ Mean size of a place over expanded markings.
+
+        @return: mean size or C{None} if unknown.
+        @rtype: C{float}
+        """
+        try:
+            return self.places[place_name]['mean']
+        except KeyError:
+            return None
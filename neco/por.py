@@ -0,0 +1,195 @@
+""" Partial order reduction with stubborn sets.
+
+At compile time, static relations between transitions are computed from
+the places they access:
+
+  - two transitions are dependent if one of them consumes tokens from an
+    input place of the other one, if one of them flushes a place the other
+    one produces in, if one of them produces tokens in a coloured input
+    place of the other one, or if both spawn processes; producing tokens
+    never disables a transition but a new coloured token may enable new
+    bindings of an already enabled transition, black tokens cannot,
+  - the enabling set of a transition is made of the transitions producing
+    tokens in its input places, one of them must fire before a disabled
+    transition becomes enabled.
+
+At run time, a stubborn set is built for each marking by closing a seed
+enabled transition under these relations: enabled transitions bring their
+dependent transitions and disabled ones bring their enabling sets. Only
+the successor functions of transitions in the set are called, the
+enabledness of a transition being known by calling its successor function.
+Such sets preserve deadlocks.
+
+In C{ltl} mode, the set is fully expanded if it contains an enabled
+visible transition, ie., one modifying an observed place, or if one of
+its successors was already visited (cycle proviso). The visited set is the
+one of the exploration, C{ctx.state_space}, the expanded marking is added
+to it before its successors are computed since on the fly checkers keep
+their own visited set. Stutter invariant LTL properties over observed
+places are then preserved.
+"""
+
+DEADLOCK = 'deadlock'
+LTL = 'ltl'
+
+class StaticRelations(object):
+    """ Dependency and enabling relations between transitions. """
+
+    def __init__(self, transitions, function_names, mode = DEADLOCK, visible_places = ()):
+        """ Compute relations.
+
+        @param transitions: net transitions.
+        @type transitions: C{list} of C{TransitionInfo}
+        @param function_names: successor function name of each transition.
+        @type function_names: C{list}
+        @param mode: preserved properties, L{DEADLOCK} or L{LTL}.
+        @type mode: C{str}
+        @param visible_places: names of places observed by properties.
+        @type visible_places: C{list}
+        """
+        self.function_names = function_names
+        self.mode = mode
+
+        inputs = []
+        coloured = []
+        consumed = []
+        flushed = []
+        outputs = []
+        for transition in transitions:
+            inputs.append(set(arc.place_info.name for arc in transition.input_arcs))
+            coloured.append(set(arc.place_info.name
+                                for arc in transition.input_arcs
+                                if not arc.place_info.type.is_BlackToken))
+            consumed.append(set(arc.place_info.name
+                                for arc in transition.input_arcs
+                                if not arc.is_Test))
+            flushed.append(set(arc.place_info.name
+                               for arc in transition.input_arcs
+                               if arc.is_Flush))
+            outputs.append(set(arc.place_info.name for arc in transition.outputs))
+        spawns = [ transition.generator_arc is not None for transition in transitions ]
+
+        def dependent(i, j):
+            return ((consumed[i] & inputs[j]) or (consumed[j] & inputs[i])
+                    or (flushed[i] & outputs[j]) or (flushed[j] & outputs[i])
+                    or (outputs[i] & coloured[j]) or (outputs[j] & coloured[i])
+                    or (spawns[i] and spawns[j]))
+
+        indices = dict((transition.name, i) for i, transition in enumerate(transitions))
+        count = len(transitions)
+
+        self.dependent = []
+        for i in xrange(count):
+            self.dependent.append([ j for j in xrange(count) if j != i and dependent(i, j) ])
+
+        self.enabling = []
+        for transition in transitions:
+            enabling = set()
+            for place_info in transition.pre:
+                enabling.update(indices[producer.name] for producer in place_info.pre)
+            enabling.discard(indices[transition.name])
+            self.enabling.append(sorted(enabling))
+
+        visible_places = set(visible_places)
+        self.visible = [ bool(visible_places & set(place_info.name for place_info in transition.modified_places()))
+                         for transition in transitions ]
+
+    def constructor(self):
+        """ Build the expression creating the run time L{Reduction}.
+
+        @rtype: C{str}
+        """
+        return "neco.por.Reduction([{}], {!r}, {!r}, {!r}, {!r})".format(", ".join(self.function_names),
+                                                                         self.dependent,
+                                                                         self.enabling,
+                                                                         self.visible,
+                                                                         self.mode == LTL)
+
+class Reduction(object):
+    """ Run time stubborn set computation. """
+
+    def __init__(self, transitions, dependent, enabling, visible, proviso):
+        """ Initialize the reduction.
+
+        @param transitions: successor function of each transition.
+        @type transitions: C{list}
+        @param dependent: dependent transitions of each transition.
+        @type dependent: C{list}
+        @param enabling: enabling set of each transition.
+        @type enabling: C{list}
+        @param visible: visibility of each transition.
+        @type visible: C{list}
+        @param proviso: enable visibility and cycle provisos.
+        @type proviso: C{bool}
+        """
+        self.transitions = transitions
+        self.dependent = dependent
+        self.enabling = enabling
+        self.visible = visible
+        self.proviso = proviso
+
+    def succs(self, marking, acc, ctx):
+        """ Add successors of a marking with respect to a stubborn set.
+
+        @param marking: marking to expand.
+        @param acc: successor set to update.
+        @type acc: C{set}
+        @param ctx: exploration context, its C{state_space} set is used
+        by the cycle proviso.
+        """
+        transitions = self.transitions
+        fired = {}
+
+        # explorations record the marking themselves, possibly in a
+        # container without add
+        if self.proviso and not marking in ctx.state_space:
+            ctx.state_space.add(marking)
+
+        for seed, function in enumerate(transitions):
+            successors = set()
+            function(marking, successors, ctx)
+            fired[seed] = successors
+            if successors:
+                break
+        else:
+            return    # deadlock
+
+        stubborn = set([seed])
+        stack = [seed]
+        while stack:
+            t = stack.pop()
+            try:
+                successors = fired[t]
+            except KeyError:
+                successors = set()
+                transitions[t](marking, successors, ctx)
+                fired[t] = successors
+            for u in (self.dependent[t] if successors else self.enabling[t]):
+                if not u in stubborn:
+                    stubborn.add(u)
+                    stack.append(u)
+
+        full = len(stubborn) == len(transitions)
+        if not full and self.proviso:
+            reduced = set()
+            for t in stubborn:
+                if fired[t]:
+                    if self.visible[t]:
+                        full = True
+                        break
+                    reduced.update(fired[t])
+            else:
+                visited = ctx.state_space
+                for succ in reduced:
+                    if succ in visited:
+                        full = True
+                        break
+
+        if full:
+            for t, function in enumerate(transitions):
+                if not t in fired:
+                    function(marking, acc, ctx)
+            stubborn = fired
+
+        for t in stubborn:
+            acc.update(fired[t])
@@ -5,6 +5,9 @@ from functools import wraps
 from os.path import exists, abspath
 from snakes.nets import WordSet
 import ast
+import cPickle
+import cStringIO
+import pickle
 import sys
 import traceback
 
@@ -743,6 +746,64 @@ def reverse_map(a_b_map):
         b_a_map[b] = a
     return b_a_map
 
+################################################################################
+
+class _Unordered(Exception):
+    pass
+
+def _check_ordered(obj):
+    # persistent id hook of the fast path, called for each pickled object
+    if isinstance(obj, (dict, set, frozenset)):
+        raise _Unordered
+    return None
+
+class _CanonicalPickler(pickle.Pickler):
+    """ Pickler writing dict items and set elements sorted by their pickles. """
+
+    dispatch = pickle.Pickler.dispatch.copy()
+
+    def save_dict(self, obj):
+        self.write(pickle.EMPTY_DICT)
+        self.memoize(obj)
+        self._batch_setitems(iter(sorted(obj.iteritems(), key = _item_key)))
+
+    dispatch[dict] = save_dict
+
+    def save_reduce(self, func, args, state = None, listitems = None, dictitems = None, obj = None):
+        # dict and set subclasses are reduced
+        if isinstance(obj, (set, frozenset)):
+            args = (sorted(args[0], key = canonical_dumps),) + tuple(args[1:])
+        if dictitems is not None:
+            dictitems = iter(sorted(dictitems, key = _item_key))
+        pickle.Pickler.save_reduce(self, func, args, state, listitems, dictitems, obj)
+
+def _item_key(item):
+    return canonical_dumps(item[0]), canonical_dumps(item[1])
+
+def canonical_dumps(obj):
+    """ Pickle C{obj} with protocol 2 such that equal objects give equal bytes.
+
+    The memo is disabled so object sharing does not matter, and dict items
+    and set elements are written in the order of their own pickles.
+
+    >>> canonical_dumps({'a' : 1, 'b' : 2}) == canonical_dumps(dict([('b', 2), ('a', 1)]))
+    True
+    >>> cPickle.loads(canonical_dumps((1, set(['x', 'y'])))) == (1, set(['x', 'y']))
+    True
+    """
+    output = cStringIO.StringIO()
+    pickler = cPickle.Pickler(output, 2)
+    pickler.fast = 1
+    pickler.persistent_id = _check_ordered
+    try:
+        pickler.dump(obj)
+    except _Unordered:
+        output = cStringIO.StringIO()
+        pickler = _CanonicalPickler(output, 2)
+        pickler.fast = 1
+        pickler.dump(obj)
+    return output.getvalue()
+
 ################################################################################
 # EOF
 ################################################################################
@@ -12,7 +12,7 @@ DEV_OPTION='dev'
 BUILD_OPTION='build'
 INSTALL_OPTION='install'
 
-scripts=['bin/neco-compile', 'bin/neco-explore']
+scripts=['bin/neco-compile', 'bin/neco-explore', 'bin/neco-graph']
 
 def usage():
     print "usage TODO"
@@ -105,6 +105,8 @@ setup(name='Neco',
       package_data={'neco.ctypes' : ['include.pxd',
                                      'include.pyx',
                                      'include_no_stats.pyx',
+                                     'include_tree.pyx',
+                                     'include_tree_no_stats.pyx',
                                      'ctypes_ext.pxd',
                                      'ctypes.h',
                                      'ctypes_spec.h',
@@ -0,0 +1,20 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+s1 = Place('s1', [True, False, False], tBoolean)
+s1.is_OneSafe = False
+s2 = Place('s2', [], tBoolean)
+s2.is_OneSafe = False
+
+net.add_place(s1)
+net.add_place(s2)
+
+t1 = Transition('t1', Expression('True'))
+net.add_transition(t1)
+net.add_input('s1', 't1', Variable('x'))
+net.add_output('s2', 't1', Expression('not x'))
+
+t2 = Transition('t2', Expression('True'))
+net.add_transition(t2)
+net.add_input('s2', 't2', Value(True))
+net.add_output('s1', 't2', Value(False))
@@ -0,0 +1,20 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# more than 32 input places, enabling masks span several words
+for i in range(34):
+    net.add_place(Place('p%d' % i, [dot] if i == 30 else [], tBlackToken))
+net.add_place(Place('q', [dot], tBlackToken))
+
+for i in range(33):
+    t = Transition('t%d' % i, Expression('True'))
+    net.add_transition(t)
+    net.add_input('p%d' % i, 't%d' % i, Value(dot))
+    net.add_output('p%d' % (i + 1), 't%d' % i, Value(dot))
+
+t = Transition('back', Expression('True'))
+net.add_transition(t)
+net.add_input('p33', 'back', Value(dot))
+net.add_input('q', 'back', Value(dot))
+net.add_output('p32', 'back', Value(dot))
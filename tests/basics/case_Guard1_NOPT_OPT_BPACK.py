@@ -0,0 +1,16 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# conjunctive guard, each conjunct depends on different inputs
+net.add_place(Place('p1', range(4)))
+net.add_place(Place('p2', range(4)))
+net.add_place(Place('p3', range(3)))
+net.add_place(Place('out', []))
+
+t = Transition('t', Expression('x < 2 and y != x and (abs(z - y) < 3 and x + y + z > 3)'))
+net.add_transition(t)
+net.add_input('p1', 't', Variable('x'))
+net.add_input('p2', 't', Variable('y'))
+net.add_input('p3', 't', Variable('z'))
+net.add_output('out', 't', Expression('x + y + z'))
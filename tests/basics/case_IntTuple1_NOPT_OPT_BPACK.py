@@ -0,0 +1,28 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+s1 = Place('s1', [ (1, 2), (3, 4), (3, 4) ], CrossProduct(tInteger, tInteger))
+s1.is_OneSafe = False
+s2 = Place('s2', [], CrossProduct(tInteger, tInteger, tInteger))
+s2.is_OneSafe = False
+s3 = Place('s3', [], CrossProduct(tInteger, tInteger))
+s3.is_OneSafe = False
+
+net.add_place(s1)
+net.add_place(s2)
+net.add_place(s3)
+
+t1 = Transition('t1', Expression('True'))
+net.add_transition(t1)
+net.add_input('s1', 't1', Tuple( (Variable('x'), Variable('y')) ))
+net.add_output('s2', 't1', Tuple( (Variable('y'), Variable('x'), Value(0)) ))
+
+t2 = Transition('t2', Expression('True'))
+net.add_transition(t2)
+net.add_input('s2', 't2', Tuple( (Variable('a'), Variable('b'), Value(0)) ))
+net.add_output('s2', 't2', Tuple( (Variable('a'), Variable('b'), Value(1)) ))
+
+t3 = Transition('t3', Expression('True'))
+net.add_transition(t3)
+net.add_input('s2', 't3', Value( (4, 3, 1) ))
+net.add_output('s3', 't3', Value( (-1, 7) ))
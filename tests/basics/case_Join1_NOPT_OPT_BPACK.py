@@ -0,0 +1,20 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# several colored inputs joined on shared variables, the guard only
+# depends on some of them
+net.add_place(Place('big', range(4)))
+net.add_place(Place('keys', [1, 3, 5]))
+net.add_place(Place('vals', [(1, 'a'), (3, 'b'), (4, 'c')]))
+net.add_place(Place('ctrl', [dot], tBlackToken))
+net.add_place(Place('out', []))
+
+t = Transition('t', Expression('k < 4'))
+net.add_transition(t)
+net.add_input('big', 't', Variable('x'))
+net.add_input('vals', 't', Tuple([Variable('k'), Variable('v')]))
+net.add_input('keys', 't', Variable('k'))
+net.add_input('ctrl', 't', Test(Value(dot)))
+net.add_output('out', 't', Expression('(x, v)'))
+net.add_output('big', 't', Expression('x + 1'))
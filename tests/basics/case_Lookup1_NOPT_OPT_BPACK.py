@@ -0,0 +1,26 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# tokens are searched by value: constant arcs and joins on a bound variable
+net.add_place(Place('s1', ['a', 'b', 'c', 'd']))
+net.add_place(Place('s2', ['b', 'd', 'e']))
+net.add_place(Place('s3', []))
+net.add_place(Place('s4', ['k']))
+
+t = Transition('join', Expression('True'))
+net.add_transition(t)
+net.add_input('s1', 'join', Variable('x'))
+net.add_input('s2', 'join', Variable('x'))
+net.add_output('s3', 'join', Variable('x'))
+
+t = Transition('const', Expression('True'))
+net.add_transition(t)
+net.add_input('s3', 'const', Value('d'))
+net.add_input('s4', 'const', Test(Variable('y')))
+net.add_output('s1', 'const', Expression('y'))
+
+t = Transition('test', Expression('True'))
+net.add_transition(t)
+net.add_input('s1', 'test', Test(Value('k')))
+net.add_input('s4', 'test', Value('k'))
@@ -0,0 +1,51 @@
+from neco.extsnakes import *
+
+net = DPCPetriNet('net')
+
+# two clients send their pid to a server, the server spawns a thread per
+# client that answers it; both clients play the same role, so pid
+# normalization merges the markings where their roles are swapped
+net.add_place(Place('s1', [Pid.from_str('1')], tPid))
+net.add_place(Place('s_in', [], tPid))
+net.add_place(Place('s_thread', [], tPid))
+net.add_place(Place('s_thread_data', [], CrossProduct(tPid, tPid)))
+
+net.add_place(Place('c1', [Pid.from_str('1.1'), Pid.from_str('1.2')], tPid))
+net.add_place(Place('c2', [], tPid))
+net.add_place(Place('c3', [], tPid))
+net.add_place(Place('c_in', [], tPid))
+
+net.add_transition(Transition('tc_1', Expression('True')))
+net.add_input('c1', 'tc_1', Variable('p'))
+net.add_output('c2', 'tc_1', Variable('p'))
+net.add_output('s_in', 'tc_1', Variable('p'))
+
+net.add_transition(Transition('tc_2', Expression('True')))
+net.add_input('c2', 'tc_2', Variable('p'))
+net.add_input('c_in', 'tc_2', Variable('p'))
+net.add_output('c3', 'tc_2', Variable('p'))
+
+server_pid, _ = net.add_get_pid('ts_1')
+net.add_transition(Transition('ts_1', Expression('{} == p'.format(server_pid))))
+net.add_input('s1', 'ts_1', Variable('p'))
+net.add_output('s1', 'ts_1', Variable('p'))
+net.add_input('s_in', 'ts_1', Variable('p_c'))
+(thread_pid,) = net.add_spawn('ts_1', server_pid, 1)
+net.add_output('s_thread', 'ts_1', Expression(str(thread_pid)))
+net.add_output('s_thread_data', 'ts_1', Expression('({}, p_c)'.format(thread_pid)))
+
+net.add_place(Place('step', [], tPid))
+net.add_transition(Transition('t_step', Expression('True')))
+net.add_input('s_thread', 't_step', Variable('p'))
+net.add_output('step', 't_step', Variable('p'))
+
+thread_pid, _ = net.add_get_pid('ts_2')
+net.add_transition(Transition('ts_2', Expression('p == {}'.format(thread_pid))))
+net.add_input('step', 'ts_2', Variable('p'))
+net.add_input('s_thread_data', 'ts_2', Tuple([Variable('p'), Variable('d')]))
+net.add_output('c_in', 'ts_2', Expression('d'))
+net.add_terminate('ts_2', thread_pid)
+
+net.setup_initial_hierarchy({ '1' : {}, '2' : {} })
+
+net.finalize_net()
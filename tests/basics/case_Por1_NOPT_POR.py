@@ -0,0 +1,21 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+
+# give produces a token in a coloured input place of the enabled take,
+# firing take before give must not hide the deadlock after give; take(2)
+net.add_place(Place('p', [1], tInteger))
+net.add_place(Place('q', [], tInteger))
+net.add_place(Place('a', [dot], tBlackToken))
+net.add_place(Place('c', [dot], tBlackToken))
+
+t = Transition('give', Expression('True'))
+net.add_transition(t)
+net.add_input('a', 'give', Value(dot))
+net.add_output('p', 'give', Value(2))
+
+t = Transition('take', Expression('True'))
+net.add_transition(t)
+net.add_input('p', 'take', Variable('x'))
+net.add_input('c', 'take', Value(dot))
+net.add_output('q', 'take', Variable('x'))
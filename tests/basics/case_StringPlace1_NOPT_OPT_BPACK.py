@@ -0,0 +1,25 @@
+from snakes.nets import *
+
+net = PetriNet('Net')
+s1 = Place('s1', ['idle', 'idle', 'busy'], tString)
+s1.is_OneSafe = False
+s2 = Place('s2', [], tString)
+s2.is_OneSafe = False
+
+net.add_place(s1)
+net.add_place(s2)
+
+t1 = Transition('t1', Expression('x == "idle"'))
+net.add_transition(t1)
+net.add_input('s1', 't1', Variable('x'))
+net.add_output('s2', 't1', Value('busy'))
+
+t2 = Transition('t2', Expression('True'))
+net.add_transition(t2)
+net.add_input('s1', 't2', Value('busy'))
+net.add_output('s2', 't2', Value('done'))
+
+t3 = Transition('t3', Expression('True'))
+net.add_transition(t3)
+net.add_input('s2', 't3', Variable('y'))
+net.add_output('s1', 't3', Variable('y'))
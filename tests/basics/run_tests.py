@@ -3,9 +3,12 @@
 from StringIO import StringIO
 from glob import glob
 from snakes.nets import dot    # @UnusedImport needed to rebuild markings
+from neco import bitstate, external, graphio, parallel
+import itertools
 import neco
 import os
 import sys
+import tempfile
 import unittest
 
 # Static config
@@ -71,6 +74,99 @@ def read_marking_set(state_space):
     out.write(']')
     return MarkingSet(eval(out.getvalue()))
 
+def deadlocks(net, state_space):
+    """ Get the markings of a state space without successors. """
+
+    ctx = net.NecoCtx()
+    return [ m for m in state_space if not net.succs(m, ctx) ]
+
+def pid_relabellings(marking):
+    """ Relabel the pids of a marking with every ordering of its pid tree.
+
+    Each ordering of the children of each node of the stripped pid tree
+    gives a marking equal to C{marking} up to pid renaming, as enumerated
+    by the permutation based pid normalization.
+    """
+
+    tree = marking.buildPidTree()
+    tree.strip()
+    nodes = []
+    def walk(node):
+        nodes.append(node)
+        for child in node.children.itervalues():
+            walk(child)
+    walk(tree)
+
+    children = [ node.children.values() for node in nodes ]
+    for ordering in itertools.product(*[ itertools.permutations(c) for c in children ]):
+        for node, ordered in zip(nodes, ordering):
+            node.children = list(ordered)
+        relabelled = marking.copy()
+        relabelled.update_pids(tree.build_map())
+        yield relabelled
+
+def packed(net, marking):
+    buf = bytearray()
+    net.neco_marking_pack(marking, buf)
+    return str(buf)
+
+def explore_parallel(net, state_space):
+    """ Size of the state space explored by two worker processes. """
+
+    stats = parallel.state_space(net, 2, 4)
+    return sum(visited for _, visited, _ in stats)
+
+def explore_compact(net, state_space):
+    """ Size of the state space explored with serialized visited markings. """
+
+    return len(net.state_space_compact())
+
+def explore_external(net, state_space):
+    """ Size of the state space explored with markings stored on disk. """
+
+    count, _, _ = external.state_space(net, None, 4)
+    return count
+
+def explore_graph(net, state_space):
+    """ Number of nodes read back from a graph file written during exploration.
+
+    The edges read back must be the successors of the explored markings.
+    """
+
+    fd, graph_file = tempfile.mkstemp(suffix = '.grph')
+    os.close(fd)
+    try:
+        writer = graphio.GraphWriter(StringIO(), open(graph_file, 'wb'), 64)
+        graphio.explore(net, writer)
+        writer.close()
+        graph = dict(graphio.read_graph(graph_file))
+    finally:
+        os.remove(graph_file)
+
+    ctx = net.NecoCtx()
+    edges = sum(len(net.succs(m, ctx)) for m in state_space)
+    assert sorted(graph) == range(1, len(graph) + 1), "node ids"
+    assert sum(len(successors) for successors in graph.itervalues()) == edges, "edges"
+    assert all(0 < s <= len(graph) for successors in graph.itervalues() for s in successors), "successor ids"
+    return len(graph)
+
+def explore_bitstate(net, state_space):
+    """ Number of markings stored in a bit-state table much larger than needed. """
+
+    table, _ = bitstate.state_space(net, 1 << 16)
+    return table.stored
+
+def explorations(backend):
+    """ Other explorations of the state space, run on NOPT tests. """
+
+    checked = [ ('parallel', explore_parallel),
+                ('external', explore_external),
+                ('graph', explore_graph),
+                ('bitstate', explore_bitstate) ]
+    if backend == 'cython':
+        checked.append(('compact', explore_compact))
+    return checked
+
 class Entry:
     """ A file used as a test. """
 
@@ -122,10 +218,12 @@ class CythonBackend(TestBackend):
 class NecoTestCase(object):
     # Functor corresponding to a test. Creates a test from an Entry.
 
-    def __init__(self, entry, config, test):
+    def __init__(self, entry, config, test, reference_config = None, explorations = ()):
         self.entry = entry
         self.test = test
         self.config = config
+        self.reference_config = reference_config
+        self.explorations = explorations
         if entry.ext == '.py':
             self.load = self.load_net
         else:
@@ -138,8 +236,23 @@ class NecoTestCase(object):
         net = neco.compile_net(model, config)
         self.test.assert_(net, 'compilation_check')
         # state space computation
-        markings = read_marking_set(net.state_space())
+        if self.reference_config:
+            # reduced state space, same deadlocks as the full one
+            state_space = net.state_space()
+            for marking in read_marking_set(state_space).data:
+                self.test.assert_(marking in expected, "reachable marking")
+            reference, _ = self.load()
+            reference = neco.compile_net(reference, self.reference_config)
+            self.test.assertEqual(read_marking_set(deadlocks(reference, reference.state_space())),
+                                  read_marking_set(deadlocks(net, state_space)),
+                                  "preserved deadlocks")
+            return
+        state_space = net.state_space()
+        markings = read_marking_set(state_space)
         self.test.assertEqual(expected, markings, "correct markings")
+        # other explorations find as many markings
+        for name, explore in self.explorations:
+            self.test.assertEqual(len(state_space), explore(net, state_space), name + " exploration")
 
     def load_net(self):
         module_file = self.entry.module_name
@@ -166,6 +279,59 @@ class NecoTestCase(object):
         self.markings = read_marking_set(net.state_space())
 
 
+class PidsTestCase(NecoTestCase):
+    # Compares pid normalization of a backend to the one of the python
+    # backend. Both give one representative per class of markings equal up
+    # to pid renaming but representatives may differ, and markings with
+    # pids cannot be read back from dumps, hence only counts are compared.
+
+    def __call__(self):
+        model = neco.load_snakes_net(self.entry.module_name, 'net')
+        net = neco.compile_net(model, self.config)
+        self.test.assert_(net, 'compilation_check')
+        state_space = net.state_space()
+
+        # pids of the module compare to other objects
+        pid = net.Pid.from_str('1.2')
+        self.test.assertFalse(pid == None, "pid compared to None")
+        self.test.assertTrue(pid != 1, "pid compared to an int")
+        self.test.assertFalse((pid, 1) == (None, 1), "tuple holding a pid")
+        self.test.assertEqual(net.Pid.from_str('1.2'), pid, "equal pids")
+
+        model = neco.load_snakes_net(self.entry.module_name, 'net')
+        reference = neco.compile_net(model, self.reference_config)
+        reference_space = reference.state_space()
+        self.test.assertEqual(len(reference_space), len(state_space), "normalized markings")
+        self.test.assertEqual(len(deadlocks(reference, reference_space)),
+                              len(deadlocks(net, state_space)),
+                              "normalized deadlocks")
+
+
+class CanonicalTestCase(NecoTestCase):
+    # Checks that full pid normalization gives canonical representatives:
+    # every relabelling of a representative normalizes back to it, and the
+    # number of representatives is the number of classes of markings equal
+    # up to pid renaming, computed by enumerating pid tree orderings.
+
+    def __call__(self):
+        model = neco.load_snakes_net(self.entry.module_name, 'net')
+        net = neco.compile_net(model, self.config)
+        self.test.assert_(net, 'compilation_check')
+        state_space = net.state_space()
+
+        ctx = net.NecoCtx()
+        for marking in state_space:
+            for relabelled in pid_relabellings(marking):
+                canonical = net.full_normalize_marking(relabelled, ctx.pid_free_hash, None, None, None)
+                self.test.assertEqual(packed(net, marking), packed(net, canonical), "canonical marking")
+
+        model = neco.load_snakes_net(self.entry.module_name, 'net')
+        reference = neco.compile_net(model, self.reference_config)
+        classes = set( min(packed(reference, relabelled) for relabelled in pid_relabellings(marking))
+                       for marking in reference.state_space() )
+        self.test.assertEqual(len(classes), len(state_space), "normalized markings")
+
+
 def config_NOPT(backend, entry):
     return neco.config.Config(backend = backend,
                               search_paths = env_includes,
@@ -192,6 +358,34 @@ def config_FLOW(backend, entry):
                               optimize_flow = True,
                               out_module = backend_prefix[backend] + entry.name + '_FLOW')
 
+def config_POR(backend, entry):
+    return neco.config.Config(backend = backend,
+                              search_paths = env_includes,
+                              por = 'deadlock',
+                              out_module = backend_prefix[backend] + entry.name + '_POR')
+
+def config_PIDS(backend, entry):
+    return neco.config.Config(backend = backend,
+                              search_paths = env_includes,
+                              imports = ['neco.extsnakes'],
+                              normalize_pids = True,
+                              normalize_only = True,
+                              pid_first = False,
+                              pid_parent = False,
+                              pid_sibling = False,
+                              out_module = backend_prefix[backend] + entry.name + '_PIDS')
+
+def config_CANON(backend, entry):
+    return neco.config.Config(backend = backend,
+                              search_paths = env_includes,
+                              imports = ['neco.extsnakes'],
+                              normalize_pids = True,
+                              normalize_only = False,
+                              pid_first = False,
+                              pid_parent = False,
+                              pid_sibling = False,
+                              out_module = backend_prefix[backend] + entry.name + '_CANON')
+
 def populateTestCases():
     """ Function that adds tests based on files in current directory.
     
@@ -219,7 +413,7 @@ def populateTestCases():
         # remaining values are available options
         options = []
         for option in decode:
-            if option in ['NOPT', 'OPT', 'FLOW', 'BPACK']:
+            if option in ['NOPT', 'OPT', 'FLOW', 'BPACK', 'POR', 'PIDS', 'CANON']:
                 options.append(option)
 
         if options != []:
@@ -228,8 +422,12 @@ def populateTestCases():
 
     for entry in entries:
         for option in entry.options:
+            reference_py = reference_cy = None
+            checked_py = checked_cy = ()
 
             if option == 'NOPT':
+                checked_py = explorations('python')
+                checked_cy = explorations('cython')
                 config_py = config_NOPT('python', entry)
                 config_cy = config_NOPT('cython', entry)
             elif option == 'OPT':
@@ -241,13 +439,32 @@ def populateTestCases():
             elif option == 'FLOW':
                 config_py = config_FLOW('python', entry)
                 config_cy = config_FLOW('cython', entry)
+            elif option == 'POR':
+                config_py = config_POR('python', entry)
+                config_cy = config_POR('cython', entry)
+                reference_py = config_NOPT('python', entry)
+                reference_cy = config_NOPT('cython', entry)
+            elif option == 'PIDS':
+                # native pid normalization against the python one
+                config_py = None
+                config_cy = config_PIDS('cython', entry)
+                reference_cy = config_PIDS('python', entry)
+            elif option == 'CANON':
+                # full pid normalization, python backend only
+                config_py = config_CANON('python', entry)
+                config_cy = None
+                reference_py = config_PIDS('python', entry)
 
             test_name = 'test_{case}_{option:_>5}'.format(case = entry.name, option = option)
-            if config_py:
-                setattr(PythonBackend, test_name, NecoTestCase(entry, config_py, PythonBackend))
-
-            if config_cy:
-                setattr(CythonBackend, test_name, NecoTestCase(entry, config_cy, CythonBackend))
+            if config_py and option == 'CANON':
+                setattr(PythonBackend, test_name, CanonicalTestCase(entry, config_py, PythonBackend, reference_py))
+            elif config_py:
+                setattr(PythonBackend, test_name, NecoTestCase(entry, config_py, PythonBackend, reference_py, checked_py))
+
+            if config_cy and option == 'PIDS':
+                setattr(CythonBackend, test_name, PidsTestCase(entry, config_cy, CythonBackend, reference_cy))
+            elif config_cy:
+                setattr(CythonBackend, test_name, NecoTestCase(entry, config_cy, CythonBackend, reference_cy, checked_cy))
 
 if __name__ == '__main__':
     populateTestCases()